@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark delle parti critiche del downloader ANAC.
+
+Uso:
+    python3 benchmark.py              # esegue tutti i benchmark
+    python3 benchmark.py skip_check   # esegue solo il benchmark indicato
+"""
+
+import os
+import sys
+import time
+import argparse
+
+# Aggiungi la directory corrente al path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from json_downloader.utils import ExistingFilesIndex, should_skip_download, FOLDER_MAPPINGS, FolderRouter
+
+
+def _timeit(func, repeat):
+    """Tempo medio di una chiamata in microsecondi."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) * 1e6 / repeat
+
+
+def bench_skip_check(existing_count=100000):
+    """Costo di should_skip_download con `existing_count` file esistenti."""
+    print(f"\n== should_skip_download con {existing_count} file esistenti ==")
+
+    legacy = {}
+    for i in range(existing_count):
+        legacy[f"dataset_{i % 200}_{i}.json"] = f"/database/JSON/folder_{i % 200}"
+    index = ExistingFilesIndex(legacy)
+
+    last = existing_count - 1
+    cases = {
+        'nome esatto': f"dataset_{last % 200}_{last}.json",
+        'stesso nome, altra estensione': f"dataset_{last % 200}_{last}.zip",
+        'file assente': "aggiudicazioni_2099.zip",
+    }
+
+    print(f"{'Caso':32} {'lineare (us)':>14} {'indice (us)':>12}")
+    for label, filename in cases.items():
+        assert should_skip_download(filename, legacy) == should_skip_download(filename, index)
+        repeat_legacy = 1000 if label == 'nome esatto' else 5
+        legacy_us = _timeit(lambda: should_skip_download(filename, legacy), repeat_legacy)
+        index_us = _timeit(lambda: should_skip_download(filename, index), 10000)
+        print(f"{label:32} {legacy_us:14.2f} {index_us:12.2f}")
+
+
+# Cartelle di /database/JSON e nomi di file come pubblicati sul portale ANAC
+ANAC_FOLDERS = sorted(set(FOLDER_MAPPINGS.values()) | {
+    'ocds-appalti-ordinari_json', 'soggetti-attuatori-pnrr_json', 'anac-datamart_json',
+    'dati-contratti-pubblici_json', 'altri_file_json',
+})
+
+ANAC_DATASETS = [
+    'aggiudicatari', 'aggiudicazioni', 'avvio-contratto', 'bando_cig', 'categorie-opera',
+    'centri-di-costo', 'collaudo', 'cup', 'fine-contratto', 'fonti-finanziamento',
+    'indicatori-pnrrpnc', 'lavorazioni', 'misurepremiali-pnrrpnc', 'partecipanti',
+    'pubblicazioni', 'quadro-economico', 'smartcig', 'sospensioni', 'stati-avanzamento',
+    'stazioni-appaltanti', 'subappalti', 'varianti', 'ocds-appalti-ordinari',
+    'soggetti-attuatori-pnrr', 'smartcig-tipo-fattispecie-contrattuale', 'anac-datamart',
+    'dati-contratti-pubblici', 'informazioni-sulle-singole-procedure-di-affidamento',
+]
+
+
+def anac_filenames():
+    """Nomi di file realistici: archivi per anno e file mensili estratti."""
+    names = []
+    for dataset in ANAC_DATASETS:
+        names.append(f"{dataset}_json.zip")
+        for year in range(2013, 2025):
+            names.append(f"{dataset}-{year}_json.zip")
+            for month in range(1, 13):
+                names.append(f"{year}{month:02d}01-{dataset}_json.json")
+    return names
+
+
+def legacy_determine_target_folder(filename, available_folders):
+    """Implementazione precedente al FolderRouter, usata come riferimento."""
+    filename_lower = filename.lower()
+    for keyword, folder_name in FOLDER_MAPPINGS.items():
+        if keyword in filename_lower and folder_name in available_folders:
+            return folder_name
+    for folder in available_folders:
+        folder_base = folder.lower().replace('_json', '')
+        if any(part in filename_lower for part in folder_base.split('-')):
+            return folder
+    for folder in available_folders:
+        folder_lower = folder.lower().replace('_json', '')
+        file_parts = filename_lower.replace('.json', '').replace('.zip', '').split('_')
+        for part in file_parts:
+            if len(part) > 3 and part in folder_lower:
+                return folder
+    return None
+
+
+def bench_folder_router():
+    """Smistamento di nomi file ANAC: implementazione precedente contro FolderRouter."""
+    filenames = anac_filenames()
+    print(f"\n== determine_target_folder su {len(filenames)} nomi file, {len(ANAC_FOLDERS)} cartelle ==")
+
+    start = time.perf_counter()
+    router = FolderRouter(ANAC_FOLDERS)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    # Parità delle decisioni, anche con cartelle parziali
+    for folders in (ANAC_FOLDERS, ANAC_FOLDERS[::2], ANAC_FOLDERS[1::3], []):
+        check_router = FolderRouter(folders)
+        for filename in filenames + ['readme.txt', 'dati_vari.json', 'x--y.zip']:
+            expected = legacy_determine_target_folder(filename, folders)
+            assert check_router.route(filename) == expected, (filename, folders)
+    print(f"Parità con l'implementazione precedente: OK")
+
+    legacy_s = _timeit(lambda: [legacy_determine_target_folder(f, ANAC_FOLDERS) for f in filenames], 3) / 1e6
+    router_s = _timeit(lambda: [router.route(f) for f in filenames], 3) / 1e6
+
+    print(f"Compilazione router: {build_ms:.1f} ms")
+    print(f"Precedente:          {legacy_s * 1e6 / len(filenames):8.2f} us/file")
+    print(f"Router:              {router_s * 1e6 / len(filenames):8.2f} us/file")
+
+
+# Pagine del portale ANAC (CKAN) come restituite dal browser: elenco dei dataset e dettaglio
+ANAC_PORTAL = "https://dati.anticorruzione.it/opendata"
+
+_PAGE_HEADER = """<!DOCTYPE html><html lang="it"><head><meta charset="utf-8"><title>{title} - ANAC Open Data</title>
+<link rel="stylesheet" href="/opendata/webassets/base/main.css"><script src="/opendata/webassets/base/main.js"></script>
+</head><body><div class="account-masthead"><ul class="list-unstyled"><li><a href="/opendata/user/login">Accedi</a></li></ul></div>
+<header class="navbar masthead"><a class="logo" href="/opendata/"><img src="/opendata/base/images/logo.png" alt="ANAC"></a>
+<nav class="section navigation"><ul class="nav nav-pills"><li class="active"><a href="/opendata/dataset">Dataset</a></li>
+<li><a href="/opendata/organization">Organizzazioni</a></li><li><a href="/opendata/group">Gruppi</a></li>
+<li><a href="/opendata/about">Informazioni</a></li></ul></nav>
+<form class="site-search" action="/opendata/dataset" method="get"><input type="text" name="q"><button type="submit">Cerca</button></form>
+</header><div role="main"><div class="container"><ol class="breadcrumb"><li><a href="/opendata/">Home</a></li>
+<li><a href="/opendata/dataset">Dataset</a></li></ol>"""
+
+_PAGE_FOOTER = """</div></div><footer class="site-footer"><ul class="list-unstyled">
+<li><a href="https://www.anticorruzione.it/">Autorità Nazionale Anticorruzione</a></li>
+<li><a href="/opendata/api/3">API CKAN</a></li><li><a href="https://www.anticorruzione.it/privacy">Privacy</a></li>
+<li><a href="https://creativecommons.org/licenses/by/4.0/deed.it" rel="license">CC-BY 4.0</a></li>
+<li><a href="https://twitter.com/anticorruzione"><i class="fa fa-twitter"></i></a></li></ul></footer></body></html>"""
+
+
+def anac_listing_page(page_num, per_page=20, pages=3):
+    """Pagina page_num dell'elenco dei dataset, con formati e paginazione."""
+    items = []
+    for i in range(per_page):
+        name = f"{ANAC_DATASETS[(page_num * per_page + i) % len(ANAC_DATASETS)]}-{page_num}-{i}"
+        items.append(
+            f'<li class="dataset-item"><div class="dataset-content"><h3 class="dataset-heading">'
+            f'<a href="/opendata/dataset/{name}">{name.replace("-", " ").title()}</a></h3>'
+            f'<div>Dati relativi a {name} pubblicati dalla Banca Dati Nazionale dei Contratti Pubblici &amp; altro.</div></div>'
+            f'<ul class="dataset-resources list-unstyled">'
+            f'<li><a href="/opendata/dataset/{name}" class="badge badge-default" data-format="json">JSON</a></li>'
+            f'<li><a href="/opendata/dataset/{name}" class="badge badge-default" data-format="csv">CSV</a></li>'
+            f'<li><a href="/opendata/dataset/{name}" class="badge badge-default" data-format="ttl">TTL</a></li></ul></li>'
+        )
+    pagination = ''.join(
+        f'<li class="page-item{" active" if n == page_num else ""}"><a class="page-link" href="/opendata/dataset?page={n}">{n}</a></li>'
+        for n in range(1, pages + 1))
+    if page_num < pages:
+        pagination += f'<li class="page-item"><a class="page-link" href="/opendata/dataset?page={page_num + 1}">»</a></li>'
+    return (_PAGE_HEADER.format(title="Dataset")
+            + f'<h1>{per_page * pages} dataset trovati</h1><ul class="dataset-list list-unstyled">{"".join(items)}</ul>'
+            + f'<div class="pagination-wrapper"><ul class="pagination">{pagination}</ul></div>' + _PAGE_FOOTER)
+
+
+def anac_dataset_page(dataset, years=range(2013, 2025)):
+    """Pagina di dettaglio di un dataset con una risorsa JSON/ZIP, CSV e TTL per anno."""
+    resources = []
+    for year in years:
+        for fmt in ('json', 'csv', 'ttl'):
+            filename = f"{dataset}-{year}_{fmt}.{'zip' if fmt == 'json' else fmt}"
+            resource_id = f"{abs(hash((dataset, year, fmt))):032x}"[:32]
+            resources.append(
+                f'<li class="resource-item" data-id="{resource_id}">'
+                f'<a class="heading" href="/opendata/dataset/{dataset}/resource/{resource_id}" title="{filename}">'
+                f'{filename}<span class="format-label" property="dc:format" data-format="{fmt}">{fmt.upper()}</span></a>'
+                f'<p class="description">Dati {dataset} per l&#39;anno {year}</p>'
+                f'<div class="dropdown btn-group"><a href="#" class="btn btn-primary dropdown-toggle" data-toggle="dropdown">Esplora</a>'
+                f'<ul class="dropdown-menu"><li><a class="dropdown-item" href="/opendata/dataset/{dataset}/resource/{resource_id}">'
+                f'<i class="fa fa-info-circle"></i>Ulteriori informazioni</a></li>'
+                f'<li><a class="dropdown-item resource-url-analytics" target="_blank" '
+                f'href="{ANAC_PORTAL}/download/dataset/{dataset}/filesystem/{filename}">'
+                f'<i class="fa fa-arrow-circle-o-down"></i>Scarica</a></li></ul></div></li>'
+            )
+    return (_PAGE_HEADER.format(title=dataset)
+            + f'<div class="module-content"><h1 class="heading">{dataset}</h1><div class="notes embedded-content">'
+            + f'<p>Per la documentazione consultare <a href="https://www.anticorruzione.it/-/{dataset}">la pagina del dataset</a>.</p></div>'
+            + f'<section id="dataset-resources" class="resources"><h2>Dati e risorse</h2>'
+            + f'<ul class="resource-list">{"".join(resources)}</ul></section>'
+            + '<section class="additional-info"><table class="table"><tr><th>Licenza</th>'
+            + '<td><a href="https://creativecommons.org/licenses/by/4.0/deed.it">CC-BY 4.0</a></td></tr></table></section></div>'
+            + _PAGE_FOOTER)
+
+
+def legacy_extract_json_links(page_content, base_url, include_formats=('json', 'zip'), exclude_formats=('ttl', 'csv', 'xml')):
+    """Estrazione precedente a pagelinks (BeautifulSoup e una dozzina di ricerche), usata come riferimento."""
+    from bs4 import BeautifulSoup
+    from urllib.parse import urljoin, urlparse
+    from json_downloader.utils import is_json_or_zip_link
+
+    soup = BeautifulSoup(page_content, 'html.parser')
+    data_elements = [
+        soup.find_all('a', class_=lambda c: c and ('resource-url' in c or 'download' in c)),
+        soup.find_all('a', attrs={'data-format': lambda f: f and f.lower() in include_formats}),
+        soup.find_all('a', attrs={'data-resource-id': True}),
+        soup.find_all('a', href=lambda h: h and ('download' in h.lower() or 'resource' in h.lower() or 'dataset' in h.lower())),
+        soup.find_all('button', class_=lambda c: c and ('download' in c or 'resource' in c)),
+        soup.find_all('a', class_=lambda c: c and ('btn' in c and 'download' in c)),
+        soup.select('.resources a'),
+        soup.select('.resource-item a'),
+        soup.select('.dataset-resources a'),
+        soup.select('[data-module="resource-view"] a'),
+        soup.select('.resource-actions a')
+    ]
+    candidates = {element for elements in data_elements for element in elements if element.get('href')}
+    download_texts = ['vai alla risorsa', 'download', 'scarica', 'json', 'zip', 'apri', 'dati', 'open data',
+                      'dataset', 'risorsa', 'file', 'export', 'esporta']
+    for a in soup.find_all('a', href=True):
+        if any(text in a.get_text().lower().strip() for text in download_texts):
+            candidates.add(a)
+
+    links = set()
+    for element in candidates:
+        href = element.get('href')
+        href_lower = href.lower()
+        element_text = element.get_text().lower().strip()
+        if any(f'.{ext}' in href_lower for ext in exclude_formats):
+            continue
+        is_valid_link = (
+            is_json_or_zip_link(href) or '/download/' in href_lower or '/filesystem/' in href_lower or
+            '/resource/' in href_lower or 'format=json' in href_lower or
+            'api/action/datastore_search' in href_lower or any(fmt in href_lower for fmt in include_formats)
+        )
+        if not is_valid_link:
+            if 'json' in element_text or 'zip' in element_text or 'download' in element_text:
+                is_valid_link = True
+            if element.get('data-format') and element.get('data-format').lower() in include_formats:
+                is_valid_link = True
+        if not is_valid_link:
+            continue
+        full_url = href
+        if not href.startswith(('http://', 'https://')):
+            if href.startswith('/'):
+                full_url = urljoin(urlparse(base_url).scheme + "://" + urlparse(base_url).netloc, href)
+            else:
+                full_url = urljoin(base_url, href)
+        links.add(full_url)
+    return links
+
+
+def legacy_extract_dataset_links(page_content, base_url):
+    from bs4 import BeautifulSoup
+    from urllib.parse import urljoin, urlparse
+
+    links = []
+    for a in BeautifulSoup(page_content, 'html.parser').find_all('a', href=True):
+        href = a['href']
+        if '/dataset/' in href and not href.endswith(('.json', '.csv', '.xml')):
+            if not href.startswith(('http://', 'https://')):
+                if href.startswith('/'):
+                    href = urljoin(urlparse(base_url).scheme + "://" + urlparse(base_url).netloc, href)
+                else:
+                    href = urljoin(base_url, href)
+            links.append(href)
+    return links
+
+
+def legacy_find_next_page(page_content, current_page):
+    import re
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(page_content, 'html.parser')
+    next_link = soup.find('a', {'rel': 'next'}) or soup.find('a', string=re.compile(r'succes|next|avanti|prossim', re.I))
+    if current_page > 0 and not next_link:
+        next_link = soup.find('a', href=re.compile(f'[?&]page={current_page + 1}(?:&|$)'))
+    return next_link is not None
+
+
+def bench_page_links():
+    """Analisi delle pagine del portale: BeautifulSoup (precedente) contro un solo passaggio di pagelinks."""
+    from json_downloader.pagelinks import parse_page_links
+
+    base_url = f"{ANAC_PORTAL}/dataset"
+    listings = [(page_num, anac_listing_page(page_num)) for page_num in (1, 2, 3)]
+    datasets = [anac_dataset_page(dataset) for dataset in ANAC_DATASETS[:8]]
+    print(f"\n== Link da {len(listings)} pagine di elenco e {len(datasets)} pagine di dataset "
+          f"({sum(len(html) for html in datasets) // len(datasets) // 1024} KB ciascuna) ==")
+
+    # La parità dei risultati con l'implementazione precedente è verificata da test_pagelinks.py
+
+    def legacy_listing():
+        for page_num, html in listings:
+            legacy_extract_dataset_links(html, base_url)
+            legacy_find_next_page(html, page_num)
+
+    def single_pass_listing():
+        for page_num, html in listings:
+            parse_page_links(html, base_url).has_next_page(page_num)
+
+    rows = {
+        'elenco (dataset + paginazione)': (_timeit(legacy_listing, 5) / len(listings),
+                                            _timeit(single_pass_listing, 20) / len(listings)),
+        'dettaglio (risorse JSON/ZIP)': (_timeit(lambda: [legacy_extract_json_links(h, base_url) for h in datasets], 3) / len(datasets),
+                                         _timeit(lambda: [parse_page_links(h, base_url) for h in datasets], 10) / len(datasets)),
+    }
+    print(f"{'Pagina':32} {'BeautifulSoup (ms)':>19} {'pagelinks (ms)':>15}")
+    for label, (legacy_us, single_us) in rows.items():
+        print(f"{label:32} {legacy_us / 1000:19.2f} {single_us / 1000:15.2f}")
+
+
+_DOWNLOAD = f"{ANAC_PORTAL}/download/dataset"
+
+
+def legacy_is_json_or_zip_link(url):
+    """is_json_or_zip_link precedente a UrlClassifier (pattern ricostruiti a ogni chiamata), come riferimento."""
+    if not url:
+        return False
+    url_lower = url.lower()
+    is_json = url_lower.endswith('.json') or '_json.' in url_lower or '.json?' in url_lower
+    is_zip = url_lower.endswith('.zip') or '_zip.' in url_lower or '.zip?' in url_lower
+    common_patterns = ['/filesystem/[^/]*_json', '/resource/[^/]*_json', '/download/[^/]*json', 'format=json',
+                       '/json/', '_json_', 'json_download', 'download_json', 'json-data', 'data.json']
+    zip_patterns = [r'/filesystem/[^/]*_json\.zip', r'/resource/[^/]*_json\.zip', r'json.*\.zip',
+                    r'_json_.*\.zip', r'json[^/]*\.zip']
+    anac_specific_paths = ['/opendata/download/dataset/', '/download/dataset/', '/anac-dataset/', '/anac-datamart/',
+                           '/dati-contratti-pubblici/', '/ocds-appalti-ordinari-', '/smartcig-tipo-fattispecie-contrattuale/']
+    if is_json:
+        return True
+    if is_zip:
+        if any(pattern in url_lower for pattern in zip_patterns + anac_specific_paths):
+            return True
+        if 'json' in (url.split('/')[-1] if '/' in url else url).lower():
+            return True
+    return any(pattern in url_lower for pattern in common_patterns + anac_specific_paths)
+
+
+def anac_resource_urls():
+    """URL di download realistici: un archivio per dataset, anno, mese e formato."""
+    urls = []
+    for dataset in ANAC_DATASETS:
+        for year in range(2013, 2025):
+            for month in range(1, 13):
+                for fmt in ('json', 'csv', 'ttl', 'xml'):
+                    urls.append(f"{_DOWNLOAD}/{dataset}-{year}/filesystem/{year}{month:02d}01-{dataset}_{fmt}.zip")
+            urls.append(f"{ANAC_PORTAL}/dataset/{dataset}-{year}")
+            urls.append(f"{ANAC_PORTAL}/dataset/{dataset}-{year}/resource/{year:08x}-{dataset}")
+    return urls
+
+
+def bench_url_classifier():
+    """Classificazione dei link: is_json_or_zip_link precedente contro UrlClassifier compilato."""
+    from json_downloader.utils import UrlClassifier
+
+    classifier = UrlClassifier()
+
+    # Un anno di scoperte ripetute: centinaia di migliaia di URL
+    urls = anac_resource_urls() * 12
+    verdicts = {}
+    for url in urls:
+        verdict = classifier.classify(url)
+        verdicts[verdict] = verdicts.get(verdict, 0) + 1
+    print(f"\n== Classificazione di {len(urls)} URL ({', '.join(f'{v} {n}' for v, n in sorted(verdicts.items()))}) ==")
+    legacy_s = _timeit(lambda: [legacy_is_json_or_zip_link(url) for url in urls], 3) / 1e6
+    classifier_s = _timeit(lambda: [classifier.classify(url) for url in urls], 3) / 1e6
+    print(f"Precedente:     {legacy_s:6.2f} s ({legacy_s * 1e6 / len(urls):.2f} us/URL)")
+    print(f"UrlClassifier:  {classifier_s:6.2f} s ({classifier_s * 1e6 / len(urls):.2f} us/URL)")
+
+
+BENCHMARKS = {
+    'skip_check': bench_skip_check,
+    'folder_router': bench_folder_router,
+    'page_links': bench_page_links,
+    'url_classifier': bench_url_classifier,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del downloader ANAC")
+    parser.add_argument('names', nargs='*', metavar='nome',
+                        help=f"Benchmark da eseguire: {', '.join(BENCHMARKS)} (default: tutti)")
+    args = parser.parse_args()
+
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"benchmark sconosciuti: {', '.join(unknown)}")
+
+    for name in args.names or BENCHMARKS:
+        BENCHMARKS[name]()
+
+
+if __name__ == "__main__":
+    main()
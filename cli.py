@@ -7,8 +7,8 @@ from datetime import datetime
 import argparse
 # Import from json_downloader module
 from json_downloader.scraper import load_config, scrape_all_json_links
-from json_downloader.downloader import download_file, should_download, verify_file_integrity, process_downloaded_file
-from json_downloader.utils import setup_logger, ensure_dir, normalize_url, sanitize_filename, save_links_to_cache, load_links_from_cache, deduplicate_links, format_size, load_datasets_from_cache, save_datasets_to_cache, load_direct_links_from_cache, save_direct_links_to_cache
+from json_downloader.downloader import download_file, should_download, process_downloaded_file, has_pending_download, get_download_options
+from json_downloader.utils import setup_logger, ensure_dir, normalize_url, sanitize_filename, save_links_to_cache, load_links_from_cache, deduplicate_links, format_size, load_datasets_from_cache, save_datasets_to_cache, load_direct_links_from_cache, save_direct_links_to_cache, is_json_download_link
 import traceback
 
 class ANACDownloaderCLI:
@@ -51,6 +51,10 @@ class ANACDownloaderCLI:
             self.logger = setup_logger(self.config['log_file'])
             self.logger.info("ANAC JSON Downloader avviato")
             
+            # Sessione HTTP condivisa (connection pool, headers e limiti per host da config)
+            from json_downloader.http_session import configure_session
+            configure_session(self.config, logger=self.logger)
+            
             # Verifica e imposta correttamente le directory di download
             self.download_dir = os.path.abspath(self.config['download_dir'])
             self.config['download_dir'] = self.download_dir
@@ -298,22 +302,7 @@ class ANACDownloaderCLI:
         filter_json_only = input("Vuoi scaricare solo file JSON e ZIP contenenti JSON? (s/n): ").strip().lower() == 's'
         
         if filter_json_only:
-            filtered_links = []
-            for link in self.json_links:
-                link_lower = link.lower()
-                # Mantieni i link che terminano con .json o _json o .json.zip o contengono /json/ nel percorso
-                # Esclude esplicitamente i file CSV, TTL e altri formati
-                if (link_lower.endswith('.json') or 
-                    link_lower.endswith('_json.zip') or 
-                    '/json/' in link_lower or 
-                    'format=json' in link_lower):
-                    filtered_links.append(link)
-                # Esclude esplicitamente link che sembrano CSV o TTL o XML
-                elif any(ext in link_lower for ext in ['_csv.', '.csv.', '_ttl.', '.ttl.', '_xml.', '.xml.']):
-                    continue
-                # Per ZIP generici, li include solo se non contengono indicazioni CSV/TTL/XML
-                elif link_lower.endswith('.zip') and not any(ext in link_lower for ext in ['_csv', '.csv', '_ttl', '.ttl', '_xml', '.xml']):
-                    filtered_links.append(link)
+            filtered_links = [link for link in self.json_links if is_json_download_link(link)]
             
             original_count = len(self.json_links)
             self.json_links = filtered_links
@@ -344,8 +333,9 @@ class ANACDownloaderCLI:
         print("\nDownload in corso...")
         print("DEBUG: Inizializzazione processo di download...")
         
-        from json_downloader.downloader import download_file
-        from urllib.parse import urlparse
+        from json_downloader.scheduler import run_download_jobs, get_download_concurrency
+        from json_downloader.downloader import get_download_options
+        from json_downloader.retry import get_retry_policy, RetryStats, log_retry_summary
         import platform
         
         # Log del sistema operativo per debug
@@ -365,185 +355,63 @@ class ANACDownloaderCLI:
             print(f"DEBUG: ERRORE Permessi cartella download: {str(perm_error)}")
             print("DEBUG: Tentativo di utilizzare directory alternative...")
         
-        # Controlla il sistema operativo per gestire correttamente i percorsi
-        is_windows = platform.system() == 'Windows'
+        # I download falliti tornano in coda con backoff e jitter (run_download_jobs):
+        # download_file fa un solo tentativo e non blocca il worker in attesa
+        retry_policy = get_retry_policy(self.config)
+        retry_stats = RetryStats()
+        print(f"DEBUG: Utilizzando max_retries={retry_policy.max_retries} (nuovi tentativi in coda)")
+        
+        download_options = get_download_options(self.config)
+        download_options['max_retries'] = 1
+        
+        max_workers, per_host_limit = get_download_concurrency(self.config)
+        print(f"Download paralleli: {max_workers} (massimo {per_host_limit} per host)")
         
         downloaded_files = []
         files_by_dataset = {}  # Per tenere traccia di quali file sono in quali dataset
         
-        # Log prima di iniziare il ciclo di download
+        # Log prima di iniziare il download
         print(f"DEBUG: Preparazione download di {len(links_to_download)} file...")
         
-        for i, link in enumerate(links_to_download, 1):
-            try:
-                print(f"DEBUG: Elaborazione link {i}/{len(links_to_download)}: {link}")
-                
-                # Get filename from URL
-                file_name = os.path.basename(link.split('?')[0])
-                if not file_name:
-                    file_name = f"download_{i}.dat"
-                    print(f"DEBUG: Nome file non trovato nell'URL, generato automaticamente: {file_name}")
-                else:
-                    print(f"DEBUG: Nome file estratto dall'URL: {file_name}")
-                
-                # Rimuovi caratteri non validi dal nome file
-                original_name = file_name
-                file_name = sanitize_filename(file_name)
-                if file_name != original_name:
-                    print(f"DEBUG: Nome file sanitizzato da '{original_name}' a '{file_name}'")
-                
-                # Determina il dataset dal link
-                dataset_name = "altri_file"  # Default folder
-                
-                if organize_by_dataset:
-                    # Prova a estrarre il nome del dataset dall'URL
-                    parsed_url = urlparse(link)
-                    path_parts = parsed_url.path.strip('/').split('/')
-                    
-                    print(f"DEBUG: Analisi percorso URL per dataset: {parsed_url.path}")
-                    
-                    # Cerca la parte 'dataset' nell'URL
-                    if 'dataset' in path_parts:
-                        dataset_idx = path_parts.index('dataset')
-                        if dataset_idx + 1 < len(path_parts):
-                            dataset_name = path_parts[dataset_idx + 1]
-                            print(f"DEBUG: Dataset trovato nell'URL: {dataset_name}")
-                    
-                    # Se non riusciamo a estrarre il dataset dall'URL, usiamo il dominio
-                    if dataset_name == "altri_file" and parsed_url.netloc:
-                        dataset_name = parsed_url.netloc.replace('.', '_')
-                        print(f"DEBUG: Dataset non trovato, uso dominio: {dataset_name}")
-                
-                # Assicurati che il nome cartella sia valido
-                original_dataset_name = dataset_name
-                dataset_name = ''.join(c if c.isalnum() or c in '-_' else '_' for c in dataset_name)
-                if dataset_name != original_dataset_name:
-                    print(f"DEBUG: Nome dataset sanitizzato da '{original_dataset_name}' a '{dataset_name}'")
-                
-                # Full path with dataset subfolder
-                try:
-                    dataset_folder = os.path.join(self.config['download_dir'], dataset_name)
-                    print(f"DEBUG: Tentativo creazione cartella dataset: {dataset_folder}")
-                    
-                    try:
-                        os.makedirs(dataset_folder, exist_ok=True)
-                        # Verifica immediata dei permessi
-                        test_file = os.path.join(dataset_folder, '.write_test')
-                        with open(test_file, 'w') as f:
-                            f.write('test')
-                        os.remove(test_file)
-                        print(f"DEBUG: Cartella dataset creata con successo: {dataset_folder}")
-                        print(f"Cartella creata/verificata: {dataset_folder} (permessi OK)")
-                    except PermissionError as pe:
-                        print(f"DEBUG: ERRORE PERMESSI: {str(pe)}")
-                        print(f"Errore di permessi nella cartella {dataset_folder}: {str(pe)}")
-                        print("Tentativo di utilizzo della cartella principale...")
-                        dataset_folder = self.config['download_dir']
-                        # Verifica anche la cartella principale
-                        test_file = os.path.join(dataset_folder, '.write_test')
-                        try:
-                            with open(test_file, 'w') as f:
-                                f.write('test')
-                            os.remove(test_file)
-                            print(f"DEBUG: Cartella principale utilizzabile: {dataset_folder}")
-                        except Exception as mpe:
-                            # Se fallisce anche qui, usa la directory corrente
-                            print(f"DEBUG: ERRORE PERMESSI anche cartella principale: {str(mpe)}")
-                            print("Errore di permessi anche nella cartella principale.")
-                            dataset_folder = os.path.abspath('.')
-                            print(f"DEBUG: Uso directory corrente: {dataset_folder}")
-                except Exception as folder_error:
-                    print(f"DEBUG: ERRORE CREAZIONE CARTELLA: {str(folder_error)}")
-                    print(f"Errore nella creazione della cartella {dataset_folder}: {str(folder_error)}")
-                    print("Utilizzo cartella principale per i downloads...")
-                    dataset_folder = self.config['download_dir']
-                    
-                # Verifica se la cartella esiste effettivamente dopo la creazione
-                if not os.path.exists(dataset_folder):
-                    print(f"DEBUG: Impossibile verificare esistenza cartella: {dataset_folder}")
-                    print(f"Impossibile verificare la cartella {dataset_folder}. Utilizzo percorso alternativo.")
-                    # Prova la directory di lavoro corrente come ultima risorsa
-                    dataset_folder = os.path.abspath('.')
-                    print(f"DEBUG: Fallback a directory corrente: {dataset_folder}")
-                    print(f"Usando directory corrente: {dataset_folder}")
-                
-                # Combina percorso cartella e nome file
-                file_path = os.path.join(dataset_folder, file_name)
-                print(f"DEBUG: Percorso file completo: {file_path}")
-                
-                # Aggiorna il dizionario dei file per dataset
-                if dataset_name not in files_by_dataset:
-                    files_by_dataset[dataset_name] = []
-                
-                print(f"\n[{i}/{len(links_to_download)}] Scaricamento di {file_name}...")
-                print(f"Cartella di destinazione: {dataset_folder}")
-                
-                # Estrai solo i parametri necessari dalla configurazione
-                max_retries = 3  # Valore predefinito
-                if isinstance(self.config, dict) and 'max_retries' in self.config:
-                    max_retries = self.config['max_retries']
-                    print(f"DEBUG: Utilizzando max_retries={max_retries} dalla configurazione")
-                else:
-                    print(f"DEBUG: Utilizzando max_retries={max_retries} predefinito")
-                
-                # Verifica se il file esiste già
-                if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
-                    print(f"DEBUG: File già esistente: {file_path} ({os.path.getsize(file_path)} bytes)")
-                    # Non chiediamo più conferma, saltiamo automaticamente
-                    print(f"File {file_name} già esiste. Download saltato automaticamente.")
-                    continue
-                
-                print(f"DEBUG: Avvio download di {link} in {file_path}")
-                file_hash = download_file(
-                    link, 
-                    file_path, 
-                    logger=self.logger, 
-                    max_retries=max_retries
-                )
-                
-                print(f"DEBUG: Risultato download: hash={file_hash}")
-                
-                if file_hash:
-                    downloaded_files.append(file_path)
-                    files_by_dataset[dataset_name].append(file_path)
-                    print(f"Download completato: {file_path}")
-                    print(f"SHA256: {file_hash}")
-                    
-                    # If it's a ZIP file, extract JSON files
-                    if file_path.lower().endswith('.zip') and extract_zip:
-                        print("Estrazione dei file JSON dall'archivio ZIP...")
-                        extract_dir = file_path[:-4]  # Remove .zip
-                        try:
-                            os.makedirs(extract_dir, exist_ok=True)
-                            print(f"Cartella di estrazione creata: {extract_dir}")
-                            
-                            from json_downloader.utils import extract_zip_files
-                            extracted = extract_zip_files(file_path, extract_dir, self.logger)
-                            
-                            if extracted:
-                                print(f"Estratti {len(extracted)} file da {file_name}")
-                                files_by_dataset[dataset_name].extend(extracted)
-                                for ext_file in extracted:
-                                    print(f" - {os.path.basename(ext_file)}")
-                                downloaded_files.extend(extracted)
-                            else:
-                                print("Nessun file JSON trovato nell'archivio ZIP.")
-                        except Exception as extract_error:
-                            print(f"Errore durante l'estrazione: {str(extract_error)}")
-                            print("L'estrazione verrà saltata.")
-                    elif file_path.lower().endswith('.zip') and not extract_zip:
-                        print("File ZIP scaricato ma non estratto (come richiesto).")
-                else:
-                    print(f"Errore durante il download di {link}")
-            except Exception as e:
-                print(f"Errore durante il download: {str(e)}")
-                traceback.print_exc()
-                continue
+        def worker(index, link):
+            return self._download_link_to_folder(
+                index + 1,
+                len(links_to_download),
+                link,
+                organize_by_dataset,
+                extract_zip,
+                download_options,
+                show_progress=(max_workers == 1)
+            )
+        
+        results = run_download_jobs(
+            links_to_download,
+            worker,
+            max_workers=max_workers,
+            per_host_limit=per_host_limit,
+            logger=self.logger,
+            retry_policy=retry_policy,
+            retry_stats=retry_stats
+        )
+        
+        for result in results:
+            dataset_name = result.get('dataset')
+            if dataset_name and dataset_name not in files_by_dataset:
+                files_by_dataset[dataset_name] = []
+            if result.get('success') and not result.get('skipped'):
+                downloaded_files.append(result['file_path'])
+                downloaded_files.extend(result.get('extracted_files', []))
+                files_by_dataset[dataset_name].append(result['file_path'])
+                files_by_dataset[dataset_name].extend(result.get('extracted_files', []))
         
         # Mostra il riepilogo organizzato per dataset
         print("\nScaricamento completato.")
         print(f"File scaricati con successo: {len(downloaded_files)}")
         
+        from json_downloader.http_session import log_connection_stats
+        log_connection_stats(self.logger)
+        log_retry_summary(retry_stats, self.logger)
+        
         if organize_by_dataset and files_by_dataset:
             print("\nFiles organizzati per dataset:")
             for dataset, files in files_by_dataset.items():
@@ -554,6 +422,207 @@ class ANACDownloaderCLI:
         
         print("\nScaricamento completato.")
     
+    def _download_link_to_folder(self, i, total, link, organize_by_dataset, extract_zip, download_options, show_progress=True):
+        """
+        Scarica un singolo link nella cartella del dataset ed eventualmente estrae lo ZIP.
+        
+        Returns:
+            dict: Risultato del download (success, skipped, dataset, file_path, hash, extracted_files, error)
+        """
+        from json_downloader.downloader import download_file
+        from urllib.parse import urlparse
+        
+        print(f"DEBUG: Elaborazione link {i}/{total}: {link}")
+        
+        # Get filename from URL
+        file_name = os.path.basename(link.split('?')[0])
+        if not file_name:
+            file_name = f"download_{i}.dat"
+            print(f"DEBUG: Nome file non trovato nell'URL, generato automaticamente: {file_name}")
+        else:
+            print(f"DEBUG: Nome file estratto dall'URL: {file_name}")
+        
+        # Rimuovi caratteri non validi dal nome file
+        original_name = file_name
+        file_name = sanitize_filename(file_name)
+        if file_name != original_name:
+            print(f"DEBUG: Nome file sanitizzato da '{original_name}' a '{file_name}'")
+        
+        # Determina il dataset dal link
+        dataset_name = "altri_file"  # Default folder
+        
+        if organize_by_dataset:
+            # Prova a estrarre il nome del dataset dall'URL
+            parsed_url = urlparse(link)
+            path_parts = parsed_url.path.strip('/').split('/')
+            
+            print(f"DEBUG: Analisi percorso URL per dataset: {parsed_url.path}")
+            
+            # Cerca la parte 'dataset' nell'URL
+            if 'dataset' in path_parts:
+                dataset_idx = path_parts.index('dataset')
+                if dataset_idx + 1 < len(path_parts):
+                    dataset_name = path_parts[dataset_idx + 1]
+                    print(f"DEBUG: Dataset trovato nell'URL: {dataset_name}")
+            
+            # Se non riusciamo a estrarre il dataset dall'URL, usiamo il dominio
+            if dataset_name == "altri_file" and parsed_url.netloc:
+                dataset_name = parsed_url.netloc.replace('.', '_')
+                print(f"DEBUG: Dataset non trovato, uso dominio: {dataset_name}")
+        
+        # Assicurati che il nome cartella sia valido
+        original_dataset_name = dataset_name
+        dataset_name = ''.join(c if c.isalnum() or c in '-_' else '_' for c in dataset_name)
+        if dataset_name != original_dataset_name:
+            print(f"DEBUG: Nome dataset sanitizzato da '{original_dataset_name}' a '{dataset_name}'")
+        
+        result = {
+            'success': False,
+            'link': link,
+            'dataset': dataset_name,
+            'extracted_files': []
+        }
+        
+        # Full path with dataset subfolder
+        try:
+            dataset_folder = os.path.join(self.config['download_dir'], dataset_name)
+            print(f"DEBUG: Tentativo creazione cartella dataset: {dataset_folder}")
+            
+            try:
+                os.makedirs(dataset_folder, exist_ok=True)
+                # Verifica immediata dei permessi
+                test_file = os.path.join(dataset_folder, f'.write_test_{i}')
+                with open(test_file, 'w') as f:
+                    f.write('test')
+                os.remove(test_file)
+                print(f"DEBUG: Cartella dataset creata con successo: {dataset_folder}")
+                print(f"Cartella creata/verificata: {dataset_folder} (permessi OK)")
+            except PermissionError as pe:
+                print(f"DEBUG: ERRORE PERMESSI: {str(pe)}")
+                print(f"Errore di permessi nella cartella {dataset_folder}: {str(pe)}")
+                print("Tentativo di utilizzo della cartella principale...")
+                dataset_folder = self.config['download_dir']
+                # Verifica anche la cartella principale
+                test_file = os.path.join(dataset_folder, f'.write_test_{i}')
+                try:
+                    with open(test_file, 'w') as f:
+                        f.write('test')
+                    os.remove(test_file)
+                    print(f"DEBUG: Cartella principale utilizzabile: {dataset_folder}")
+                except Exception as mpe:
+                    # Se fallisce anche qui, usa la directory corrente
+                    print(f"DEBUG: ERRORE PERMESSI anche cartella principale: {str(mpe)}")
+                    print("Errore di permessi anche nella cartella principale.")
+                    dataset_folder = os.path.abspath('.')
+                    print(f"DEBUG: Uso directory corrente: {dataset_folder}")
+        except Exception as folder_error:
+            print(f"DEBUG: ERRORE CREAZIONE CARTELLA: {str(folder_error)}")
+            print(f"Errore nella creazione della cartella {dataset_folder}: {str(folder_error)}")
+            print("Utilizzo cartella principale per i downloads...")
+            dataset_folder = self.config['download_dir']
+            
+        # Verifica se la cartella esiste effettivamente dopo la creazione
+        if not os.path.exists(dataset_folder):
+            print(f"DEBUG: Impossibile verificare esistenza cartella: {dataset_folder}")
+            print(f"Impossibile verificare la cartella {dataset_folder}. Utilizzo percorso alternativo.")
+            # Prova la directory di lavoro corrente come ultima risorsa
+            dataset_folder = os.path.abspath('.')
+            print(f"DEBUG: Fallback a directory corrente: {dataset_folder}")
+            print(f"Usando directory corrente: {dataset_folder}")
+        
+        # Combina percorso cartella e nome file
+        file_path = os.path.join(dataset_folder, file_name)
+        result['file_path'] = file_path
+        print(f"DEBUG: Percorso file completo: {file_path}")
+        
+        print(f"\n[{i}/{total}] Scaricamento di {file_name}...")
+        print(f"Cartella di destinazione: {dataset_folder}")
+        
+        # Verifica se il file esiste già (in modalità refresh decide il server con una richiesta condizionale)
+        refresh = download_options.get('refresh')
+        if (os.path.exists(file_path) and os.path.getsize(file_path) > 0 and not has_pending_download(file_path)
+                and not refresh):
+            print(f"DEBUG: File già esistente: {file_path} ({os.path.getsize(file_path)} bytes)")
+            # Non chiediamo più conferma, saltiamo automaticamente
+            print(f"File {file_name} già esiste. Download saltato automaticamente.")
+            result['success'] = True
+            result['skipped'] = True
+            return result
+        
+        # Gli archivi ZIP vengono estratti mentre arrivano, se la configurazione lo consente
+        extractor = None
+        if extract_zip:
+            from json_downloader.zipstream import create_stream_extractor
+            extractor = create_stream_extractor(self.config, file_path, file_path[:-4], logger=self.logger)
+        
+        print(f"DEBUG: Avvio download di {link} in {file_path}")
+        file_hash = download_file(
+            link, 
+            file_path, 
+            logger=self.logger, 
+            show_progress=show_progress,
+            on_chunk=extractor.feed if extractor else None,
+            **download_options
+        )
+        
+        print(f"DEBUG: Risultato download: hash={file_hash}")
+        
+        if not file_hash:
+            print(f"Errore durante il download di {link}")
+            if extractor:
+                # Il nuovo tentativo userà un altro estrattore: niente membri .part orfani
+                extractor.abort()
+            from json_downloader.downloader import last_download_failure
+            failure = last_download_failure() or {}
+            result['error'] = failure.get('error', 'Download fallito')
+            result['retryable'] = failure.get('retryable', True)
+            return result
+        
+        result['success'] = True
+        result['hash'] = file_hash
+        
+        from json_downloader.downloader import last_download_reused
+        if last_download_reused():
+            # Copia locale tenuta (non modificata sul server o non verificabile): niente estrazione
+            metadata_store = download_options.get('metadata_store')
+            if refresh and metadata_store is not None and metadata_store.was_not_modified(link):
+                print(f"File {file_name} non modificato sul server. Download saltato.")
+            else:
+                print(f"File {file_name} già esistente. Download saltato.")
+            result['skipped'] = True
+            return result
+        
+        print(f"Download completato: {file_path}")
+        print(f"SHA256: {file_hash}")
+        
+        # If it's a ZIP file, extract JSON files
+        if file_path.lower().endswith('.zip') and extract_zip:
+            print("Estrazione dei file JSON dall'archivio ZIP...")
+            extract_dir = file_path[:-4]  # Remove .zip
+            try:
+                os.makedirs(extract_dir, exist_ok=True)
+                print(f"Cartella di estrazione creata: {extract_dir}")
+                
+                from json_downloader.zipstream import extract_downloaded_zip
+                from json_downloader.extraction import get_extract_options
+                extracted = extract_downloaded_zip(file_path, extract_dir, self.logger, extractor,
+                                                   **get_extract_options(self.config))
+                
+                if extracted:
+                    print(f"Estratti {len(extracted)} file da {file_name}")
+                    for ext_file in extracted:
+                        print(f" - {os.path.basename(ext_file)}")
+                    result['extracted_files'] = extracted
+                else:
+                    print("Nessun file JSON trovato nell'archivio ZIP.")
+            except Exception as extract_error:
+                print(f"Errore durante l'estrazione: {str(extract_error)}")
+                print("L'estrazione verrà saltata.")
+        elif file_path.lower().endswith('.zip') and not extract_zip:
+            print("File ZIP scaricato ma non estratto (come richiesto).")
+        
+        return result
+    
     def verify_downloaded_files(self):
         """Verify integrity of downloaded files."""
         print("\n" + "=" * 60)
@@ -566,43 +635,40 @@ class ANACDownloaderCLI:
             print(f"Directory {download_dir} non trovata.")
             return
         
-        # Get all files in download directory
-        all_files = []
-        for root, _, files in os.walk(download_dir):
-            for file in files:
-                file_path = os.path.join(root, file)
-                all_files.append(file_path)
+        # Get all files in download directory (esclusi i report)
+        from json_downloader.verifier import collect_files, verify_files, get_verify_options, save_verification_report
+        all_files = collect_files(download_dir)
         
         if not all_files:
             print(f"Nessun file trovato nella directory {download_dir}.")
             return
         
         print(f"Trovati {len(all_files)} file totali.")
-        print("Verifica dell'integrità in corso...")
         
-        valid_files = 0
-        damaged_files = 0
+        verify_options = get_verify_options(self.config)
+        print(f"Verifica dell'integrità in corso ({verify_options['workers']} worker)...")
         
-        from json_downloader.downloader import verify_file_integrity
+        def on_result(done, total, result):
+            name = os.path.basename(result['path'])
+            if result['valid']:
+                records = f" ({result['records']} record)" if result.get('records') is not None else ""
+                print(f"[{done}/{total}] {name} ✅ File integro.{records}")
+            else:
+                offset = f" (byte {result['error_offset']})" if result.get('error_offset') is not None else ""
+                print(f"[{done}/{total}] {name} ❌ File corrotto o incompleto: {result['error']}{offset}")
         
-        for i, file_path in enumerate(all_files, 1):
-            try:
-                print(f"[{i}/{len(all_files)}] Verifica di {os.path.basename(file_path)}...", end="")
-                is_valid = verify_file_integrity(file_path)
-                
-                if is_valid:
-                    print(" ✅ File integro.")
-                    valid_files += 1
-                else:
-                    print(" ❌ File corrotto o incompleto.")
-                    damaged_files += 1
-            except Exception as e:
-                print(f" ❌ Errore: {str(e)}")
-                damaged_files += 1
+        summary = verify_files(all_files, on_result=on_result, logger=self.logger, **verify_options)
         
         print("\nVerifica completata.")
-        print(f"File integri: {valid_files}")
-        print(f"File corrotti: {damaged_files}")
+        print(f"File integri: {summary['valid']}")
+        print(f"File corrotti: {summary['invalid']}")
+        if 'records' in summary:
+            print(f"Record JSON validati: {summary['records']}")
+        print(f"Tempo impiegato: {summary['elapsed']:.1f}s")
+        
+        if self.config.get('save_report', True):
+            report_path = save_verification_report(summary, os.path.join(download_dir, 'reports'), download_dir)
+            print(f"Report salvato in: {report_path}")
     
     def display_cached_links(self):
         """Display all links in the cache."""
@@ -880,18 +946,31 @@ class ANACDownloaderCLI:
                     
                     try:
                         print("Creazione nuovo contesto...")
+                        from json_downloader.http_session import get_user_agent
                         context = browser.new_context(
                             viewport={'width': 1280, 'height': 800},
-                            user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/96.0.4664.110 Safari/537.36'
+                            user_agent=get_user_agent(self.config)
                         )
+                        # Blocca immagini, font, stili e host di terze parti: servono solo i link
+                        from json_downloader.browser import RequestFilter, PageTimings, PageTimer, get_request_filter_options, get_readiness_options, wait_until_ready, log_browser_stats
+                        request_filter = RequestFilter(dataset_url, **get_request_filter_options(self.config))
+                        request_filter.install(context)
+                        timings = PageTimings()
                         page = context.new_page()
                         
                         # Imposta un timeout più breve ma ragionevole
                         navigation_timeout = min(self.config.get('timeout', 30), 60) * 1000  # Massimo 60 secondi
                         
                         print(f"Navigazione a {dataset_url}... (timeout: {navigation_timeout/1000}s)")
+                        from json_downloader.governor import get_rate_governor
+                        governor = get_rate_governor(self.config)
                         try:
+                            governor.acquire_request(dataset_url)
+                            timer = PageTimer(timings, dataset_url)
                             response = page.goto(dataset_url, timeout=navigation_timeout, wait_until="domcontentloaded")
+                            timer.responded()
+                            if response:
+                                governor.observe(dataset_url, response.status, response.headers)
                         except TimeoutError:
                             print("Timeout durante il caricamento iniziale. Provo a continuare comunque...")
                             response = None
@@ -920,19 +999,16 @@ class ANACDownloaderCLI:
                         else:
                             # Attendi caricamento dinamico con un timeout ragionevole
                             print("Pagina caricata. Attendo il caricamento completo...")
-                            try:
-                                page.wait_for_load_state("networkidle", timeout=navigation_timeout)
+                            # Elenco delle risorse presente e link stabili, al massimo page_ready_timeout
+                            if wait_until_ready(page, **get_readiness_options(self.config)):
                                 print("Caricamento completato.")
-                            except PlaywrightTimeout:
+                            else:
                                 print("Timeout durante l'attesa del caricamento completo. Continuo comunque...")
                             
-                            # Scorri pagina per attivare lazy loading
-                            print("Scorrimento pagina per attivare lazy loading...")
-                            page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
-                            page.wait_for_timeout(2000)  # Attendi 2 secondi per il caricamento
-                            
                             print("Estrazione contenuto della pagina...")
                             content = page.content()
+                            timer.ready()
+                            log_browser_stats(timings, request_filter, self.logger)
                             
                             # Estrai link ai file JSON/ZIP
                             print("Ricerca link ai file JSON/ZIP...")
@@ -1019,22 +1095,7 @@ class ANACDownloaderCLI:
             filter_json_only = input("\nVuoi scaricare solo file JSON e ZIP contenenti JSON? (s/n): ").strip().lower() == 's'
             
             if filter_json_only:
-                filtered_links = set()
-                for link in json_links:
-                    link_lower = link.lower()
-                    # Mantieni i link che terminano con .json o _json o .json.zip o contengono /json/ nel percorso
-                    # Esclude esplicitamente i file CSV, TTL e altri formati
-                    if (link_lower.endswith('.json') or 
-                        link_lower.endswith('_json.zip') or 
-                        '/json/' in link_lower or 
-                        'format=json' in link_lower):
-                        filtered_links.add(link)
-                    # Esclude esplicitamente link che sembrano CSV o TTL o XML
-                    elif any(ext in link_lower for ext in ['_csv.', '.csv.', '_ttl.', '.ttl.', '_xml.', '.xml.']):
-                        continue
-                    # Per ZIP generici, li include solo se non contengono indicazioni CSV/TTL/XML
-                    elif link_lower.endswith('.zip') and not any(ext in link_lower for ext in ['_csv', '.csv', '_ttl', '.ttl', '_xml', '.xml']):
-                        filtered_links.add(link)
+                filtered_links = {link for link in json_links if is_json_download_link(link)}
                 
                 original_count = len(json_links)
                 json_links = filtered_links
@@ -1067,7 +1128,7 @@ class ANACDownloaderCLI:
                     file_path = os.path.join(dataset_folder, file_name)
                     
                     # Verifica se il file esiste già
-                    if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
+                    if os.path.exists(file_path) and os.path.getsize(file_path) > 0 and not has_pending_download(file_path):
                         print(f"File {file_name} già esiste. Download saltato automaticamente.")
                         continue
                     
@@ -1081,11 +1142,20 @@ class ANACDownloaderCLI:
                         if isinstance(self.config, dict) and 'max_retries' in self.config:
                             max_retries = self.config['max_retries']
                             
+                        download_options = get_download_options(self.config)
+                        download_options['max_retries'] = max_retries
+                        
+                        extractor = None
+                        if extract_zip:
+                            from json_downloader.zipstream import create_stream_extractor
+                            extractor = create_stream_extractor(self.config, file_path, file_path[:-4], logger=self.logger)
+                        
                         file_hash = download_file(
                             link, 
                             file_path, 
                             logger=self.logger, 
-                            max_retries=max_retries
+                            on_chunk=extractor.feed if extractor else None,
+                            **download_options
                         )
                         
                         # Se l'hash è None, il download è fallito
@@ -1098,8 +1168,10 @@ class ANACDownloaderCLI:
                             if file_path.lower().endswith('.zip') and extract_zip:
                                 print("Estrazione dei file JSON dall'archivio ZIP...")
                                 extract_dir = file_path[:-4]  # Rimuovi .zip
-                                from json_downloader.utils import extract_zip_files
-                                extracted = extract_zip_files(file_path, extract_dir, self.logger)
+                                from json_downloader.zipstream import extract_downloaded_zip
+                                from json_downloader.extraction import get_extract_options
+                                extracted = extract_downloaded_zip(file_path, extract_dir, self.logger, extractor,
+                                                                   **get_extract_options(self.config))
                                 
                                 if extracted:
                                     print(f"Estratti {len(extracted)} file da {file_name}")
@@ -1112,6 +1184,8 @@ class ANACDownloaderCLI:
                                 print("File ZIP scaricato ma non estratto (come richiesto).")
                         else:
                             print(f"Errore durante il download di {link}")
+                            if extractor:
+                                extractor.abort()
                     except Exception as e:
                         print(f"Errore durante il download: {str(e)}")
                 
@@ -1206,7 +1280,7 @@ class ANACDownloaderCLI:
         file_path = os.path.join(download_folder, file_name)
         
         # Verifica se il file esiste già
-        if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
+        if os.path.exists(file_path) and os.path.getsize(file_path) > 0 and not has_pending_download(file_path):
             print(f"File {file_name} già esiste. Download saltato automaticamente.")
             
             # Chiedi se aggiungere il link alla cache anche se saltato
@@ -1230,11 +1304,20 @@ class ANACDownloaderCLI:
             if isinstance(self.config, dict) and 'max_retries' in self.config:
                 max_retries = self.config['max_retries']
                 
+            download_options = get_download_options(self.config)
+            download_options['max_retries'] = max_retries
+            
+            extractor = None
+            if extract_zip:
+                from json_downloader.zipstream import create_stream_extractor
+                extractor = create_stream_extractor(self.config, file_path, file_path[:-4], logger=self.logger)
+            
             file_hash = download_file(
                 custom_link, 
                 file_path, 
                 logger=self.logger, 
-                max_retries=max_retries
+                on_chunk=extractor.feed if extractor else None,
+                **download_options
             )
             
             # Se l'hash è None, il download è fallito
@@ -1246,8 +1329,10 @@ class ANACDownloaderCLI:
                 if file_path.lower().endswith('.zip') and extract_zip:
                     print("\nEstrazione dei file JSON dall'archivio ZIP...")
                     extract_dir = file_path[:-4]  # Rimuovi .zip
-                    from json_downloader.utils import extract_zip_files
-                    extracted = extract_zip_files(file_path, extract_dir, self.logger)
+                    from json_downloader.zipstream import extract_downloaded_zip
+                    from json_downloader.extraction import get_extract_options
+                    extracted = extract_downloaded_zip(file_path, extract_dir, self.logger, extractor,
+                                                       **get_extract_options(self.config))
                     
                     if extracted:
                         print(f"Estratti {len(extracted)} file da {file_name}:")
@@ -1269,6 +1354,8 @@ class ANACDownloaderCLI:
                         print("Il link era già presente nella cache.")
             else:
                 print(f"Errore durante il download da {custom_link}")
+                if extractor:
+                    extractor.abort()
         except Exception as e:
             print(f"Errore durante il download: {str(e)}")
             traceback.print_exc()
@@ -1320,8 +1407,17 @@ class ANACDownloaderCLI:
         
         # Estrai i file
         extracted_count = 0
+        skipped_count = 0
         error_count = 0
         
+        # I file estratti vengono registrati nel catalogo usato per evitare riscaricamenti
+        from json_downloader.catalog import get_file_catalog
+        catalog = get_file_catalog(json_dir)
+        
+        # Membri di ogni archivio decompressi in parallelo
+        from json_downloader.extraction import get_extract_options
+        extract_options = get_extract_options(self.config)
+        
         for i, zip_path in enumerate(zip_files, 1):
             try:
                 print(f"\n[{i}/{len(zip_files)}] Estrazione di {os.path.basename(zip_path)}...")
@@ -1331,14 +1427,25 @@ class ANACDownloaderCLI:
                 extract_dir = os.path.join(json_dir, zip_name)
                 os.makedirs(extract_dir, exist_ok=True)
                 
-                # Estrai i file
-                from json_downloader.utils import extract_zip_files
-                extracted = extract_zip_files(zip_path, extract_dir, self.logger)
+                # Estrai i file JSON, saltando quelli già estratti con lo stesso CRC e dimensione
+                from json_downloader.extraction import extract_members
+                result = extract_members(zip_path, extract_dir, member_filter=lambda name: name.endswith('.json'),
+                                         logger=self.logger, catalog=catalog, **extract_options)
+                extracted = result['extracted']
+                if not extracted and not result['skipped'] and not result['errors']:
+                    # Nessun JSON nell'archivio: estrazione completa come in passato
+                    from json_downloader.utils import extract_zip_files
+                    extracted = extract_zip_files(zip_path, extract_dir, self.logger, **extract_options)
                 
+                if result['skipped']:
+                    print(f"⊙ {len(result['skipped'])} file invariati non riscritti")
+                    skipped_count += len(result['skipped'])
                 if extracted:
                     print(f"✓ Estratti {len(extracted)} file in {extract_dir}")
                     extracted_count += len(extracted)
-                else:
+                    for extracted_path in extracted:
+                        catalog.add_file(extracted_path)
+                elif not result['skipped']:
                     print("! Nessun file estratto (possibilmente nessun file JSON trovato)")
                 
             except Exception as e:
@@ -1352,6 +1459,7 @@ class ANACDownloaderCLI:
         print("ESTRAZIONE COMPLETATA")
         print("=" * 60)
         print(f"✓ File estratti con successo: {extracted_count}")
+        print(f"⊙ File invariati non riscritti: {skipped_count}")
         print(f"✗ Errori durante l'estrazione: {error_count}")
         print(f"📁 Directory di destinazione: {json_dir}")
 
@@ -1370,16 +1478,18 @@ class ANACDownloaderCLI:
         
         print(f"Path database verificato: {database_path}")
         
-        # Scansiona i file esistenti
+        # Aggiorna il catalogo dei file esistenti (riscansiona solo le cartelle modificate)
         try:
-            from json_downloader.utils import scan_existing_files
-            existing_files, available_folders = scan_existing_files()
+            from json_downloader.catalog import get_file_catalog
+            catalog = get_file_catalog(database_path)
+            catalog.sync()
+            available_folders = catalog.folders()
             
             print(f"\nTrovate {len(available_folders)} cartelle disponibili per lo smistamento:")
             for i, folder in enumerate(available_folders, 1):
                 print(f"  {i}. {folder}")
             
-            print(f"\nTrovati {len(existing_files)} file già presenti nel database.")
+            print(f"\nTrovati {len(catalog)} file già presenti nel database.")
             
         except Exception as e:
             print(f"Errore nella scansione del database: {e}")
@@ -1398,21 +1508,7 @@ class ANACDownloaderCLI:
         filter_json_only = input("Vuoi scaricare solo file JSON e ZIP contenenti JSON? (s/n): ").strip().lower() == 's'
         
         if filter_json_only:
-            filtered_links = []
-            for link in self.json_links:
-                link_lower = link.lower()
-                # Mantieni i link che terminano con .json o _json o .json.zip o contengono /json/ nel percorso
-                if (link_lower.endswith('.json') or 
-                    link_lower.endswith('_json.zip') or 
-                    '/json/' in link_lower or 
-                    'format=json' in link_lower):
-                    filtered_links.append(link)
-                # Esclude esplicitamente link che sembrano CSV o TTL o XML
-                elif any(ext in link_lower for ext in ['_csv.', '.csv.', '_ttl.', '.ttl.', '_xml.', '.xml.']):
-                    continue
-                # Per ZIP generici, li include solo se non contengono indicazioni CSV/TTL/XML
-                elif link_lower.endswith('.zip') and not any(ext in link_lower for ext in ['_csv', '.csv', '_ttl', '.ttl', '_xml', '.xml']):
-                    filtered_links.append(link)
+            filtered_links = [link for link in self.json_links if is_json_download_link(link)]
             
             original_count = len(self.json_links)
             self.json_links = filtered_links
@@ -1442,47 +1538,67 @@ class ANACDownloaderCLI:
         # Download files with auto-sorting
         print("\nDownload con smistamento automatico in corso...")
         
-        from json_downloader.downloader import download_with_auto_sorting
+        from json_downloader.downloader import download_with_auto_sorting, get_download_options
+        from json_downloader.zipstream import stream_extraction_enabled
+        from json_downloader.extraction import get_extract_options
+        from json_downloader.scheduler import run_download_jobs, get_download_concurrency
+        from json_downloader.retry import get_retry_policy, RetryStats, log_retry_summary
         
         downloaded_files = []
         skipped_files = []
         error_files = []
         files_by_folder = {}
         
-        for i, link in enumerate(links_to_download, 1):
-            try:
-                print(f"\n[{i}/{len(links_to_download)}] Elaborazione: {os.path.basename(link.split('?')[0])}")
-                
-                result = download_with_auto_sorting(
-                    link,
-                    self.config['download_dir'],
-                    logger=self.logger,
-                    show_progress=True,
-                    extract_zip=extract_zip
-                )
-                
-                if result['success']:
-                    if result.get('skipped', False):
-                        skipped_files.append(result)
-                        print(f"✓ Saltato: {result['filename']} (già esistente)")
-                    else:
-                        downloaded_files.append(result)
-                        folder = result['target_folder']
-                        if folder not in files_by_folder:
-                            files_by_folder[folder] = []
-                        files_by_folder[folder].append(result['filename'])
-                        print(f"✓ Scaricato: {result['filename']} → {folder}")
-                        
-                        if result.get('extracted_files'):
-                            print(f"  Estratti {len(result['extracted_files'])} file")
+        max_workers, per_host_limit = get_download_concurrency(self.config)
+        print(f"Download paralleli: {max_workers} (massimo {per_host_limit} per host)")
+        
+        # I download falliti tornano in coda con backoff e jitter invece di bloccare il worker
+        download_options = get_download_options(self.config)
+        download_options['max_retries'] = 1
+        retry_stats = RetryStats()
+        
+        def worker(index, link):
+            print(f"\n[{index + 1}/{len(links_to_download)}] Elaborazione: {os.path.basename(link.split('?')[0])}")
+            return download_with_auto_sorting(
+                link,
+                self.config['download_dir'],
+                logger=self.logger,
+                show_progress=(max_workers == 1),
+                extract_zip=extract_zip,
+                download_options=download_options,
+                stream_extract=stream_extraction_enabled(self.config),
+                extract_options=get_extract_options(self.config)
+            )
+        
+        def on_result(index, link, result):
+            if result['success']:
+                if result.get('skipped', False):
+                    skipped_files.append(result)
+                    print(f"✓ Saltato: {result['filename']} (già esistente)")
                 else:
-                    error_files.append({'link': link, 'error': result.get('error', 'Errore sconosciuto')})
-                    print(f"✗ Errore: {result.get('error', 'Errore sconosciuto')}")
+                    downloaded_files.append(result)
+                    folder = result['target_folder']
+                    if folder not in files_by_folder:
+                        files_by_folder[folder] = []
+                    files_by_folder[folder].append(result['filename'])
+                    print(f"✓ Scaricato: {result['filename']} → {folder}")
                     
-            except Exception as e:
-                error_files.append({'link': link, 'error': str(e)})
-                print(f"✗ Errore durante l'elaborazione: {str(e)}")
-                continue
+                    if result.get('extracted_files'):
+                        print(f"  Estratti {len(result['extracted_files'])} file")
+            else:
+                error_files.append({'link': link, 'error': result.get('error', 'Errore sconosciuto')})
+                print(f"✗ Errore: {result.get('error', 'Errore sconosciuto')}")
+        
+        run_download_jobs(
+            links_to_download,
+            worker,
+            max_workers=max_workers,
+            per_host_limit=per_host_limit,
+            logger=self.logger,
+            on_result=on_result,
+            retry_policy=get_retry_policy(self.config),
+            retry_stats=retry_stats
+        )
         
         # Mostra il riepilogo
         print("\n" + "=" * 60)
@@ -1492,6 +1608,10 @@ class ANACDownloaderCLI:
         print(f"⏭️  File saltati (già esistenti): {len(skipped_files)}")
         print(f"✗ File con errori: {len(error_files)}")
         
+        from json_downloader.http_session import log_connection_stats
+        log_connection_stats(self.logger)
+        log_retry_summary(retry_stats, self.logger)
+        
         if files_by_folder:
             print(f"\n📁 File organizzati per cartella:")
             for folder, files in files_by_folder.items():
@@ -1607,6 +1727,14 @@ if __name__ == "__main__":
         'debug_mode': False
     }
     
+    # Completa la configurazione base con le opzioni di config.json (es. concorrenza download)
+    try:
+        from json_downloader.scraper import load_config
+        for key, value in load_config().items():
+            default_config.setdefault(key, value)
+    except Exception as e:
+        print(f"Attenzione: impossibile leggere config.json, uso i valori predefiniti: {str(e)}")
+    
     # Assicura che le directory necessarie esistano
     for dir_path in ['downloads', 'log', 'cache']:
         os.makedirs(dir_path, exist_ok=True)
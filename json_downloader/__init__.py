@@ -10,6 +10,7 @@ from .cli import ANACDownloaderCLI
 from .downloader import download_file, download_with_auto_sorting
 from .scraper import scrape_all_json_links
 from .utils import setup_logger, scan_existing_files, determine_target_folder, should_skip_download
+from .catalog import FileCatalog, get_file_catalog
 
 __all__ = [
     'ANACDownloaderCLI',
@@ -19,5 +20,7 @@ __all__ = [
     'setup_logger',
     'scan_existing_files',
     'determine_target_folder',
-    'should_skip_download'
+    'should_skip_download',
+    'FileCatalog',
+    'get_file_catalog'
 ]
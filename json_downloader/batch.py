@@ -0,0 +1,150 @@
+"""
+Modalità batch (senza interazione) per cron, systemd e tmux:
+
+    python3 -m json_downloader.batch [--source scrape|cache|file] [--links-file FILE]
+                                     [--max-files N] [--no-extract] [--all-formats]
+                                     [--refresh] [--config FILE] [--summary FILE]
+
+Esegue ricerca dei link → download con smistamento in /database/JSON → estrazione,
+scrive un riepilogo JSON ed esce con un codice che descrive l'esito (vedi pipeline.EXIT_*).
+"""
+import os
+import sys
+import json
+import signal
+import argparse
+import threading
+import traceback
+
+from .pipeline import run_pipeline, SOURCES, EXIT_FAILED, EXIT_INTERRUPTED
+from .catalog import DEFAULT_DATABASE_PATH
+from .scraper import load_config
+from .utils import setup_logger, ensure_dir
+from .http_session import configure_session
+
+DEFAULT_SUMMARY_FILE = "log/batch_summary.json"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='anac-batch',
+        description="Download dei dataset ANAC senza interazione: ricerca link, download "
+                    "con smistamento ed estrazione in pipeline.",
+        epilog="Codici di uscita: 0 = completato, 1 = completato con errori, "
+               "2 = nessun download eseguito, 130 = interrotto."
+    )
+    parser.add_argument('--source', choices=SOURCES, default='scrape',
+                        help="Da dove prendere i link: scraping del portale (predefinito), "
+                             "cache/json_links.txt o un file di testo (--links-file)")
+    parser.add_argument('--links-file', help="File con un link per riga (con --source file)")
+    parser.add_argument('--max-files', type=int, default=0, help="Numero massimo di file da scaricare (0 = tutti)")
+    parser.add_argument('--no-extract', action='store_true', help="Non estrarre i file ZIP scaricati")
+    parser.add_argument('--all-formats', action='store_true',
+                        help="Scarica tutti i link, non solo JSON e ZIP contenenti JSON")
+    parser.add_argument('--refresh', action='store_true',
+                        help="Riscarica i file già presenti se cambiati sul server (refresh_mode)")
+    parser.add_argument('--database-path', default=DEFAULT_DATABASE_PATH,
+                        help=f"Cartella di smistamento (predefinita {DEFAULT_DATABASE_PATH})")
+    parser.add_argument('--config', default='config.json', help="File di configurazione (predefinito config.json)")
+    parser.add_argument('--summary', default=DEFAULT_SUMMARY_FILE,
+                        help=f"Dove scrivere il riepilogo JSON ('-' = standard output, predefinito {DEFAULT_SUMMARY_FILE})")
+    args = parser.parse_args(argv)
+    if args.links_file and args.source != 'file':
+        args.source = 'file'
+    if args.source == 'file' and not args.links_file:
+        parser.error("--source file richiede --links-file")
+    return args
+
+
+def write_summary(summary, path):
+    """Scrive il riepilogo JSON su file (in modo atomico) o su standard output con '-'."""
+    data = json.dumps(summary, indent=2, ensure_ascii=False)
+    if path == '-':
+        print(data)
+        return
+    directory = os.path.dirname(path)
+    if directory:
+        ensure_dir(directory)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        f.write(data + "\n")
+    os.replace(temp_path, path)
+    print(f"Riepilogo JSON: {path}")
+
+
+def _install_stop_handlers(stop_event, logger=None):
+    """
+    Al primo SIGINT/SIGTERM non vengono avviati altri download e quelli in corso
+    terminano; al secondo l'esecuzione si interrompe subito.
+    """
+    def handler(signum, frame):
+        if stop_event.is_set():
+            raise KeyboardInterrupt
+        stop_event.set()
+        print("\nInterruzione richiesta: attendo la fine dei download in corso (di nuovo per uscire subito)")
+        if logger:
+            logger.warning(f"Ricevuto segnale {signum}, arresto della pipeline")
+
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        try:
+            signal.signal(signum, handler)
+        except (ValueError, OSError):
+            # Non dal thread principale o segnale non supportato (Windows)
+            pass
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    try:
+        config = load_config(args.config)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Errore nella lettura della configurazione {args.config}: {e}")
+        return EXIT_FAILED
+    if args.refresh:
+        config['refresh_mode'] = True
+
+    download_dir = config.get('download_dir', 'downloads')
+    config['download_dir'] = os.path.abspath(download_dir)
+    for directory in (config['download_dir'], 'cache'):
+        ensure_dir(directory)
+    logger = setup_logger(config.get('log_file', 'log/downloader.log'))
+    logger.info(f"Modalità batch avviata: {' '.join(sys.argv[1:] if argv is None else argv)}")
+    configure_session(config, logger=logger)
+
+    stop_event = threading.Event()
+    _install_stop_handlers(stop_event, logger)
+
+    try:
+        summary = run_pipeline(
+            config,
+            source=args.source,
+            links_file=args.links_file,
+            extract_zip=not args.no_extract,
+            json_only=not args.all_formats,
+            max_files=args.max_files,
+            database_path=args.database_path,
+            logger=logger,
+            stop_event=stop_event
+        )
+    except KeyboardInterrupt:
+        summary = {'status': 'interrupted', 'exit_code': EXIT_INTERRUPTED, 'error': 'Interrotto dall\'utente'}
+    except Exception as e:
+        traceback.print_exc()
+        logger.error(f"Errore fatale nella pipeline batch: {e}")
+        summary = {'status': 'failed', 'exit_code': EXIT_FAILED, 'error': str(e)}
+
+    downloads = summary.get('downloads', {})
+    print(f"\nEsito: {summary['status']} (codice {summary['exit_code']}) - "
+          f"{downloads.get('downloaded', 0)} scaricati, {downloads.get('skipped', 0)} già presenti, "
+          f"{downloads.get('failed', 0)} falliti, {downloads.get('not_started', 0)} non avviati")
+    logger.info(f"Modalità batch terminata: {summary['status']} (codice {summary['exit_code']})")
+    try:
+        write_summary(summary, args.summary)
+    except OSError as e:
+        print(f"Impossibile scrivere il riepilogo JSON in {args.summary}: {e}")
+    return summary['exit_code']
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,263 @@
+import time
+import threading
+from urllib.parse import urlparse
+
+# Tipi di risorsa (request.resource_type di Playwright) che non servono per leggere i link
+DEFAULT_BLOCKED_RESOURCE_TYPES = ('image', 'media', 'font', 'stylesheet')
+
+
+# Pagina pronta: compare l'elenco di dataset/risorse (portale CKAN) e il numero di link resta stabile
+DEFAULT_READY_SELECTOR = ".dataset-item, .dataset-list, .resource-item, .resource-list"
+DEFAULT_READY_TIMEOUT = 10
+DEFAULT_STABLE_MS = 300
+READY_POLL_MS = 100
+
+# Valutata nella pagina: true quando il numero di link non cambia da stable_ms millisecondi
+_LINKS_STABLE_JS = """(stableMs) => {
+    const count = document.querySelectorAll('a[href]').length;
+    const state = window.__linksStable || (window.__linksStable = {count: -1, since: 0});
+    const now = performance.now();
+    if (count !== state.count) {
+        state.count = count;
+        state.since = now;
+        return false;
+    }
+    return now - state.since >= stableMs;
+}"""
+
+
+def get_readiness_options(config):
+    """
+    Legge dalla configurazione quando considerare pronta una pagina del browser.
+
+    Returns:
+        dict: {'selector', 'timeout_ms', 'stable_ms'}
+    """
+    config = config or {}
+    return {
+        'selector': config.get('page_ready_selector', DEFAULT_READY_SELECTOR),
+        'timeout_ms': int(float(config.get('page_ready_timeout', DEFAULT_READY_TIMEOUT)) * 1000),
+        'stable_ms': int(config.get('page_stable_ms', DEFAULT_STABLE_MS))
+    }
+
+
+def wait_until_ready(page, selector=DEFAULT_READY_SELECTOR, timeout_ms=DEFAULT_READY_TIMEOUT * 1000,
+                     stable_ms=DEFAULT_STABLE_MS):
+    """
+    Attende (API sincrona) che la pagina sia pronta per l'analisi: prima il selettore
+    dell'elenco, poi il numero di link stabile per stable_ms. Le pagine veloci tornano
+    subito, le lente attendono al massimo timeout_ms in tutto.
+
+    Returns:
+        bool: False se si è raggiunto il limite (si prosegue comunque con la pagina com'è)
+    """
+    deadline = time.time() + timeout_ms / 1000
+    try:
+        if selector:
+            page.wait_for_selector(selector, state='attached', timeout=timeout_ms)
+        # Scorri pagina per attivare lazy loading
+        page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
+        remaining = max(1, int((deadline - time.time()) * 1000))
+        page.wait_for_function(_LINKS_STABLE_JS, arg=stable_ms, polling=READY_POLL_MS, timeout=remaining)
+        return True
+    except Exception:
+        return False
+
+
+async def wait_until_ready_async(page, selector=DEFAULT_READY_SELECTOR, timeout_ms=DEFAULT_READY_TIMEOUT * 1000,
+                                 stable_ms=DEFAULT_STABLE_MS):
+    """Come wait_until_ready, per l'API asincrona."""
+    deadline = time.time() + timeout_ms / 1000
+    try:
+        if selector:
+            await page.wait_for_selector(selector, state='attached', timeout=timeout_ms)
+        # Scorri pagina per attivare lazy loading
+        await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
+        remaining = max(1, int((deadline - time.time()) * 1000))
+        await page.wait_for_function(_LINKS_STABLE_JS, arg=stable_ms, polling=READY_POLL_MS, timeout=remaining)
+        return True
+    except Exception:
+        return False
+
+
+def get_request_filter_options(config):
+    """
+    Legge dalla configurazione i filtri delle richieste del browser.
+
+    Returns:
+        dict: kwargs da passare a RequestFilter
+    """
+    config = config or {}
+    return {
+        'blocked_types': config.get('browser_block_resources', list(DEFAULT_BLOCKED_RESOURCE_TYPES)),
+        'block_third_party': bool(config.get('browser_block_third_party', True)),
+        'allowed_hosts': config.get('browser_allowed_hosts', [])
+    }
+
+
+def _site_domain(host):
+    """Dominio del sito senza sottodomini (dati.anticorruzione.it -> anticorruzione.it)."""
+    parts = host.split('.')
+    return '.'.join(parts[-2:]) if len(parts) > 2 else host
+
+
+def _host_matches(host, domain):
+    return host == domain or host.endswith('.' + domain)
+
+
+class RequestFilter:
+    """
+    Intercetta le richieste di un contesto Playwright e interrompe quelle che non
+    servono a leggere l'HTML: immagini, font, fogli di stile, media e le richieste
+    verso host di terze parti (analytics, CDN di widget, ecc.). Gli host in
+    allowed_hosts sono sempre consentiti. Conta richieste consentite e bloccate.
+    """
+
+    def __init__(self, site_url, blocked_types=DEFAULT_BLOCKED_RESOURCE_TYPES, block_third_party=True, allowed_hosts=()):
+        site_host = urlparse(site_url).netloc.lower().split(':')[0]
+        self.site_domain = _site_domain(site_host)
+        self.blocked_types = {resource_type.lower() for resource_type in blocked_types or ()}
+        self.block_third_party = block_third_party
+        self.allowed_hosts = [host.lower() for host in allowed_hosts or ()]
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.blocked = {}
+
+    def block_reason(self, url, resource_type):
+        """Motivo per cui la richiesta va interrotta, None se va consentita."""
+        host = urlparse(url).netloc.lower().split(':')[0]
+        if not host or any(_host_matches(host, allowed) for allowed in self.allowed_hosts):
+            return None
+        if resource_type in self.blocked_types:
+            return resource_type
+        if self.block_third_party and not _host_matches(host, self.site_domain):
+            return 'terze parti'
+        return None
+
+    def _count(self, reason):
+        with self._lock:
+            if reason is None:
+                self.allowed += 1
+            else:
+                self.blocked[reason] = self.blocked.get(reason, 0) + 1
+
+    def handle(self, route):
+        """Handler per context.route dell'API sincrona."""
+        reason = self.block_reason(route.request.url, route.request.resource_type)
+        self._count(reason)
+        if reason is None:
+            route.continue_()
+        else:
+            route.abort('blockedbyclient')
+
+    async def handle_async(self, route):
+        """Handler per context.route dell'API asincrona."""
+        reason = self.block_reason(route.request.url, route.request.resource_type)
+        self._count(reason)
+        if reason is None:
+            await route.continue_()
+        else:
+            await route.abort('blockedbyclient')
+
+    def is_active(self):
+        return bool(self.blocked_types or self.block_third_party)
+
+    def install(self, context):
+        """Attiva il filtro su un contesto dell'API sincrona."""
+        if self.is_active():
+            context.route("**/*", self.handle)
+
+    async def install_async(self, context):
+        """Attiva il filtro su un contesto dell'API asincrona."""
+        if self.is_active():
+            await context.route("**/*", self.handle_async)
+
+    def stats(self):
+        """
+        Returns:
+            dict: {'allowed': int, 'blocked': int, 'blocked_by_reason': dict}
+        """
+        with self._lock:
+            return {
+                'allowed': self.allowed,
+                'blocked': sum(self.blocked.values()),
+                'blocked_by_reason': dict(self.blocked)
+            }
+
+
+class PageTimings:
+    """Tempi di caricamento delle pagine: risposta del server e pagina pronta per l'analisi."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.pages = []
+
+    def record(self, url, response_seconds, ready_seconds):
+        with self._lock:
+            self.pages.append((url, response_seconds, ready_seconds))
+
+    def summary(self):
+        """
+        Returns:
+            dict: {'pages', 'avg_response', 'avg_ready', 'max_ready', 'slowest'}
+        """
+        with self._lock:
+            pages = list(self.pages)
+        if not pages:
+            return {'pages': 0, 'avg_response': 0.0, 'avg_ready': 0.0, 'max_ready': 0.0, 'slowest': None}
+        slowest = max(pages, key=lambda page: page[2])
+        return {
+            'pages': len(pages),
+            'avg_response': sum(page[1] for page in pages) / len(pages),
+            'avg_ready': sum(page[2] for page in pages) / len(pages),
+            'max_ready': slowest[2],
+            'slowest': slowest[0]
+        }
+
+
+class PageTimer:
+    """
+    Misura una singola pagina:
+
+        timer = PageTimer(timings, url)
+        response = page.goto(url)
+        timer.responded()
+        ...
+        timer.ready()
+    """
+
+    def __init__(self, timings, url):
+        self.timings = timings
+        self.url = url
+        self.start = time.time()
+        self.response_seconds = None
+
+    def responded(self):
+        self.response_seconds = time.time() - self.start
+
+    def ready(self):
+        ready_seconds = time.time() - self.start
+        if self.timings is not None:
+            self.timings.record(self.url, self.response_seconds if self.response_seconds is not None else ready_seconds,
+                                ready_seconds)
+        return ready_seconds
+
+
+def log_browser_stats(timings=None, request_filter=None, logger=None):
+    """Stampa (e registra nel log) i tempi delle pagine e le richieste bloccate."""
+    messages = []
+    if timings is not None:
+        summary = timings.summary()
+        if summary['pages']:
+            messages.append(f"Pagine del browser: {summary['pages']}, pronte in media in {summary['avg_ready']:.2f}s "
+                            f"(risposta {summary['avg_response']:.2f}s), la più lenta {summary['max_ready']:.2f}s "
+                            f"({summary['slowest']})")
+    if request_filter is not None and request_filter.is_active():
+        stats = request_filter.stats()
+        reasons = ", ".join(f"{reason} {count}" for reason, count in sorted(stats['blocked_by_reason'].items()))
+        messages.append(f"Richieste del browser: {stats['allowed']} consentite, {stats['blocked']} bloccate"
+                        + (f" ({reasons})" if reasons else ""))
+    for message in messages:
+        print(message)
+        if logger:
+            logger.info(message)
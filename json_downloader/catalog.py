@@ -0,0 +1,297 @@
+import os
+import zlib
+import sqlite3
+import threading
+from datetime import datetime
+
+from .utils import ensure_dir
+
+DEFAULT_CATALOG_FILE = "cache/file_catalog.db"
+DEFAULT_DATABASE_PATH = "/database/JSON"
+
+
+def get_catalog_file(database_path=DEFAULT_DATABASE_PATH):
+    """
+    File SQLite del catalogo di database_path: cache/file_catalog.db per /database/JSON,
+    un file distinto per ogni altro percorso (es. anac-batch --database-path), così due
+    cataloghi non si cancellano a vicenda.
+    """
+    database_path = os.path.abspath(database_path)
+    if database_path == DEFAULT_DATABASE_PATH:
+        return DEFAULT_CATALOG_FILE
+    root, ext = os.path.splitext(DEFAULT_CATALOG_FILE)
+    return f"{root}_{zlib.crc32(database_path.encode('utf-8')):08x}{ext}"
+
+
+class FileCatalog:
+    """
+    Catalogo persistente (SQLite) dei file presenti nelle cartelle di /database/JSON.
+
+    Sostituisce la scansione completa con os.listdir ad ogni download:
+    - sync() riscansiona solo le cartelle la cui data di modifica è cambiata
+    - lookup() trova un file per nome (o per nome senza estensione) tramite indice
+    - add_file() aggiorna il catalogo dopo ogni download o estrazione
+    - member_unchanged() dice se un membro ZIP è già stato estratto identico (CRC e dimensione)
+
+    Come scan_existing_files, vengono catalogati i file al primo livello di ogni cartella.
+    """
+
+    def __init__(self, database_path=DEFAULT_DATABASE_PATH, db_file=None):
+        self.database_path = os.path.abspath(database_path)
+        self.db_file = db_file = db_file or get_catalog_file(database_path)
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(db_file)
+        if directory:
+            ensure_dir(directory)
+        self._conn = sqlite3.connect(db_file, check_same_thread=False)
+        self._create_tables()
+
+    def _create_tables(self):
+        with self._lock, self._conn:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS folders (name TEXT PRIMARY KEY, mtime_ns INTEGER NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS files ("
+                " folder TEXT NOT NULL, filename TEXT NOT NULL, stem TEXT NOT NULL,"
+                " size INTEGER, mtime_ns INTEGER, sha256 TEXT,"
+                " PRIMARY KEY (folder, filename))"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_files_filename ON files (filename)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_files_stem ON files (stem)")
+            # File estratti dagli archivi, con CRC e dimensione del membro di origine
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS extracted_members ("
+                " path TEXT PRIMARY KEY, zip_path TEXT, member TEXT,"
+                " crc INTEGER NOT NULL, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL,"
+                " extracted_at TEXT)"
+            )
+
+            # Un catalogo creato per un altro percorso non è riutilizzabile (solo con un db_file esplicito:
+            # get_catalog_file assegna un file diverso a ogni percorso)
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'database_path'").fetchone()
+            if row and row[0] != self.database_path:
+                self._conn.execute("DELETE FROM files")
+                self._conn.execute("DELETE FROM folders")
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('database_path', ?)", (self.database_path,)
+            )
+
+    def sync(self):
+        """
+        Allinea il catalogo al disco, riscansionando solo le cartelle modificate.
+
+        Returns:
+            dict: {'folders_scanned', 'folders_unchanged', 'folders_removed', 'files'}
+        """
+        stats = {'folders_scanned': 0, 'folders_unchanged': 0, 'folders_removed': 0, 'files': 0}
+
+        if not os.path.exists(self.database_path):
+            print(f"Path {self.database_path} non esiste. Creazione...")
+            try:
+                os.makedirs(self.database_path, exist_ok=True)
+            except Exception as e:
+                print(f"Errore nella creazione del path {self.database_path}: {e}")
+                return stats
+
+        try:
+            on_disk = {}
+            with os.scandir(self.database_path) as entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        on_disk[entry.name] = entry.stat().st_mtime_ns
+        except Exception as e:
+            print(f"Errore nella scansione del path {self.database_path}: {e}")
+            return stats
+
+        with self._lock, self._conn:
+            known = dict(self._conn.execute("SELECT name, mtime_ns FROM folders").fetchall())
+
+            for name in set(known) - set(on_disk):
+                self._conn.execute("DELETE FROM files WHERE folder = ?", (name,))
+                self._conn.execute("DELETE FROM folders WHERE name = ?", (name,))
+                stats['folders_removed'] += 1
+
+            for name, mtime_ns in on_disk.items():
+                if known.get(name) == mtime_ns:
+                    stats['folders_unchanged'] += 1
+                    continue
+                self._rescan_folder(name, mtime_ns)
+                stats['folders_scanned'] += 1
+
+            stats['files'] = self._conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+        print(f"Catalogo file: {len(on_disk)} cartelle ({stats['folders_scanned']} riscansionate, "
+              f"{stats['folders_unchanged']} invariate), {stats['files']} file")
+        return stats
+
+    def _rescan_folder(self, name, mtime_ns):
+        """Ricostruisce le righe di una cartella, conservando gli hash dei file non modificati."""
+        folder_path = os.path.join(self.database_path, name)
+        previous = {
+            row[0]: row[1:]
+            for row in self._conn.execute(
+                "SELECT filename, size, mtime_ns, sha256 FROM files WHERE folder = ?", (name,)
+            )
+        }
+
+        rows = []
+        try:
+            with os.scandir(folder_path) as entries:
+                for entry in entries:
+                    if not entry.is_file():
+                        continue
+                    stat = entry.stat()
+                    sha256 = None
+                    old = previous.get(entry.name)
+                    if old and old[0] == stat.st_size and old[1] == stat.st_mtime_ns:
+                        sha256 = old[2]
+                    rows.append((name, entry.name, os.path.splitext(entry.name)[0],
+                                 stat.st_size, stat.st_mtime_ns, sha256))
+        except Exception as e:
+            print(f"Errore nella scansione della cartella {name}: {e}")
+            return
+
+        self._conn.execute("DELETE FROM files WHERE folder = ?", (name,))
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO files (folder, filename, stem, size, mtime_ns, sha256) VALUES (?, ?, ?, ?, ?, ?)",
+            rows
+        )
+        self._conn.execute("INSERT OR REPLACE INTO folders (name, mtime_ns) VALUES (?, ?)", (name, mtime_ns))
+
+    def _folder_of(self, file_path):
+        """Nome della cartella di primo livello che contiene il file, o None se fuori dal catalogo."""
+        parent = os.path.dirname(os.path.abspath(file_path))
+        if os.path.dirname(parent) != self.database_path:
+            return None
+        return os.path.basename(parent)
+
+    def add_file(self, file_path, sha256=None):
+        """Registra (o aggiorna) un file appena scaricato o estratto."""
+        folder = self._folder_of(file_path)
+        if folder is None or not os.path.isfile(file_path):
+            return False
+        stat = os.stat(file_path)
+        filename = os.path.basename(file_path)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files (folder, filename, stem, size, mtime_ns, sha256) VALUES (?, ?, ?, ?, ?, ?)",
+                (folder, filename, os.path.splitext(filename)[0], stat.st_size, stat.st_mtime_ns, sha256)
+            )
+            # Cartella nuova: mtime 0 la fa riscansionare alla prossima sync
+            self._conn.execute("INSERT OR IGNORE INTO folders (name, mtime_ns) VALUES (?, 0)", (folder,))
+        return True
+
+    def remove_file(self, file_path):
+        folder = self._folder_of(file_path)
+        if folder is None:
+            return
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM files WHERE folder = ? AND filename = ?", (folder, os.path.basename(file_path))
+            )
+
+    def member_unchanged(self, path, crc, size):
+        """
+        True se `path` è stato estratto da un membro con lo stesso CRC32 e la stessa
+        dimensione e da allora il file non è stato modificato né sostituito.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT crc, size, mtime_ns FROM extracted_members WHERE path = ?", (os.path.abspath(path),)
+            ).fetchone()
+        if row is None or row[0] != crc or row[1] != size:
+            return False
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        return stat.st_size == size and stat.st_mtime_ns == row[2]
+
+    def record_extracted_members(self, members):
+        """
+        Registra i file appena estratti.
+
+        Args:
+            members: Tuple (path, zip_path, member, crc, size)
+        """
+        now = datetime.now().isoformat(timespec='seconds')
+        rows = []
+        for path, zip_path, member, crc, size in members:
+            try:
+                mtime_ns = os.stat(path).st_mtime_ns
+            except OSError:
+                continue
+            rows.append((os.path.abspath(path), os.path.abspath(zip_path), member, crc, size, mtime_ns, now))
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO extracted_members (path, zip_path, member, crc, size, mtime_ns, extracted_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+
+    def get(self, filename):
+        """
+        Cerca un file per nome esatto e, in mancanza, per nome senza estensione
+        (per i file che potrebbero essere stati estratti da uno ZIP).
+
+        Returns:
+            dict or None: {'filename', 'folder_path', 'size', 'mtime_ns', 'sha256'}
+        """
+        query = "SELECT filename, folder, size, mtime_ns, sha256 FROM files WHERE {} = ? LIMIT 1"
+        with self._lock:
+            row = self._conn.execute(query.format('filename'), (filename,)).fetchone()
+            if row is None:
+                row = self._conn.execute(query.format('stem'), (os.path.splitext(filename)[0],)).fetchone()
+        if row is None:
+            return None
+        return {
+            'filename': row[0],
+            'folder_path': os.path.join(self.database_path, row[1]),
+            'size': row[2],
+            'mtime_ns': row[3],
+            'sha256': row[4]
+        }
+
+    def lookup(self, filename):
+        """Cartella che contiene il file (o un file con lo stesso nome senza estensione), o None."""
+        entry = self.get(filename)
+        return entry['folder_path'] if entry else None
+
+    def folders(self):
+        """Cartelle disponibili per lo smistamento."""
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT name FROM folders ORDER BY name")]
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    def __contains__(self, filename):
+        return self.get(filename) is not None
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_file_catalog(database_path=DEFAULT_DATABASE_PATH, db_file=None):
+    """
+    Restituisce il catalogo condiviso per database_path.
+    Alla prima richiesta nel processo il catalogo viene sincronizzato con il disco;
+    in seguito resta aggiornato tramite add_file (o una sync() esplicita).
+    """
+    key = os.path.abspath(database_path)
+    with _catalogs_lock:
+        catalog = _catalogs.get(key)
+        if catalog is None:
+            catalog = FileCatalog(database_path, db_file)
+            catalog.sync()
+            _catalogs[key] = catalog
+        return catalog
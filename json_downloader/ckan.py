@@ -0,0 +1,247 @@
+import os
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .http_session import get_session
+from .retry import get_retry_policy
+from .utils import get_url_classifier, ensure_dir
+
+# Backend per la ricerca dei link (discovery_backend in config.json)
+DISCOVERY_BACKENDS = ('ckan', 'playwright')
+DEFAULT_DISCOVERY_BACKEND = 'ckan'
+
+# Dataset per pagina di package_search (CKAN ne consente al massimo 1000)
+DEFAULT_CKAN_PAGE_SIZE = 100
+DEFAULT_CKAN_RESOURCES_FILE = "cache/ckan_resources.json"
+
+
+class CkanError(Exception):
+    """Errore dell'API CKAN (HTTP, risposta non valida o success=false)."""
+
+
+def get_discovery_backend(config):
+    """Backend configurato per la ricerca dei link: 'ckan' (predefinito) o 'playwright'."""
+    backend = str((config or {}).get('discovery_backend', DEFAULT_DISCOVERY_BACKEND)).lower()
+    return backend if backend in DISCOVERY_BACKENDS else DEFAULT_DISCOVERY_BACKEND
+
+
+def get_ckan_api_url(config):
+    """
+    URL base dell'API CKAN: ckan_api_url se configurato, altrimenti ricavato da base_url
+    (https://dati.anticorruzione.it/opendata/dataset -> .../opendata/api/3/action).
+    """
+    config = config or {}
+    if config.get('ckan_api_url'):
+        return config['ckan_api_url'].rstrip('/')
+    base_url = config.get('base_url', '').rstrip('/')
+    if base_url.endswith('/dataset'):
+        base_url = base_url[:-len('/dataset')]
+    return f"{base_url}/api/3/action"
+
+
+class CkanClient:
+    """Chiamate all'action API di CKAN tramite la sessione HTTP condivisa (pool e limiti per host)."""
+
+    def __init__(self, api_url, session=None, timeout=30, retry_policy=None, logger=None):
+        self.api_url = api_url.rstrip('/')
+        self.session = session or get_session()
+        self.timeout = timeout
+        self.retry_policy = retry_policy or get_retry_policy({}, max_retries=3)
+        self.logger = logger
+        self.calls = 0
+
+    def action(self, name, **params):
+        """
+        Esegue un'azione CKAN e ne restituisce il campo 'result'.
+        Gli errori temporanei (rete, 5xx, 429) vengono ritentati con la politica di backoff.
+
+        Raises:
+            CkanError: Se l'azione fallisce anche dopo i nuovi tentativi
+        """
+        url = f"{self.api_url}/{name}"
+        attempt = 0
+        while True:
+            attempt += 1
+            error = None
+            retryable = True
+            try:
+                self.calls += 1
+                response = self.session.get(url, params=params, timeout=self.timeout)
+                if response.status_code >= 400:
+                    error = f"HTTP {response.status_code}"
+                    retryable = response.status_code >= 500 or response.status_code in (408, 429)
+                else:
+                    data = response.json()
+                    if data.get('success'):
+                        return data.get('result')
+                    error = f"success=false: {data.get('error')}"
+                    retryable = False
+            except ValueError as e:
+                # Risposta non JSON: l'URL non è un'API CKAN
+                error = f"risposta non valida: {e}"
+                retryable = False
+            except Exception as e:
+                error = str(e)
+
+            if not retryable or not self.retry_policy.can_retry(attempt):
+                raise CkanError(f"{name}: {error}")
+            delay = self.retry_policy.delay(attempt)
+            if self.logger:
+                self.logger.warning(f"API CKAN {name} fallita ({error}), nuovo tentativo tra {delay:.1f}s")
+            time.sleep(delay)
+
+    def package_list(self):
+        return self.action('package_list')
+
+    def package_show(self, name):
+        return self.action('package_show', id=name)
+
+    def package_search(self, rows=DEFAULT_CKAN_PAGE_SIZE, **params):
+        """Tutti i dataset di package_search, una pagina di `rows` alla volta."""
+        start = 0
+        while True:
+            result = self.action('package_search', rows=rows, start=start, **params)
+            packages = result.get('results') or []
+            for package in packages:
+                yield package
+            start += len(packages)
+            if not packages or start >= result.get('count', 0):
+                return
+
+
+def is_wanted_resource(resource, include_formats=('json', 'zip'), exclude_formats=('ttl', 'csv', 'xml')):
+    """True se la risorsa è un file JSON o uno ZIP con JSON (stessi filtri dello scraper HTML)."""
+    url = resource.get('url') or ''
+    if not url:
+        return False
+    fmt = (resource.get('format') or '').strip().lower().lstrip('.')
+    classifier = get_url_classifier(exclude_formats)
+    verdict = classifier.classify(url)
+    if fmt in exclude_formats or verdict == classifier.EXCLUDED:
+        return False
+    return fmt in include_formats or verdict in (classifier.JSON, classifier.JSON_ZIP)
+
+
+def resource_record(package, resource):
+    """Metadati di una risorsa da conservare in cache."""
+    size = resource.get('size')
+    try:
+        size = int(size) if size not in (None, '') else None
+    except (TypeError, ValueError):
+        size = None
+    return {
+        'url': resource['url'],
+        'format': (resource.get('format') or '').upper(),
+        'size': size,
+        'last_modified': resource.get('last_modified') or resource.get('metadata_modified'),
+        'name': resource.get('name'),
+        'dataset': package.get('name'),
+        'dataset_title': package.get('title')
+    }
+
+
+def get_dataset_url(config, package):
+    """URL della pagina del dataset sul portale (per la cache dei dataset noti)."""
+    return f"{(config or {}).get('base_url', '').rstrip('/')}/{package['name']}"
+
+
+def discover_ckan_resources(config, logger=None, on_package=None):
+    """
+    Elenca dataset e risorse JSON/ZIP tramite l'API CKAN, senza browser.
+    Usa package_search a pagine; per i dataset con risorse mancanti nel risultato
+    (o se package_search non è disponibile, con package_list) usa package_show,
+    con scraper_concurrency richieste in parallelo.
+
+    Args:
+        on_package: Callback opzionale on_package(package, records) chiamata per ogni
+                    dataset appena letto, con le sue risorse JSON/ZIP
+
+    Returns:
+        tuple: (packages, records) - dataset letti e metadati delle risorse JSON/ZIP
+
+    Raises:
+        CkanError: Se l'API non risponde
+    """
+    config = config or {}
+    include_formats = [fmt.lower() for fmt in config.get('include_formats', ['json', 'zip'])]
+    exclude_formats = [fmt.lower() for fmt in config.get('exclude_formats', ['ttl', 'csv', 'xml'])]
+    client = CkanClient(
+        get_ckan_api_url(config),
+        timeout=config.get('timeout', 30),
+        retry_policy=get_retry_policy(config, max_retries=config.get('max_page_retries', 3)),
+        logger=logger
+    )
+    workers = max(1, int(config.get('scraper_concurrency', 4)))
+    start_time = time.time()
+    packages = []
+    records = []
+
+    def collect(package):
+        package_records = [resource_record(package, resource) for resource in package.get('resources') or []
+                           if is_wanted_resource(resource, include_formats, exclude_formats)]
+        packages.append(package)
+        records.extend(package_records)
+        if on_package:
+            on_package(package, package_records)
+
+    def show_all(names):
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ckan') as executor:
+            for name, package in zip(names, executor.map(show, names)):
+                if package is not None:
+                    collect(package)
+
+    def show(name):
+        try:
+            return client.package_show(name)
+        except CkanError as e:
+            if logger:
+                logger.warning(f"Dataset {name} non letto dall'API CKAN: {e}")
+            return None
+
+    try:
+        incomplete = []
+        for package in client.package_search(rows=int(config.get('ckan_page_size', DEFAULT_CKAN_PAGE_SIZE))):
+            if package.get('num_resources', 0) > len(package.get('resources') or []):
+                incomplete.append(package['name'])
+            else:
+                collect(package)
+        show_all(incomplete)
+    except CkanError as e:
+        if packages:
+            raise
+        # Alcune installazioni disabilitano package_search: si elencano i dataset e si leggono uno per uno
+        if logger:
+            logger.warning(f"package_search non disponibile ({e}), uso package_list + package_show")
+        show_all(client.package_list())
+        if not packages:
+            raise CkanError("nessun dataset letto con package_show")
+
+    if logger:
+        total_size = sum(record['size'] or 0 for record in records)
+        logger.info(f"API CKAN: {len(packages)} dataset, {len(records)} risorse JSON/ZIP "
+                    f"({total_size / (1024 * 1024):.1f} MB dichiarati) in {time.time() - start_time:.1f}s "
+                    f"con {client.calls} richieste")
+    return packages, records
+
+
+def save_ckan_resources(records, cache_file=DEFAULT_CKAN_RESOURCES_FILE):
+    """Salva in cache i metadati delle risorse (formato, dimensione, last_modified) per URL."""
+    directory = os.path.dirname(cache_file)
+    if directory:
+        ensure_dir(directory)
+    temp_file = f"{cache_file}.tmp"
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        json.dump({record['url']: record for record in records}, f, indent=2, ensure_ascii=False)
+    os.replace(temp_file, cache_file)
+
+
+def load_ckan_resources(cache_file=DEFAULT_CKAN_RESOURCES_FILE):
+    """Metadati delle risorse salvati dall'ultima ricerca CKAN, per URL."""
+    if not os.path.exists(cache_file):
+        return {}
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
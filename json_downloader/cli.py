@@ -3,12 +3,19 @@ import os
 import sys
 import json
 import time
+import zlib
 import requests
 from datetime import datetime
 # Import from json_downloader module
 from .scraper import load_config, scrape_all_json_links
-from .downloader import download_file, should_download, verify_file_integrity, process_downloaded_file
+from .downloader import download_file, should_download, process_downloaded_file, get_download_options, last_download_failure, last_download_reused
+from .retry import RetryScheduler, RetryStats, get_retry_policy, log_retry_summary
+from .downloader import get_zip_member_filter, get_extract_subdir
+from .zipstream import create_stream_extractor
 from .utils import setup_logger, ensure_dir, normalize_url, sanitize_filename, save_links_to_cache, load_links_from_cache, deduplicate_links, format_size, load_datasets_from_cache, save_datasets_to_cache, load_direct_links_from_cache, save_direct_links_to_cache
+from .http_session import configure_session, get_session, log_connection_stats
+from .verifier import verify_files, get_verify_options, save_verification_report
+from .jobqueue import get_job_queue
 import traceback
 
 class ANACDownloaderCLI:
@@ -37,6 +44,9 @@ class ANACDownloaderCLI:
             log_file = self.config.get('log_file', 'log/downloader.log')
             self.logger = setup_logger(log_file)
             
+            # Sessione HTTP condivisa (connection pool, headers e limiti per host da config)
+            configure_session(self.config, logger=self.logger)
+            
             # Crea cartella download se non esiste
             self.download_dir = self.config.get('download_dir', 'downloads')
             ensure_dir(self.download_dir)
@@ -216,18 +226,15 @@ class ANACDownloaderCLI:
         
         print(f"Stima della dimensione totale del download in corso...")
         
-        # Headers per simulare una richiesta da browser
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-        }
+        # Sessione condivisa: le HEAD riusano le stesse connessioni dei download
+        session = get_session(self.config)
         
         for i, link in enumerate(sample):
             try:
                 normalized_link = normalize_url(link, self.config['base_url'])
                 print(f"[{i+1}/{len(sample)}] Controllo dimensione di {normalized_link}...")
                 
-                head_response = requests.head(normalized_link, headers=headers, timeout=10)
+                head_response = session.head(normalized_link, timeout=10)
                 if head_response.ok and 'content-length' in head_response.headers:
                     size = int(head_response.headers['content-length'])
                     sampled_size += size
@@ -260,6 +267,19 @@ class ANACDownloaderCLI:
                 if self.json_links:
                     print(f"Caricati {len(self.json_links)} link dalla cache.")
             
+            # Un'esecuzione interrotta (processo terminato) può ripartire da dove si era fermata
+            queue = get_job_queue()
+            unfinished = queue.unfinished_run()
+            if unfinished:
+                counts = unfinished['counts']
+                print(f"Trovata un'esecuzione interrotta del {unfinished['started_at']}: {counts['done']} completati, "
+                      f"{counts['pending'] + counts['in_flight']} da scaricare su {unfinished['total']}.")
+                if input("Vuoi riprenderla da dove si era interrotta? (s/n): ").lower() == 's':
+                    self.resume_download()
+                    input("\nPremi INVIO per tornare al menu principale...")
+                    return
+                queue.abandon_run(unfinished['id'])
+            
             if not self.json_links:
                 print("Nessun link trovato. Esegui prima lo scraping (opzione 1) o aggiungi link manualmente.")
                 input("\nPremi INVIO per tornare al menu principale...")
@@ -336,142 +356,12 @@ class ANACDownloaderCLI:
                 print("Download annullato.")
                 return
             
-            # Inizia il download
-            print("\nAvvio download in corso...\n")
-            start_time = time.time()
-            
-            successfully_downloaded = 0
-            failed_downloads = 0
-            skipped_downloads = 0
-            extracted_files = 0
-            
-            # Statistiche totali
-            total_downloaded_size = 0
-            
-            for i, link in enumerate(list(self.json_links)[:limit]):
-                try:
-                    print(f"[{i+1}/{limit}] Download di {link}...")
-                    
-                    # Normalizza URL
-                    normalized_link = normalize_url(link, self.config['base_url'])
-                    
-                    # Genera nome file pulito
-                    filename = sanitize_filename(os.path.basename(normalized_link))
-                    if not filename or filename == '.zip' or filename == '.json':
-                        # Se non c'è un nome file o è solo un'estensione, usa hash dell'URL
-                        filename = f"file_{abs(hash(normalized_link)) % 10000}"
-                    
-                    # Verifica estensione file
-                    is_zip = '.zip' in normalized_link.lower()
-                    extension = '.zip' if is_zip else '.json'
-                    
-                    if not filename.endswith(extension):
-                        filename += extension
-                    
-                    dest_path = os.path.join(self.session_dir, filename)
-                    
-                    if should_download(dest_path, force=force_download):
-                        # Parametri di download dalla config
-                        start_time = time.time()
-                        sha256 = download_file(
-                            normalized_link,
-                            dest_path,
-                            chunk_size=self.config.get('chunk_size', 1048576),
-                            max_retries=self.config.get('max_retries', 5),
-                            backoff=self.config.get('retry_backoff', 2),
-                            logger=self.logger,
-                            show_progress=True
-                        )
-                        
-                        if sha256:
-                            # Calcola le statistiche del file scaricato
-                            file_size = os.path.getsize(dest_path)
-                            download_time = time.time() - start_time
-                            avg_speed = file_size / download_time if download_time > 0 else 0
-                            
-                            print(f"✓ Scaricato con successo: {filename} ({format_size(file_size)}, {format_size(avg_speed)}/s)")
-                            
-                            # Processa il file scaricato (estrai se ZIP)
-                            if extract_zip and is_zip:
-                                result = process_downloaded_file(
-                                    dest_path, 
-                                    self.session_dir, 
-                                    self.logger,
-                                    self.config
-                                )
-                                if result['is_zip']:
-                                    extract_count = len(result.get('extracted_files', []))
-                                    total_count = result.get('total_files', 0)
-                                    extracted_files += extract_count
-                                    print(f"  ↳ Estratti {extract_count} file JSON su {total_count} totali da {filename}")
-                            
-                            successfully_downloaded += 1
-                            total_downloaded_size += file_size
-                        else:
-                            print(f"✗ Download fallito: {filename}")
-                            failed_downloads += 1
-                    else:
-                        print(f"⊙ File già presente: {filename}")
-                        skipped_downloads += 1
-                        
-                except requests.exceptions.RequestException as e:
-                    print(f"✗ Errore di rete: {str(e)}")
-                    if self.logger:
-                        self.logger.error(f"Errore di rete durante il download di {link}: {str(e)}")
-                    failed_downloads += 1
-                except (IOError, OSError) as e:
-                    print(f"✗ Errore di I/O: {str(e)}")
-                    if self.logger:
-                        self.logger.error(f"Errore di I/O durante il download di {link}: {str(e)}")
-                    failed_downloads += 1
-                except Exception as e:
-                    print(f"✗ Errore: {str(e)}")
-                    if self.logger:
-                        self.logger.error(f"Errore durante il download di {link}: {str(e)}")
-                    failed_downloads += 1
-            
-            elapsed = time.time() - start_time
-            
-            print("\n" + "=" * 60)
-            print(f"DOWNLOAD COMPLETATO IN {elapsed:.1f} SECONDI")
-            print("=" * 60)
-            print(f"✓ Download completati: {successfully_downloaded}")
-            print(f"⊙ File già presenti: {skipped_downloads}")
-            print(f"✗ Download falliti: {failed_downloads}")
-            
-            # Mostra informazioni sull'estrazione solo se l'estrazione è abilitata
-            if self.config.get('extract_zip_files', True):
-                print(f"↳ File estratti da ZIP: {extracted_files}")
-            else:
-                print("ℹ Estrazione automatica dai file ZIP disabilitata.")
-                
-            # Mostra informazioni sulla dimensione totale e velocità media
-            if total_downloaded_size > 0:
-                avg_speed = total_downloaded_size / elapsed if elapsed > 0 else 0
-                print(f"📊 Dimensione totale scaricata: {format_size(total_downloaded_size)}")
-                print(f"📈 Velocità media complessiva: {format_size(avg_speed)}/s")
-            
-            # Salva report
-            if self.config.get('save_report', True):
-                # Crea directory reports
-                report_dir = os.path.join(self.session_dir, 'reports')
-                ensure_dir(report_dir)
-                report_path = os.path.join(report_dir, f"report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
-                
-                report = {
-                    "timestamp": datetime.now().isoformat(),
-                    "total_links": len(self.json_links),
-                    "downloaded": successfully_downloaded,
-                    "skipped": skipped_downloads,
-                    "failed": failed_downloads,
-                    "extracted_files": extracted_files,
-                    "links": list(self.json_links)[:limit]
-                }
-                
-                with open(report_path, 'w', encoding='utf-8') as f:
-                    json.dump(report, f, indent=2)
-                
-                print(f"\nReport salvato in: {report_path}")
+            # Esecuzione registrata nella coda persistente (cache/job_queue.db): se il processo
+            # si interrompe può essere ripresa senza ricontrollare i file già completati
+            links = list(self.json_links)[:limit]
+            options = {'session_dir': self.session_dir, 'force_download': force_download, 'extract_zip': extract_zip}
+            run_id = get_job_queue().start_run(links, options=options)
+            self.execute_download_run(run_id, links, force_download, extract_zip)
             
             input("\nPremi INVIO per tornare al menu principale...")
             
@@ -495,6 +385,240 @@ class ANACDownloaderCLI:
             traceback.print_exc()
             input("\nPremi INVIO per tornare al menu principale...")
     
+    def execute_download_run(self, run_id, links, force_download=False, extract_zip=False):
+        """
+        Scarica i link di un'esecuzione registrata nella coda persistente, aggiornando
+        lo stato di ogni link (in corso, completato, fallito con motivo e byte).
+        
+        Args:
+            run_id: Esecuzione in JobQueue
+            links: Link ancora da elaborare
+        """
+        # Inizia il download
+        print("\nAvvio download in corso...\n")
+        start_time = time.time()
+        
+        successfully_downloaded = 0
+        failed_downloads = 0
+        skipped_downloads = 0
+        extracted_files = 0
+        
+        # Statistiche totali
+        total_downloaded_size = 0
+        
+        download_options = get_download_options(self.config)
+        refresh = download_options['refresh']
+        metadata_store = download_options['metadata_store']
+        if refresh:
+            print("Modalità refresh: vengono riscaricati solo gli archivi modificati sul server.")
+        
+        # Un download fallito torna in coda con backoff e jitter e nel frattempo si
+        # prosegue con gli altri link: download_file fa un solo tentativo per volta
+        queue = get_job_queue()
+        total = len(links)
+        positions = {link: i for i, link in enumerate(links)}
+        retry_stats = RetryStats()
+        scheduler = RetryScheduler(links, get_retry_policy(self.config), retry_stats, self.logger)
+        download_options['max_retries'] = 1
+        
+        for link, attempt in scheduler:
+            i = positions[link]
+            error = None
+            retryable = True
+            extractor = None
+            queue.mark_in_flight(run_id, link)
+            try:
+                retry_note = f" (tentativo {attempt})" if attempt > 1 else ""
+                print(f"[{i+1}/{total}] Download di {link}{retry_note}...")
+                
+                # Normalizza URL
+                normalized_link = normalize_url(link, self.config['base_url'])
+                
+                # Genera nome file pulito
+                filename = sanitize_filename(os.path.basename(normalized_link))
+                if not filename or filename == '.zip' or filename == '.json':
+                    # Se non c'è un nome file o è solo un'estensione, usa hash dell'URL
+                    # (crc32: stabile tra un'esecuzione e l'altra, necessario per la ripresa)
+                    filename = f"file_{zlib.crc32(normalized_link.encode('utf-8')) % 10000}"
+                
+                # Verifica estensione file
+                is_zip = '.zip' in normalized_link.lower()
+                extension = '.zip' if is_zip else '.json'
+                
+                if not filename.endswith(extension):
+                    filename += extension
+                
+                dest_path = os.path.join(self.session_dir, filename)
+                
+                if refresh or should_download(dest_path, force=force_download):
+                    # Gli archivi vengono estratti durante il download, se possibile
+                    if extract_zip and is_zip:
+                        extractor = create_stream_extractor(
+                            self.config, dest_path, get_extract_subdir(dest_path, self.session_dir),
+                            get_zip_member_filter(self.config), self.logger
+                        )
+                    
+                    # Parametri di download dalla config
+                    file_start_time = time.time()
+                    sha256 = download_file(
+                        normalized_link,
+                        dest_path,
+                        logger=self.logger,
+                        show_progress=True,
+                        on_chunk=extractor.feed if extractor else None,
+                        **download_options
+                    )
+                    
+                    if sha256 and last_download_reused():
+                        # Copia locale tenuta: non modificata sul server o non verificabile
+                        if refresh and metadata_store.was_not_modified(normalized_link):
+                            print(f"⊙ Non modificato sul server: {filename}")
+                            status = 'not_modified'
+                        else:
+                            print(f"⊙ File già presente: {filename}")
+                            status = 'skipped'
+                        skipped_downloads += 1
+                        queue.mark_done(run_id, link, status, dest_path, sha256=sha256)
+                    elif sha256:
+                        # Calcola le statistiche del file scaricato
+                        file_size = os.path.getsize(dest_path)
+                        download_time = time.time() - file_start_time
+                        avg_speed = file_size / download_time if download_time > 0 else 0
+                        
+                        print(f"✓ Scaricato con successo: {filename} ({format_size(file_size)}, {format_size(avg_speed)}/s)")
+                        
+                        # Processa il file scaricato (estrai se ZIP)
+                        if extract_zip and is_zip:
+                            result = process_downloaded_file(
+                                dest_path, 
+                                self.session_dir, 
+                                self.logger,
+                                self.config,
+                                stream_extractor=extractor
+                            )
+                            if result['is_zip']:
+                                extract_count = len(result.get('extracted_files', []))
+                                total_count = result.get('total_files', 0)
+                                extracted_files += extract_count
+                                print(f"  ↳ Estratti {extract_count} file JSON su {total_count} totali da {filename}")
+                                stats = result.get('extraction_stats')
+                                if stats and stats['elapsed'] > 0:
+                                    print(f"    {format_size(stats['bytes'])} in {stats['elapsed']:.1f}s "
+                                          f"({format_size(stats['bytes'] / stats['elapsed'])}/s, {stats['workers']} worker)")
+                        
+                        successfully_downloaded += 1
+                        total_downloaded_size += file_size
+                        queue.mark_done(run_id, link, 'downloaded', dest_path, file_size, sha256)
+                    else:
+                        failure = last_download_failure() or {}
+                        error = failure.get('error', 'Download fallito')
+                        retryable = failure.get('retryable', True)
+                else:
+                    print(f"⊙ File già presente: {filename}")
+                    skipped_downloads += 1
+                    queue.mark_done(run_id, link, 'skipped', dest_path)
+                    
+            except requests.exceptions.RequestException as e:
+                print(f"✗ Errore di rete: {str(e)}")
+                if self.logger:
+                    self.logger.error(f"Errore di rete durante il download di {link}: {str(e)}")
+                error = str(e)
+            except (IOError, OSError) as e:
+                print(f"✗ Errore di I/O: {str(e)}")
+                if self.logger:
+                    self.logger.error(f"Errore di I/O durante il download di {link}: {str(e)}")
+                error = str(e)
+            except Exception as e:
+                print(f"✗ Errore: {str(e)}")
+                if self.logger:
+                    self.logger.error(f"Errore durante il download di {link}: {str(e)}")
+                error = str(e)
+            
+            if error is not None and extractor is not None:
+                # Il nuovo tentativo userà un altro estrattore: niente membri .part orfani
+                extractor.abort()
+            if error is None:
+                scheduler.succeeded(link)
+            elif scheduler.failed(link, attempt, error, retryable) is None:
+                print(f"✗ Download fallito: {link}")
+                failed_downloads += 1
+                queue.mark_failed(run_id, link, error)
+            else:
+                print(f"↻ Nuovo tentativo più tardi: {link}")
+                queue.mark_retry(run_id, link, error)
+        
+        queue.finish_run(run_id)
+        
+        elapsed = time.time() - start_time
+        
+        print("\n" + "=" * 60)
+        print(f"DOWNLOAD COMPLETATO IN {elapsed:.1f} SECONDI")
+        print("=" * 60)
+        print(f"✓ Download completati: {successfully_downloaded}")
+        print(f"⊙ File già presenti: {skipped_downloads}")
+        print(f"✗ Download falliti: {failed_downloads}")
+        
+        # Mostra informazioni sull'estrazione solo se l'estrazione è abilitata
+        if self.config.get('extract_zip_files', True):
+            print(f"↳ File estratti da ZIP: {extracted_files}")
+        else:
+            print("ℹ Estrazione automatica dai file ZIP disabilitata.")
+            
+        # Mostra informazioni sulla dimensione totale e velocità media
+        if total_downloaded_size > 0:
+            avg_speed = total_downloaded_size / elapsed if elapsed > 0 else 0
+            print(f"📊 Dimensione totale scaricata: {format_size(total_downloaded_size)}")
+            print(f"📈 Velocità media complessiva: {format_size(avg_speed)}/s")
+        log_connection_stats(self.logger)
+        log_retry_summary(retry_stats, self.logger)
+        
+        # Salva report
+        if self.config.get('save_report', True):
+            # Crea directory reports
+            report_dir = os.path.join(self.session_dir, 'reports')
+            ensure_dir(report_dir)
+            report_path = os.path.join(report_dir, f"report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+            
+            report = {
+                "timestamp": datetime.now().isoformat(),
+                "total_links": len(self.json_links),
+                "run_id": run_id,
+                "downloaded": successfully_downloaded,
+                "skipped": skipped_downloads,
+                "failed": failed_downloads,
+                "extracted_files": extracted_files,
+                "links": links
+            }
+            
+            with open(report_path, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+            
+            print(f"\nReport salvato in: {report_path}")
+
+    def resume_download(self):
+        """
+        Riprende l'ultima esecuzione di download interrotta, con le opzioni con cui era
+        stata avviata: i link già completati non vengono ricontrollati.
+        
+        Returns:
+            bool: False se non c'era nessuna esecuzione da riprendere
+        """
+        queue = get_job_queue()
+        run = queue.unfinished_run()
+        if run is None:
+            print("Nessuna esecuzione di download interrotta da riprendere.")
+            return False
+        
+        counts = run['counts']
+        print(f"Ripresa dell'esecuzione del {run['started_at']}: {counts['done']} completati, "
+              f"{counts['failed']} falliti, {counts['pending'] + counts['in_flight']} da scaricare su {run['total']}")
+        options = run['options']
+        self.session_dir = options.get('session_dir') or self.download_dir
+        ensure_dir(self.session_dir)
+        links = queue.resume_run(run['id'])
+        self.execute_download_run(run['id'], links, options.get('force_download', False), options.get('extract_zip', False))
+        return True
+    
     def verify_files(self):
         """Verifica l'integrità dei file scaricati"""
         print("\n" + "=" * 60)
@@ -577,35 +701,37 @@ class ANACDownloaderCLI:
                 print("Verifica annullata.")
                 return
             
-            print("\nVerifica in corso...\n")
-            
-            valid_files = 0
-            invalid_files = 0
+            verify_options = get_verify_options(self.config)
+            if not verify_options['deep']:
+                deep = input("Vuoi eseguire la verifica approfondita del contenuto JSON? (s/n): ").lower()
+                verify_options['deep'] = deep == 's'
+            print(f"\nVerifica in corso ({verify_options['workers']} worker)...\n")
+            
+            def on_result(done, total, result):
+                filename = os.path.basename(result['path'])
+                records = f" - {result['records']} record" if result.get('records') is not None else ""
+                if result['valid']:
+                    print(f"[{done}/{total}] ✓ Valido: {filename}{records}")
+                else:
+                    offset = f" al byte {result['error_offset']}" if result.get('error_offset') is not None else ""
+                    print(f"[{done}/{total}] ✗ Invalido o danneggiato: {filename} ({result['error']}{offset})")
             
-            # Verifica file JSON e ZIP
-            for i, filename in enumerate(json_files + zip_files):
-                file_path = os.path.join(check_dir, filename)
-                print(f"[{i+1}/{total_files}] Verifica di {filename}...")
-                
-                try:
-                    if verify_file_integrity(file_path):
-                        print(f"✓ Valido: {filename}")
-                        valid_files += 1
-                    else:
-                        print(f"✗ Invalido o danneggiato: {filename}")
-                        invalid_files += 1
-                except PermissionError:
-                    print(f"✗ Errore di permessi: {filename}")
-                    invalid_files += 1
-                except Exception as e:
-                    print(f"✗ Errore durante la verifica di {filename}: {str(e)}")
-                    invalid_files += 1
+            # Verifica file JSON e ZIP in parallelo
+            file_paths = [os.path.join(check_dir, filename) for filename in json_files + zip_files]
+            summary = verify_files(file_paths, on_result=on_result, logger=self.logger, **verify_options)
             
             print("\n" + "=" * 60)
             print(f"VERIFICA COMPLETATA")
             print("=" * 60)
-            print(f"✓ File validi: {valid_files}")
-            print(f"✗ File invalidi: {invalid_files}")
+            print(f"✓ File validi: {summary['valid']}")
+            print(f"✗ File invalidi: {summary['invalid']}")
+            if 'records' in summary:
+                print(f"📄 Record JSON validati: {summary['records']}")
+            print(f"⏱️ Tempo impiegato: {summary['elapsed']:.1f}s")
+            
+            if self.config.get('save_report', True):
+                report_path = save_verification_report(summary, os.path.join(self.download_dir, 'reports'), check_dir)
+                print(f"\nReport salvato in: {report_path}")
             
             input("\nPremi INVIO per tornare al menu principale...")
             
@@ -991,12 +1117,22 @@ class ANACDownloaderCLI:
             else:
                 print("Opzione non valida. Riprova.")
     
-    def run(self):
-        """Esegue l'interfaccia a terminale interattiva"""
+    def run(self, resume=False):
+        """
+        Esegue l'interfaccia a terminale interattiva.
+        
+        Args:
+            resume: Se True riprende l'ultima esecuzione di download interrotta ed esce,
+                    senza menu né domande
+        """
         if not self.setup():
             print("Impossibile inizializzare l'applicazione. Uscita.")
             return
         
+        if resume:
+            self.resume_download()
+            return
+        
         # Carica link dalla cache all'avvio
         self.json_links = load_links_from_cache(self.links_cache_file)
         if self.json_links:
@@ -7,17 +7,159 @@ import logging
 import zipfile
 import math
 import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
 from pathlib import Path
 # Import from utils module
-from .utils import file_exists, ensure_dir, extract_zip_files, format_size
+from .utils import file_exists, ensure_dir, format_size
+from .http_session import get_session
+from .governor import get_rate_governor, THROTTLE_STATUS
+from .metadata import get_metadata_store, is_remote_unchanged, has_validators, fetch_validators, DEFAULT_METADATA_FILE
+from .hash_cache import get_hash_cache
+from .retry import RetryPolicy, DEFAULT_MAX_RETRY_DELAY
 
-def download_file(url, dest_path, chunk_size=1048576, max_retries=5, backoff=2, logger=None, show_progress=True, check_database=True):
+# Dimensione minima per cui conviene dividere un file in segmenti paralleli
+DEFAULT_SEGMENT_MIN_SIZE = 64 * 1048576
+
+# Un download in corso è scritto in <dest_path>.part e rinominato sul nome finale solo
+# quando è completo; <dest_path>.resume descrive il parziale per la ripresa
+PART_SUFFIX = '.part'
+RESUME_SUFFIX = '.resume'
+
+
+# Esito dell'ultimo download_file fallito nel thread corrente (vedi last_download_failure)
+_last_failure = threading.local()
+
+# Esito dell'ultimo download_file riuscito nel thread corrente (vedi last_download_reused)
+_last_outcome = threading.local()
+
+
+class RangeNotSupportedError(Exception):
+    """Il server ha ignorato l'header Range (risposta 200 invece di 206)."""
+
+
+class ResumableHasher:
+    """
+    SHA256 incrementale di un file parziale, che ricorda fino a quale offset ha già letto.
+
+    Alla ripresa di un download viene letta solo la parte del file non ancora hashata,
+    a blocchi di dimensione fissa: la memoria usata non dipende dalla dimensione del file.
+    Se il file è stato sostituito o troncato l'hash viene ricalcolato da zero, sempre a blocchi.
+    """
+
+    def __init__(self, path, chunk_size=1048576):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.reset()
+
+    def reset(self):
+        self._hash = hashlib.sha256()
+        self.offset = 0
+        self._inode = None
+
+    def update(self, data):
+        self._hash.update(data)
+        self.offset += len(data)
+
+    def catch_up(self, size):
+        """Porta l'hash ai primi `size` byte del file. Restituisce i byte riletti dal disco."""
+        stat = os.stat(self.path)
+        if self.offset > size or (self._inode is not None and stat.st_ino != self._inode):
+            self.reset()
+        self._inode = stat.st_ino
+
+        read_bytes = 0
+        if self.offset < size:
+            with open(self.path, 'rb') as f:
+                f.seek(self.offset)
+                while self.offset < size:
+                    chunk = f.read(min(self.chunk_size, size - self.offset))
+                    if not chunk:
+                        break
+                    self.update(chunk)
+                    read_bytes += len(chunk)
+        return read_bytes
+
+    def hexdigest(self):
+        return self._hash.hexdigest()
+
+
+# Stato dell'hash dei download parziali, condiviso tra i tentativi e le chiamate successive
+# nello stesso processo. Lo stato interno di hashlib non è serializzabile, quindi tra un
+# processo e l'altro la ripresa ricalcola l'hash del parziale a blocchi.
+_resume_hashers = {}
+_resume_hashers_lock = threading.Lock()
+
+
+def _get_resume_hasher(dest_path, chunk_size=1048576):
+    key = os.path.abspath(dest_path)
+    with _resume_hashers_lock:
+        hasher = _resume_hashers.get(key)
+        if hasher is None:
+            hasher = ResumableHasher(dest_path, chunk_size)
+            _resume_hashers[key] = hasher
+        return hasher
+
+
+def _release_resume_hasher(dest_path):
+    with _resume_hashers_lock:
+        _resume_hashers.pop(os.path.abspath(dest_path), None)
+
+
+def get_download_options(config):
+    """
+    Costruisce i parametri di download_file a partire dalla configurazione.
+    
+    Returns:
+        dict: kwargs da passare a download_file
+    """
+    config = config or {}
+    return {
+        'chunk_size': config.get('chunk_size', 1048576),
+        'max_retries': config.get('max_retries', 5),
+        'backoff': config.get('retry_backoff', 2),
+        'retry_base_delay': float(config.get('retry_base_delay', 1.0)),
+        'max_retry_delay': config.get('retry_max_delay', DEFAULT_MAX_RETRY_DELAY),
+        'retry_jitter': bool(config.get('retry_jitter', True)),
+        'segments': config.get('download_segments', 1),
+        'segment_min_size': config.get('segment_min_size', DEFAULT_SEGMENT_MIN_SIZE),
+        'refresh': bool(config.get('refresh_mode', False)),
+        'metadata_store': get_metadata_store(config.get('metadata_file', DEFAULT_METADATA_FILE))
+    }
+
+
+def download_file(url, dest_path, chunk_size=1048576, max_retries=5, backoff=2, logger=None, show_progress=True, check_database=True, session=None, segments=1, segment_min_size=DEFAULT_SEGMENT_MIN_SIZE,
+                  refresh=False, metadata_store=None, on_chunk=None, retry_base_delay=1.0, max_retry_delay=DEFAULT_MAX_RETRY_DELAY,
+                  retry_jitter=True, remote_changed=None):
     """
     Scarica un file da un URL con supporto per download a chunk, retry con backoff esponenziale,
     e visualizzazione della velocità e dimensione totale.
     
+    Con più download in parallelo conviene max_retries=1 e lasciare i nuovi tentativi
+    a run_download_jobs, che li pianifica senza bloccare il worker.
+    In caso di fallimento last_download_failure() indica se ha senso riprovare.
+    
     Args:
         check_database: Se True, verifica anche i file esistenti in /database/JSON
+        session: Sessione HTTP da usare (default: sessione condivisa con connection pool)
+        segments: Numero di range scaricati in parallelo quando il server supporta
+                  Accept-Ranges (1 = download a flusso singolo)
+        segment_min_size: Dimensione minima del file per usare il download a segmenti
+        refresh: Se True e l'URL è già nei metadati, chiede al server se l'archivio è cambiato
+                 (If-None-Match / If-Modified-Since) e lo riscarica solo in quel caso
+        metadata_store: Archivio dei metadati (ETag, Last-Modified, sha256) in cui registrare
+                        i download completati; necessario per la modalità refresh
+        on_chunk: Callback on_chunk(offset, data) chiamata per ogni blocco scritto nel file
+                  (solo download a flusso singolo), es. StreamingZipExtractor.feed
+        retry_base_delay: Attesa base del backoff (il tentativo n attende fino a
+                          retry_base_delay * backoff ** n)
+        max_retry_delay: Attesa massima tra due tentativi
+        retry_jitter: Se rendere casuale l'attesa tra 0 e il valore del backoff
+        remote_changed: Esito della verifica refresh già fatta dal chiamante (True = riscarica,
+                        False = tieni la copia locale): evita una seconda richiesta HEAD
+    
+    Se il file non viene trasferito perché la copia locale è ancora valida,
+    last_download_reused() restituisce True.
     """
     # Messaggi di debug per la risoluzione problemi Linux
     print(f"DEBUG_DOWN: Avvio download da {url}")
@@ -26,9 +168,40 @@ def download_file(url, dest_path, chunk_size=1048576, max_retries=5, backoff=2,
     # Normalizza il percorso di destinazione
     dest_path = os.path.abspath(os.path.expanduser(dest_path))
     print(f"DEBUG_DOWN: Percorso normalizzato: {dest_path}")
+    _last_failure.info = None
+    _last_outcome.reused = False
+    retry_policy = RetryPolicy(max_retries, backoff, base_delay=retry_base_delay, max_delay=max_retry_delay,
+                               jitter=retry_jitter)
+    
+    # Il download avviene in un file .part rinominato solo a download completato:
+    # un file con il nome finale è sempre completo
+    part_path = dest_path + PART_SUFFIX
+    record_path = dest_path + RESUME_SUFFIX
+    _discard_legacy_segments(dest_path)
+    
+    # Sessione condivisa: keep-alive e headers comuni evitano un nuovo handshake per ogni file
+    if session is None:
+        session = get_session()
+    
+    # Modalità refresh: una sola HEAD decide se l'archivio va riscaricato
+    if refresh and metadata_store is not None and os.path.exists(dest_path) and remote_changed is None:
+        unchanged = check_remote_copy(url, dest_path, metadata_store, session, logger)
+        if unchanged:
+            sha256 = metadata_store.get(url)['sha256']
+            if show_progress:
+                print(f"File non modificato sul server. Hash SHA256: {sha256}")
+            _last_outcome.reused = True
+            return sha256
+        remote_changed = unchanged is False
+    if remote_changed:
+        print(f"DEBUG_DOWN: Archivio modificato sul server, nuovo download")
+        if logger:
+            logger.info(f"{url} modificato sul server, nuovo download")
+        # La copia locale è obsoleta ma resta disponibile finché la nuova versione
+        # non la sostituisce con il rename finale
     
     # Verifica se il file esiste già nel percorso di destinazione
-    if os.path.exists(dest_path) and os.path.getsize(dest_path) > 0:
+    if not remote_changed and os.path.exists(dest_path) and os.path.getsize(dest_path) > 0:
         print(f"DEBUG_DOWN: File già esistente con dimensione di {os.path.getsize(dest_path)} bytes")
         # Calcola l'hash del file esistente e ritornalo
         file_hash = calculate_file_hash(dest_path, logger)
@@ -37,16 +210,17 @@ def download_file(url, dest_path, chunk_size=1048576, max_retries=5, backoff=2,
                 logger.info(f"File {dest_path} esiste già. Saltato. Hash={file_hash}")
             if show_progress:
                 print(f"File già esistente. Hash SHA256: {file_hash}")
+            _last_outcome.reused = True
             return file_hash
     
     # Verifica se il file esiste già in /database/JSON
-    if check_database:
+    if check_database and not remote_changed:
         try:
-            from .utils import scan_existing_files, should_skip_download
-            existing_files, _ = scan_existing_files()
+            from .utils import should_skip_download
+            from .catalog import get_file_catalog
             filename = os.path.basename(dest_path)
             
-            should_skip, existing_path = should_skip_download(filename, existing_files)
+            should_skip, existing_path = should_skip_download(filename, get_file_catalog())
             if should_skip:
                 print(f"DEBUG_DOWN: File {filename} già esistente in {existing_path}")
                 if logger:
@@ -98,22 +272,21 @@ def download_file(url, dest_path, chunk_size=1048576, max_retries=5, backoff=2,
             print(f"DEBUG_DOWN: Fallback fallito: {str(me)}")
             return None
     
-    # Headers per simulare una richiesta da browser
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/96.0.4664.110 Safari/537.36',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-        'Accept-Language': 'it-IT,it;q=0.9,en-US;q=0.8,en;q=0.7'
-    }
-    
     attempt = 0
+    last_error = None
     
     # Prima richiesta HEAD per ottenere dimensione totale (se disponibile)
     content_length = None
+    accepts_ranges = False
+    remote_headers = {}
     try:
         print(f"DEBUG_DOWN: Richiesta HEAD a {url}")
-        head_response = requests.head(url, headers=headers, timeout=10)
+        head_response = session.head(url, timeout=10, allow_redirects=True)
+        if head_response.ok:
+            remote_headers = head_response.headers
         if head_response.ok and 'content-length' in head_response.headers:
             content_length = int(head_response.headers['content-length'])
+            accepts_ranges = head_response.headers.get('accept-ranges', '').lower() == 'bytes'
             if content_length > 0 and show_progress:
                 print(f"Dimensione file: {format_size(content_length)}")
                 print(f"DEBUG_DOWN: Dimensione file rilevata: {content_length} bytes")
@@ -122,23 +295,72 @@ def download_file(url, dest_path, chunk_size=1048576, max_retries=5, backoff=2,
         if logger:
             logger.debug(f"Impossibile determinare dimensione file per {url}: {e}")
     
+    # Un parziale è riutilizzabile solo se appartiene allo stesso URL e alla stessa versione remota
+    resume_record = _load_resume_record(record_path, url, content_length, remote_headers)
+    if resume_record is None and (os.path.exists(part_path) or os.path.exists(record_path)):
+        print(f"DEBUG_DOWN: Download parziale non riutilizzabile, ricomincio da zero")
+        _discard_partial(dest_path)
+    
+    # Download a segmenti paralleli per i file grandi, se il server supporta i Range
+    use_segments = (
+        segments > 1 and accepts_ranges and content_length
+        and content_length >= max(segment_min_size, segments)
+    )
+    if use_segments:
+        try:
+            sha256 = download_file_segmented(
+                url, part_path, content_length,
+                segments=segments, chunk_size=chunk_size, max_retries=max_retries,
+                backoff=backoff, logger=logger, show_progress=show_progress, session=session,
+                state_path=record_path, validators=remote_headers, retry_policy=retry_policy
+            )
+            if sha256:
+                _commit_part(dest_path)
+                if metadata_store is not None:
+                    metadata_store.record_download(url, dest_path, sha256, remote_headers, content_length)
+            return sha256
+        except RangeNotSupportedError:
+            print(f"DEBUG_DOWN: Range non supportati, ripiego sul download a flusso singolo")
+            if logger:
+                logger.info(f"Range non supportati per {url}, download a flusso singolo")
+            _discard_partial(dest_path)
+            resume_record = None
+    elif resume_record is not None and 'segments' in resume_record:
+        if content_length is None:
+            # Senza HEAD non possiamo validare lo stato: lo conserviamo per un tentativo successivo
+            print(f"DEBUG_DOWN: Dimensione remota sconosciuta, download a segmenti rinviato")
+            if logger:
+                logger.warning(f"Impossibile riprendere il download a segmenti di {url}: dimensione remota sconosciuta")
+            return None
+        # Stato dei segmenti non più utilizzabile (segmenti disattivati): si ricomincia
+        print(f"DEBUG_DOWN: Stato segmenti non utilizzabile, ricomincio il download")
+        _discard_partial(dest_path)
+    
     # Ciclo dei tentativi di download con backoff esponenziale
     while attempt < max_retries:
         try:
             print(f"DEBUG_DOWN: Tentativo download #{attempt+1}")
-            # Per download ripreso, inizia da dove si era interrotto se il file esiste già
+            # Per download ripreso, inizia da dove si era interrotto se esiste un parziale valido
+            record = _load_resume_record(record_path, url, content_length, remote_headers)
+            if record is not None and 'segments' in record:
+                record = None
+            resume_size = _resume_offset(part_path, record) if record is not None else 0
             resume_header = {}
-            if os.path.exists(dest_path) and os.path.getsize(dest_path) > 0:
-                resume_size = os.path.getsize(dest_path)
-                print(f"DEBUG_DOWN: File esistente, size={resume_size} bytes")
-                # Nota: la verifica del file completo basata sul content-length è ancora utile
-                # in caso il file sia stato parzialmente scaricato precedentemente
+            if resume_size > 0:
+                print(f"DEBUG_DOWN: Download parziale esistente, size={resume_size} bytes")
+                # Il parziale può essere completo se il processo si è interrotto prima del rename
                 if content_length and resume_size >= content_length:
-                    # File già completo
                     print(f"DEBUG_DOWN: File già completo")
                     if logger:
                         logger.info(f"File {dest_path} già scaricato completamente")
-                    return calculate_file_hash(dest_path, logger)
+                    h = _get_resume_hasher(part_path)
+                    h.catch_up(content_length)
+                    sha256 = h.hexdigest()
+                    _commit_part(dest_path, size=content_length)
+                    _store_download_hash(dest_path, sha256)
+                    if metadata_store is not None:
+                        metadata_store.record_download(url, dest_path, sha256, remote_headers, content_length)
+                    return sha256
                 
                 # Altrimenti continuiamo con la ripresa del download
                 resume_header = {'Range': f'bytes={resume_size}-'}
@@ -146,12 +368,12 @@ def download_file(url, dest_path, chunk_size=1048576, max_retries=5, backoff=2,
                 if show_progress:
                     print(f"Ripresa download da {format_size(resume_size)}")
             
-            # Unisci gli headers
-            current_headers = {**headers, **resume_header}
+            # Gli headers comuni sono già nella sessione, qui aggiungiamo solo il Range
+            current_headers = resume_header
             
             # Esegui il download
             print(f"DEBUG_DOWN: Inizio richiesta GET a {url}")
-            with requests.get(url, headers=current_headers, stream=True, timeout=60) as response:
+            with session.get(url, headers=current_headers, stream=True, timeout=60) as response:
                 print(f"DEBUG_DOWN: Risposta ricevuta, status={response.status_code}")
                 response.raise_for_status()
                 print(f"DEBUG_DOWN: Risposta validata")
@@ -161,70 +383,95 @@ def download_file(url, dest_path, chunk_size=1048576, max_retries=5, backoff=2,
                 if is_resuming and response.status_code != 206:
                     # Il server non supporta download parziali, ricomincia da capo
                     print(f"DEBUG_DOWN: Server non supporta download parziali, ricomincio da zero")
-                    if os.path.exists(dest_path):
-                        os.remove(dest_path)
                     is_resuming = False
+                    resume_size = 0
                 
                 total_size = int(response.headers.get('content-length', 0))
                 print(f"DEBUG_DOWN: Content-length dalla risposta: {total_size} bytes")
                 
                 # Se stiamo riprendendo, somma la dimensione già scaricata
                 if is_resuming and total_size > 0:
-                    resume_size = os.path.getsize(dest_path)
                     total_size += resume_size
                     print(f"DEBUG_DOWN: Dimensione totale stimata (con ripresa): {total_size} bytes")
                 
                 if total_size > 0 and show_progress:
                     print(f"Scaricando {format_size(total_size)} da {url}")
                 
-                # Apri il file in append se riprendiamo, altrimenti in write
-                mode = 'ab' if is_resuming else 'wb'
-                print(f"DEBUG_DOWN: Apertura file con mode='{mode}'")
-                
-                # Verifica se il file è apribile prima di procedere
-                try:
-                    test_handle = open(dest_path, mode)
-                    test_handle.close()
-                    print(f"DEBUG_DOWN: Test apertura file riuscito")
-                except Exception as fe:
-                    print(f"DEBUG_DOWN: ERRORE apertura file: {str(fe)}")
-                    if logger:
-                        logger.error(f"Errore apertura file {dest_path}: {str(fe)}")
-                    if show_progress:
-                        print(f"\nErrore apertura file {dest_path}: {str(fe)}")
-                    return None
+                # Nuovo download: .part preallocato con fallocate se la dimensione è nota
+                # (meno frammentazione, spazio su disco garantito dall'inizio)
+                if not is_resuming:
+                    record = {
+                        'url': url,
+                        'content_length': total_size or None,
+                        'etag': response.headers.get('ETag') or remote_headers.get('ETag'),
+                        'last_modified': response.headers.get('Last-Modified') or remote_headers.get('Last-Modified'),
+                        'preallocated': total_size > 0,
+                        'done': 0
+                    }
+                    try:
+                        if total_size > 0:
+                            _preallocate_file(part_path, total_size)
+                        else:
+                            open(part_path, 'wb').close()
+                    except Exception as fe:
+                        print(f"DEBUG_DOWN: ERRORE apertura file: {str(fe)}")
+                        if logger:
+                            logger.error(f"Errore apertura file {part_path}: {str(fe)}")
+                        if show_progress:
+                            print(f"\nErrore apertura file {part_path}: {str(fe)}")
+                        return None
+                    _save_resume_record(record_path, record)
+                    print(f"DEBUG_DOWN: Creato file parziale {part_path} (preallocato: {record['preallocated']})")
                 
-                h = hashlib.sha256()
+                h = _get_resume_hasher(part_path)
+                governor = get_rate_governor()
                 downloaded = 0
                 start_time = time.time()
                 print(f"DEBUG_DOWN: Inizio download, orario={start_time}")
-                
-                # Se riprendiamo, prepara l'hash con il contenuto esistente
+
+                # Se riprendiamo, porta l'hash al contenuto esistente rileggendo solo
+                # la parte non ancora hashata, a blocchi
                 if is_resuming:
-                    print(f"DEBUG_DOWN: Carico contenuto esistente per hash")
-                    with open(dest_path, 'rb') as f:
-                        data = f.read()
-                        h.update(data)
-                    downloaded = len(data)
+                    hashed_before = h.offset
+                    read_bytes = h.catch_up(resume_size)
+                    print(f"DEBUG_DOWN: Hash del parziale: {hashed_before} bytes già noti, {read_bytes} riletti dal disco")
+                    downloaded = h.offset
+                    if downloaded != resume_size:
+                        # Parziale più corto di quanto registrato: non è affidabile
+                        _discard_partial(dest_path)
+                        raise requests.exceptions.ConnectionError("Download parziale non coerente, ricomincio da zero")
+                else:
+                    h.reset()
                 
                 # Apertura file per il download
                 print(f"DEBUG_DOWN: Apertura file per scrittura dati")
                 
                 try:
-                    with open(dest_path, mode) as f:
+                    with open(part_path, 'r+b') as f:
+                        f.seek(downloaded)
                         # Variabili per il calcolo della velocità
                         last_update_time = start_time
                         last_downloaded = downloaded
+                        last_record_time = start_time
                         
                         print(f"DEBUG_DOWN: Inizio download a chunk")
                         for chunk in response.iter_content(chunk_size=chunk_size):
                             if chunk:  # Filtra keep-alive chunks vuoti
                                 f.write(chunk)
                                 h.update(chunk)
+                                governor.consume_bytes(url, len(chunk))
+                                if on_chunk is not None:
+                                    on_chunk(downloaded, chunk)
                                 downloaded += len(chunk)
                                 
                                 # Aggiorna velocità e progresso ogni secondo
                                 current_time = time.time()
+                                if current_time - last_record_time >= 1:
+                                    # Il record di ripresa non deve mai superare i dati scritti
+                                    f.flush()
+                                    record['done'] = downloaded
+                                    _save_resume_record(record_path, record)
+                                    last_record_time = current_time
                                 if show_progress and (current_time - last_update_time) >= 1:
                                     # Calcola velocità in bytes/secondo
                                     speed = (downloaded - last_downloaded) / (current_time - last_update_time)
@@ -247,25 +494,49 @@ def download_file(url, dest_path, chunk_size=1048576, max_retries=5, backoff=2,
                                     last_update_time = current_time
                                     last_downloaded = downloaded
                         
-                        # Download completato con successo
-                        print(f"DEBUG_DOWN: Download completato con successo")
-                        
-                        total_time = time.time() - start_time
-                        sha256 = h.hexdigest()
-                        
-                        print(f"DEBUG_DOWN: Download completato in {total_time:.1f}s, SHA256={sha256}")
-                        print(f"DEBUG_DOWN: Dimensione finale file: {os.path.getsize(dest_path)} bytes")
-                        
-                        if show_progress:
-                            if total_size > 0:
-                                print(f"\r{generate_progress_bar(100)} 100% | {format_size(total_size)} | Media: {format_size(downloaded/total_time)}/s | Completato in {total_time:.1f}s")
-                            else:
-                                print(f"\rScaricati {format_size(downloaded)} | Media: {format_size(downloaded/total_time)}/s | Completato in {total_time:.1f}s")
-                        
-                        if logger:
-                            logger.info(f"Scaricato {url} in {dest_path} ({format_size(downloaded)}, {total_time:.1f}s) SHA256={sha256}")
-                        
-                        return sha256
+                        # Un flusso più corto del content-length è un download interrotto, non completo
+                        if total_size > 0 and downloaded != total_size:
+                            raise requests.exceptions.ConnectionError(
+                                f"Download incompleto: ricevuti {downloaded} bytes su {total_size}"
+                            )
+                        f.truncate(downloaded)
+                    
+                    # Download completato con successo: fsync e rename sul nome finale
+                    _commit_part(dest_path, size=downloaded)
+                    print(f"DEBUG_DOWN: Download completato con successo")
+                    
+                    total_time = time.time() - start_time
+                    sha256 = h.hexdigest()
+                    
+                    # Registra l'hash appena calcolato: i controlli successivi sul file
+                    # esistente non dovranno rileggerlo
+                    _store_download_hash(dest_path, sha256)
+                    
+                    print(f"DEBUG_DOWN: Download completato in {total_time:.1f}s, SHA256={sha256}")
+                    print(f"DEBUG_DOWN: Dimensione finale file: {os.path.getsize(dest_path)} bytes")
+                    
+                    if show_progress:
+                        if total_size > 0:
+                            print(f"\r{generate_progress_bar(100)} 100% | {format_size(total_size)} | Media: {format_size(downloaded/total_time)}/s | Completato in {total_time:.1f}s")
+                        else:
+                            print(f"\rScaricati {format_size(downloaded)} | Media: {format_size(downloaded/total_time)}/s | Completato in {total_time:.1f}s")
+                    
+                    if logger:
+                        logger.info(f"Scaricato {url} in {dest_path} ({format_size(downloaded)}, {total_time:.1f}s) SHA256={sha256}")
+                    
+                    if metadata_store is not None:
+                        # Gli header della GET sono più affidabili di quelli della HEAD
+                        validators = response.headers if response.status_code == 200 else remote_headers
+                        metadata_store.record_download(url, dest_path, sha256, validators, os.path.getsize(dest_path))
+                    return sha256
+                except requests.exceptions.RequestException:
+                    # Connessione interrotta durante lo streaming: il record di ripresa indica
+                    # fin dove il parziale è valido e il tentativo successivo riprende da lì,
+                    # riusando lo stato dell'hash
+                    if os.path.exists(part_path):
+                        record['done'] = downloaded
+                        _save_resume_record(record_path, record)
+                    raise
                 except Exception as write_error:
                     print(f"DEBUG_DOWN: ERRORE durante la scrittura: {str(write_error)}")
                     if logger:
@@ -276,58 +547,430 @@ def download_file(url, dest_path, chunk_size=1048576, max_retries=5, backoff=2,
                 
         except requests.exceptions.RequestException as e:
             attempt += 1
-            wait_time = backoff ** attempt
+            last_error = e
             
             print(f"DEBUG_DOWN: Errore richiesta HTTP: {str(e)}")
             
             if show_progress:
                 print(f"\nErrore download: {str(e)}")
-                print(f"Tentativo {attempt}/{max_retries} - Nuovo tentativo tra {wait_time}s...")
             
-            if logger:
-                logger.warning(f"Errore download {url}: {e}, tentativo {attempt}/{max_retries} tra {wait_time}s")
+            if _is_permanent_error(e):
+                # Errore definitivo (es. 404): inutile riprovare
+                if logger:
+                    logger.error(f"Errore definitivo per {url}: {e}")
+                break
             
-            time.sleep(wait_time)
+            # Nessuna attesa dopo l'ultimo tentativo
+            if attempt < max_retries:
+                wait_time = _retry_wait(url, e, retry_policy, attempt)
+                if show_progress:
+                    print(f"Tentativo {attempt}/{max_retries} - Nuovo tentativo tra {wait_time:.1f}s...")
+                if logger:
+                    logger.warning(f"Errore download {url}: {e}, tentativo {attempt}/{max_retries} tra {wait_time:.1f}s")
+                time.sleep(wait_time)
             
         except Exception as e:
             attempt += 1
-            wait_time = backoff ** attempt
+            last_error = e
             
             print(f"DEBUG_DOWN: Errore generico: {str(e)}")
             print(f"DEBUG_DOWN: Tipo errore: {type(e).__name__}")
             
             if show_progress:
                 print(f"\nErrore inatteso: {str(e)}")
-                print(f"Tentativo {attempt}/{max_retries} - Nuovo tentativo tra {wait_time}s...")
             
-            if logger:
-                logger.warning(f"Errore inatteso durante download {url}: {e}, tentativo {attempt}/{max_retries} tra {wait_time}s")
-            
-            time.sleep(wait_time)
+            if attempt < max_retries:
+                wait_time = retry_policy.delay(attempt)
+                if show_progress:
+                    print(f"Tentativo {attempt}/{max_retries} - Nuovo tentativo tra {wait_time:.1f}s...")
+                if logger:
+                    logger.warning(f"Errore inatteso durante download {url}: {e}, tentativo {attempt}/{max_retries} tra {wait_time:.1f}s")
+                time.sleep(wait_time)
     
     # Tutti i tentativi sono falliti
-    print(f"DEBUG_DOWN: Download fallito definitivamente dopo {max_retries} tentativi")
+    print(f"DEBUG_DOWN: Download fallito definitivamente dopo {attempt} tentativi")
+    _last_failure.info = {
+        'url': url,
+        'error': str(last_error) if last_error else 'Download fallito',
+        'retryable': not _is_permanent_error(last_error)
+    }
     
     if logger:
-        logger.error(f"Download fallito per {url} dopo {max_retries} tentativi")
+        logger.error(f"Download fallito per {url} dopo {attempt} tentativi")
     
     if show_progress:
-        print(f"\nDownload fallito dopo {max_retries} tentativi: {url}")
+        print(f"\nDownload fallito dopo {attempt} tentativi: {url}")
     
     return None
 
-def calculate_file_hash(file_path, logger=None):
-    """Calcola l'hash SHA256 di un file già scaricato."""
+def last_download_failure():
+    """
+    Motivo del fallimento dell'ultimo download_file del thread corrente.
+
+    Returns:
+        dict or None: {'url', 'error', 'retryable'}; retryable è False per gli errori
+                      definitivi (es. 404), per cui un nuovo tentativo non serve
+    """
+    return getattr(_last_failure, 'info', None)
+
+
+def last_download_reused():
+    """
+    True se l'ultimo download_file del thread corrente ha restituito una copia locale
+    già presente (non modificata sul server o non verificabile) senza trasferire dati.
+    """
+    return getattr(_last_outcome, 'reused', False)
+
+
+def check_remote_copy(url, local_path, metadata_store, session=None, logger=None):
+    """
+    Modalità refresh: con una sola richiesta HEAD verifica se la copia locale di url è attuale.
+
+    Con metadati utilizzabili la richiesta è condizionale (If-None-Match / If-Modified-Since).
+    Senza metadati (file scaricato prima dell'archivio dei metadati) la HEAD legge i validatori
+    e li registra con l'hash della copia locale, così l'esecuzione successiva può fare una
+    richiesta condizionale.
+
+    Returns:
+        bool or None: True se invariato, False se cambiato, None se non determinabile
+                      (la copia locale viene tenuta)
+    """
+    if session is None:
+        session = get_session()
+    record = metadata_store.get(url)
+    if has_validators(record):
+        unchanged = is_remote_unchanged(url, record, session, logger=logger)
+        if unchanged:
+            print(f"DEBUG_DOWN: Archivio non modificato sul server, download evitato")
+            metadata_store.mark_not_modified(url)
+            if logger:
+                logger.info(f"{url} non modificato dall'ultimo download ({record.get('fetched_at')}). Saltato.")
+        elif unchanged is None:
+            # Un esito not_modified precedente non vale per questa verifica
+            metadata_store.mark_unverified(url)
+        return unchanged
+    
+    headers = fetch_validators(url, session, logger=logger)
+    if headers is None:
+        metadata_store.mark_unverified(url)
+        return None
+    sha256 = calculate_file_hash(local_path, logger)
+    if sha256:
+        content_length = headers.get('content-length')
+        metadata_store.record_download(url, local_path, sha256, headers,
+                                       int(content_length) if content_length else os.path.getsize(local_path),
+                                       status='existing')
+        print(f"DEBUG_DOWN: Metadati registrati per la copia locale esistente di {url}")
+    return None
+
+
+def _is_permanent_error(error):
+    """Errori HTTP 4xx che non cambiano riprovando (tranne timeout e limiti di frequenza)."""
+    response = getattr(error, 'response', None)
+    if response is None:
+        return False
+    return 400 <= response.status_code < 500 and response.status_code not in (408, 425) + THROTTLE_STATUS
+
+
+def _retry_wait(url, error, retry_policy, attempt):
+    """
+    Attesa prima del tentativo successivo: per un 429/503 quella imposta dal server
+    (Retry-After, registrata dal governor), altrimenti il backoff della politica.
+    """
+    response = getattr(error, 'response', None)
+    governor = get_rate_governor()
+    if response is not None and response.status_code in THROTTLE_STATUS and governor.adaptive:
+        return governor.remaining_block(url)
+    return retry_policy.delay(attempt)
+
+
+def has_pending_download(dest_path):
+    """True se per dest_path esiste un download non ancora completato (file .part)."""
+    dest_path = os.path.abspath(os.path.expanduser(dest_path))
+    return os.path.exists(dest_path + PART_SUFFIX) or os.path.exists(dest_path + '.segments')
+
+
+def _discard_legacy_segments(dest_path):
+    """
+    Le versioni precedenti scrivevano i download a segmenti direttamente in dest_path,
+    con lo stato in dest_path.segments: quel file è un parziale e va scartato.
+    """
+    legacy_state = dest_path + '.segments'
+    if os.path.exists(legacy_state):
+        print(f"DEBUG_DOWN: Scarto il download a segmenti incompleto nel vecchio formato")
+        for path in (dest_path, legacy_state):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def _discard_partial(dest_path):
+    """Elimina il file .part e il record di ripresa di dest_path."""
+    part_path = dest_path + PART_SUFFIX
+    for path in (part_path, dest_path + RESUME_SUFFIX):
+        if os.path.exists(path):
+            os.remove(path)
+    _release_resume_hasher(part_path)
+
+
+def _load_resume_record(record_path, url, content_length=None, headers=None):
+    """
+    Carica il record di ripresa se descrive un parziale dello stesso URL e della stessa
+    versione remota (dimensione, ETag e Last-Modified quando noti).
+    """
+    try:
+        with open(record_path, 'r', encoding='utf-8') as f:
+            record = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if record.get('url') != url or not os.path.exists(record_path[:-len(RESUME_SUFFIX)] + PART_SUFFIX):
+        return None
+    if content_length is not None and record.get('content_length') not in (None, content_length):
+        return None
+    headers = headers or {}
+    for key, header in (('etag', 'ETag'), ('last_modified', 'Last-Modified')):
+        if record.get(key) and headers.get(header) and record[key] != headers.get(header):
+            return None
+    return record
+
+
+def _save_resume_record(record_path, record):
+    """Salva il record di ripresa in modo atomico (file temporaneo + rename)."""
+    tmp_path = record_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(record, f)
+    os.replace(tmp_path, record_path)
+
+
+def _resume_offset(part_path, record):
+    """Byte validi del parziale: quelli registrati se il file è preallocato, altrimenti la sua dimensione."""
+    if not os.path.exists(part_path):
+        return 0
+    size = os.path.getsize(part_path)
+    if record.get('preallocated'):
+        return min(int(record.get('done', 0)), size)
+    return size
+
+
+def _commit_part(dest_path, size=None):
+    """
+    Rende definitivo un download completato: porta il .part alla dimensione finale,
+    lo sincronizza su disco e lo rinomina in modo atomico sul nome finale.
+    """
+    part_path = dest_path + PART_SUFFIX
+    with open(part_path, 'r+b') as f:
+        if size is not None:
+            f.truncate(size)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(part_path, dest_path)
+    # Anche il rename deve sopravvivere a un crash: fsync della cartella dove supportato
+    try:
+        dir_fd = os.open(os.path.dirname(dest_path), os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+    except OSError:
+        pass
+    if os.path.exists(dest_path + RESUME_SUFFIX):
+        os.remove(dest_path + RESUME_SUFFIX)
+    _release_resume_hasher(part_path)
+
+
+def _store_download_hash(dest_path, sha256):
+    """Registra nella cache l'hash di un file appena scaricato."""
+    try:
+        get_hash_cache().store(dest_path, sha256)
+    except Exception as cache_error:
+        print(f"DEBUG_DOWN: Impossibile registrare l'hash in cache: {cache_error}")
+
+
+def _load_segment_state(state_path, url, content_length):
+    """Carica lo stato dei segmenti se corrisponde allo stesso URL e alla stessa dimensione."""
+    try:
+        with open(state_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        if state.get('url') == url and state.get('content_length') == content_length and 'segments' in state:
+            return state
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def _preallocate_file(path, size):
+    """Crea il file con la dimensione finale, usando fallocate dove disponibile."""
+    with open(path, 'wb') as f:
+        if hasattr(os, 'posix_fallocate') and size > 0:
+            try:
+                os.posix_fallocate(f.fileno(), 0, size)
+                return
+            except OSError:
+                pass
+        f.truncate(size)
+
+
+def download_file_segmented(url, dest_path, content_length, segments=4, chunk_size=1048576, max_retries=5, backoff=2, logger=None, show_progress=True, session=None,
+                            state_path=None, validators=None, retry_policy=None):
+    """
+    Scarica un file dividendolo in `segments` range di byte scaricati in parallelo
+    in un file preallocato. Lo stato di ogni segmento è salvato in `state_path`
+    (default `dest_path.segments`), così un download interrotto riprende solo i byte
+    mancanti di ciascun segmento. Lo stato resta su disco anche a download completato:
+    lo rimuove chi rende definitivo il file (download_file lo scrive in un .part).
+    
+    Args:
+        validators: Headers della risposta HEAD; ETag e Last-Modified sono salvati nello
+                    stato per non riprendere il parziale di una versione diversa
+        retry_policy: Attese tra i tentativi di un segmento (default: backoff con jitter)
+    
+    Returns:
+        str: SHA256 del file completo, None se alcuni segmenti non sono stati completati
+    
+    Raises:
+        RangeNotSupportedError: se il server risponde senza 206 a una richiesta Range
+    """
+    if session is None:
+        session = get_session()
+    retry_policy = retry_policy or RetryPolicy(max_retries, backoff)
+    
+    state_path = state_path or dest_path + '.segments'
+    validators = validators or {}
+    state = _load_segment_state(state_path, url, content_length)
+    
+    if state is None or not os.path.exists(dest_path) or os.path.getsize(dest_path) != content_length:
+        segment_size = int(math.ceil(content_length / float(segments)))
+        state = {
+            'url': url,
+            'content_length': content_length,
+            'etag': validators.get('ETag'),
+            'last_modified': validators.get('Last-Modified'),
+            'segments': [
+                {'start': start, 'end': min(start + segment_size, content_length) - 1, 'done': 0}
+                for start in range(0, content_length, segment_size)
+            ]
+        }
+        _preallocate_file(dest_path, content_length)
+        _save_resume_record(state_path, state)
+        print(f"DEBUG_DOWN: Download a {len(state['segments'])} segmenti di {format_size(segment_size)}")
+    else:
+        print(f"DEBUG_DOWN: Ripresa download a segmenti da {state_path}")
+    
+    governor = get_rate_governor()
+    lock = threading.Lock()
+    abort = threading.Event()
+    progress = {'last_save': time.time()}
+    
+    def save_state(force=False):
+        with lock:
+            now = time.time()
+            if force or now - progress['last_save'] >= 1:
+                _save_resume_record(state_path, state)
+                progress['last_save'] = now
+    
+    def fetch_segment(segment):
+        attempt = 0
+        while segment['start'] + segment['done'] <= segment['end'] and not abort.is_set():
+            offset = segment['start'] + segment['done']
+            try:
+                headers = {'Range': f"bytes={offset}-{segment['end']}"}
+                with session.get(url, headers=headers, stream=True, timeout=60) as response:
+                    response.raise_for_status()
+                    if response.status_code != 206:
+                        raise RangeNotSupportedError(f"Risposta {response.status_code} a richiesta Range")
+                    with open(dest_path, 'r+b') as f:
+                        f.seek(offset)
+                        for chunk in response.iter_content(chunk_size=chunk_size):
+                            if abort.is_set():
+                                return False
+                            if not chunk:
+                                continue
+                            remaining = segment['end'] + 1 - (segment['start'] + segment['done'])
+                            chunk = chunk[:remaining]
+                            f.write(chunk)
+                            f.flush()
+                            governor.consume_bytes(url, len(chunk))
+                            with lock:
+                                segment['done'] += len(chunk)
+                            save_state()
+                            if remaining <= len(chunk):
+                                break
+                # Una risposta che non fa avanzare il segmento conta come tentativo fallito:
+                # altrimenti le richieste Range si ripeterebbero all'infinito
+                if segment['start'] + segment['done'] == offset and not abort.is_set():
+                    raise IOError(f"Nessun byte ricevuto per il range {offset}-{segment['end']}")
+            except RangeNotSupportedError:
+                abort.set()
+                raise
+            except Exception as e:
+                attempt += 1
+                if attempt >= max_retries or _is_permanent_error(e):
+                    if logger:
+                        logger.error(f"Segmento {segment['start']}-{segment['end']} di {url} fallito dopo {attempt} tentativi: {e}")
+                    return False
+                wait_time = _retry_wait(url, e, retry_policy, attempt)
+                if logger:
+                    logger.warning(f"Errore segmento {segment['start']}-{segment['end']} di {url}: {e}, tentativo {attempt}/{max_retries} tra {wait_time:.1f}s")
+                time.sleep(wait_time)
+        return segment['start'] + segment['done'] > segment['end']
+    
+    pending = [s for s in state['segments'] if s['start'] + s['done'] <= s['end']]
+    start_time = time.time()
+    already_done = sum(s['done'] for s in state['segments'])
+    
+    if pending:
+        with ThreadPoolExecutor(max_workers=len(pending), thread_name_prefix='segment') as executor:
+            futures = [executor.submit(fetch_segment, s) for s in pending]
+            not_done = futures
+            while not_done:
+                _, not_done = wait(not_done, timeout=1)
+                if show_progress:
+                    with lock:
+                        downloaded = sum(s['done'] for s in state['segments'])
+                    elapsed = max(time.time() - start_time, 0.001)
+                    speed = (downloaded - already_done) / elapsed
+                    percent = min(100, downloaded * 100 / content_length)
+                    print(f"\r{generate_progress_bar(percent)} {percent:.1f}% | {format_size(downloaded)}/{format_size(content_length)} | {format_size(speed)}/s | {len(pending)} segmenti", end='')
+            # Propaga RangeNotSupportedError dal primo segmento che l'ha sollevata
+            for future in futures:
+                future.result()
+    
+    save_state(force=True)
+    if any(s['start'] + s['done'] <= s['end'] for s in state['segments']):
+        print(f"DEBUG_DOWN: Download a segmenti incompleto, stato salvato in {state_path}")
+        if logger:
+            logger.error(f"Download a segmenti incompleto per {url}, riprendibile da {state_path}")
+        if show_progress:
+            print(f"\nDownload incompleto: {url}")
+        return None
+    
+    total_time = time.time() - start_time
+    sha256 = calculate_file_hash(dest_path, logger)
+    
+    if show_progress:
+        print(f"\r{generate_progress_bar(100)} 100% | {format_size(content_length)} | Media: {format_size((content_length - already_done) / max(total_time, 0.001))}/s | Completato in {total_time:.1f}s")
+    if logger:
+        logger.info(f"Scaricato {url} in {dest_path} a segmenti ({format_size(content_length)}, {total_time:.1f}s) SHA256={sha256}")
+    
+    return sha256
+
+
+def calculate_file_hash(file_path, logger=None, use_cache=True):
+    """
+    Calcola l'hash SHA256 di un file già scaricato.
+    
+    Con use_cache l'hash viene letto dalla cache (device, inode, dimensione, mtime)
+    se il file non è cambiato dall'ultimo calcolo, senza rileggerlo dal disco.
+    """
     try:
-        h = hashlib.sha256()
-        with open(file_path, 'rb') as f:
-            chunk_size = 1048576  # 1MB
-            for chunk in iter(lambda: f.read(chunk_size), b''):
-                h.update(chunk)
-        sha256 = h.hexdigest()
+        if use_cache:
+            sha256, from_cache = get_hash_cache().file_hash(file_path)
+        else:
+            from .utils import sha256sum
+            sha256, from_cache = sha256sum(file_path), False
         
         if logger:
-            logger.debug(f"Calcolato hash per {file_path}: {sha256}")
+            origin = "dalla cache" if from_cache else "calcolato"
+            logger.debug(f"Hash per {file_path} ({origin}): {sha256}")
         
         return sha256
     except Exception as e:
@@ -341,8 +984,13 @@ def generate_progress_bar(percent, width=30):
     bar = '█' * filled_width + '░' * (width - filled_width)
     return f"[{bar}]"
 
-def verify_file_integrity(file_path, expected_hash=None):
-    """Verifica integrità del file."""
+def verify_file_integrity(file_path, expected_hash=None, deep=False):
+    """
+    Verifica integrità del file.
+    
+    Con deep=True i file JSON e i membri JSON degli archivi ZIP sono validati in
+    streaming (memoria costante): un JSON troncato o corrotto risulta non integro.
+    """
     if not file_exists(file_path):
         return False
     
@@ -352,9 +1000,15 @@ def verify_file_integrity(file_path, expected_hash=None):
         
     # Verifica hash se fornito
     if expected_hash:
-        from utils import sha256sum
-        actual_hash = sha256sum(file_path)
-        return actual_hash == expected_hash
+        actual_hash = calculate_file_hash(file_path)
+        if actual_hash != expected_hash:
+            return False
+    
+    if deep:
+        from .validation import deep_validate
+        validation = deep_validate(file_path)
+        if validation is not None:
+            return validation['valid']
     
     return True
 
@@ -381,12 +1035,15 @@ def should_download(dest_path, expected_hash=None, force=False):
     # Il file esiste ma è vuoto, deve essere scaricato
     if os.path.getsize(dest_path) == 0:
         return True
+    
+    # Il file è un download a segmenti interrotto, va ripreso
+    if has_pending_download(dest_path):
+        return True
         
     # Se abbiamo un hash atteso, verifica che corrisponda
     if expected_hash:
-        from utils import sha256sum
         try:
-            actual_hash = sha256sum(dest_path)
+            actual_hash = get_hash_cache().file_hash(dest_path)[0]
             return actual_hash != expected_hash
         except Exception as e:
             # Se c'è un errore nel calcolo dell'hash, meglio scaricare di nuovo
@@ -397,28 +1054,70 @@ def should_download(dest_path, expected_hash=None, force=False):
     # Non scaricare nuovamente (questo è il cambiamento principale)
     return False
 
-def process_downloaded_file(file_path, extract_dir=None, logger=None, config=None):
-    """Processa un file scaricato, estraendo il contenuto se è un ZIP."""
+def get_zip_member_filter(config):
+    """
+    Filtro sui nomi dei membri ZIP secondo include_formats, exclude_formats ed
+    extract_json_only della configurazione.
+    
+    Returns:
+        callable: member_filter(name) -> bool
+    """
+    config = config or {}
+    extract_json_only = config.get('extract_json_only', True)
+    include_formats = config.get('include_formats', ['json'])
+    exclude_formats = config.get('exclude_formats', ['ttl', 'csv', 'xml'])
+    
+    def member_filter(name):
+        name_lower = name.lower()
+        # Controlla formati da escludere
+        if any(name_lower.endswith(f'.{ext}') or f'_{ext}.' in name_lower for ext in exclude_formats):
+            return False
+        # Controlla formati da includere se estratti solo JSON
+        if extract_json_only and not any(name_lower.endswith(f'.{ext}') or f'_{ext}.' in name_lower for ext in include_formats):
+            return False
+        return True
+    
+    return member_filter
+
+
+def get_extract_subdir(file_path, extract_dir=None):
+    """Cartella di estrazione usata da process_downloaded_file: <extract_dir>/<nome archivio>."""
+    if not extract_dir:
+        extract_dir = os.path.dirname(file_path)
+    return os.path.join(extract_dir, os.path.splitext(os.path.basename(file_path))[0])
+
+
+def process_downloaded_file(file_path, extract_dir=None, logger=None, config=None, stream_extractor=None):
+    """
+    Processa un file scaricato, estraendo il contenuto se è un ZIP.
+    
+    Se stream_extractor ha già estratto i membri durante il download (vedi
+    zipstream.create_stream_extractor), l'archivio non viene riletto.
+    """
     if not config:
         config = {}
         
     extract_json_only = config.get('extract_json_only', True)
-    include_formats = config.get('include_formats', ['json'])
-    exclude_formats = config.get('exclude_formats', ['ttl', 'csv', 'xml'])
+    member_filter = get_zip_member_filter(config)
     
     if file_path.lower().endswith('.zip'):
-        if not extract_dir:
-            extract_dir = os.path.dirname(file_path)
-        
-        # Crea cartella con nome del file (senza estensione)
         base_name = os.path.basename(file_path)
-        file_name_no_ext = os.path.splitext(base_name)[0]
-        extract_subdir = os.path.join(extract_dir, file_name_no_ext)
+        extract_subdir = get_extract_subdir(file_path, extract_dir)
         ensure_dir(extract_subdir)
         
+        if stream_extractor is not None:
+            extracted_files = stream_extractor.finish(file_path)
+            if extracted_files is not None:
+                return {
+                    'is_zip': True,
+                    'extracted_files': extracted_files,
+                    'extract_dir': extract_subdir,
+                    'total_files': stream_extractor.total_members,
+                    'streamed': True
+                }
+        
         try:
             # Estrai file ZIP
-            extracted_files = []
             with zipfile.ZipFile(file_path, 'r') as zip_ref:
                 # Lista tutti i file nel ZIP
                 file_list = zip_ref.namelist()
@@ -426,18 +1125,9 @@ def process_downloaded_file(file_path, extract_dir=None, logger=None, config=Non
                 # Filtra i file in base ai formati da includere/escludere
                 filtered_files = []
                 for f in file_list:
-                    f_lower = f.lower()
-                    
-                    # Controlla formati da escludere
-                    if any(f_lower.endswith(f'.{ext}') or f'_{ext}.' in f_lower for ext in exclude_formats):
+                    if not member_filter(f):
                         if logger:
-                            logger.debug(f"Escluso file {f} dal formato")
-                        continue
-                        
-                    # Controlla formati da includere se estratti solo JSON
-                    if extract_json_only and not any(f_lower.endswith(f'.{ext}') or f'_{ext}.' in f_lower for ext in include_formats):
-                        if logger:
-                            logger.debug(f"File {f} non è nel formato richiesto")
+                            logger.debug(f"File {f} escluso dai formati richiesti")
                         continue
                     
                     filtered_files.append(f)
@@ -453,23 +1143,30 @@ def process_downloaded_file(file_path, extract_dir=None, logger=None, config=Non
                         if logger:
                             logger.info(f"Estrazione di tutti i file dall'archivio {base_name}")
                 
-                # Estrai i file filtrati
-                for file_name in filtered_files:
-                    zip_ref.extract(file_name, extract_subdir)
-                    extracted_path = os.path.join(extract_subdir, file_name)
-                    extracted_files.append(extracted_path)
-                    if logger:
-                        logger.info(f"Estratto file {file_name} da {base_name}")
+            # Estrai i file filtrati, decomprimendo i membri in parallelo
+            from .extraction import extract_members, get_extract_options
+            extraction = extract_members(file_path, extract_subdir, members=filtered_files, logger=logger,
+                                         **get_extract_options(config))
+            extracted_files = extraction['extracted']
             
             if logger:
                 logger.info(f"Estratti {len(extracted_files)} file su {len(file_list)} presenti nell'archivio {base_name}")
             
-            return {
+            result = {
                 'is_zip': True,
                 'extracted_files': extracted_files,
                 'extract_dir': extract_subdir,
-                'total_files': len(file_list)
+                'total_files': len(file_list),
+                'extraction_stats': {
+                    'bytes': extraction['bytes'],
+                    'elapsed': extraction['elapsed'],
+                    'workers': extraction['workers'],
+                    'members': extraction['members']
+                }
             }
+            if extraction['errors']:
+                result['error'] = f"{len(extraction['errors'])} membri non estratti"
+            return result
         except Exception as e:
             if logger:
                 logger.error(f"Errore durante l'estrazione di {file_path}: {str(e)}")
@@ -484,7 +1181,8 @@ def process_downloaded_file(file_path, extract_dir=None, logger=None, config=Non
         'path': file_path
     }
 
-def download_with_auto_sorting(url, base_download_dir, logger=None, show_progress=True, extract_zip=True):
+def download_with_auto_sorting(url, base_download_dir, logger=None, show_progress=True, extract_zip=True, download_options=None,
+                               stream_extract=False, extract_options=None, database_path=None):
     """
     Scarica un file e lo smista automaticamente nella cartella appropriata in /database/JSON.
     
@@ -494,15 +1192,24 @@ def download_with_auto_sorting(url, base_download_dir, logger=None, show_progres
         logger: Logger per i messaggi
         show_progress: Se mostrare il progresso del download
         extract_zip: Se estrarre automaticamente i file ZIP
+        download_options: Parametri aggiuntivi per download_file (vedi get_download_options)
+        stream_extract: Se estrarre i JSON degli archivi ZIP durante il download
+                        (vedi zipstream.stream_extraction_enabled)
+        extract_options: Parametri dell'estrazione parallela (vedi extraction.get_extract_options)
+        database_path: Cartella di smistamento (predefinita /database/JSON)
         
     Returns:
         dict: Informazioni sul file scaricato e smistato
     """
+    extractor = None
     try:
-        from .utils import scan_existing_files, determine_target_folder, ensure_dir
+        from .utils import determine_target_folder, ensure_dir
+        from .catalog import get_file_catalog, DEFAULT_DATABASE_PATH
         
-        # Scansiona i file esistenti e le cartelle disponibili
-        existing_files, available_folders = scan_existing_files()
+        # Catalogo dei file esistenti e delle cartelle disponibili (scansione solo alla prima richiesta)
+        database_path = database_path or DEFAULT_DATABASE_PATH
+        catalog = get_file_catalog(database_path)
+        available_folders = catalog.folders()
         
         # Estrai il nome del file dall'URL
         filename = os.path.basename(url.split('?')[0])
@@ -511,7 +1218,27 @@ def download_with_auto_sorting(url, base_download_dir, logger=None, show_progres
         
         # Verifica se il file esiste già
         from .utils import should_skip_download
-        should_skip, existing_path = should_skip_download(filename, existing_files)
+        should_skip, existing_path = should_skip_download(filename, catalog)
+        
+        # In modalità refresh un file già presente viene riscaricato solo se cambiato sul server:
+        # l'esito passa a download_file, che non ripete la richiesta HEAD
+        download_options = download_options or {}
+        metadata_store = download_options.get('metadata_store')
+        refresh_path = None
+        remote_changed = None
+        if should_skip and download_options.get('refresh') and metadata_store is not None:
+            record = metadata_store.get(url) or {}
+            local_path = record.get('path') or os.path.join(existing_path, filename)
+            if ((has_validators(record) or os.path.isfile(local_path))
+                    and check_remote_copy(url, local_path, metadata_store, logger=logger) is False):
+                if show_progress:
+                    print(f"File {filename} modificato sul server. Nuovo download.")
+                should_skip = False
+                remote_changed = True
+                # Il nuovo archivio sostituisce quello precedente nella stessa posizione
+                if record.get('path') and os.path.isdir(os.path.dirname(record['path'])):
+                    refresh_path = record['path']
+        
         if should_skip:
             if logger:
                 logger.info(f"File {filename} già esistente in {existing_path}. Saltato.")
@@ -537,7 +1264,6 @@ def download_with_auto_sorting(url, base_download_dir, logger=None, show_progres
                 print(f"Nessuna cartella specifica trovata per {filename}, uso {target_folder}")
         
         # Crea il percorso di destinazione
-        database_path = "/database/JSON"
         target_dir = os.path.join(database_path, target_folder)
         
         # Assicurati che la cartella di destinazione esista
@@ -550,7 +1276,13 @@ def download_with_auto_sorting(url, base_download_dir, logger=None, show_progres
             }
         
         # Percorso completo del file di destinazione
-        dest_path = os.path.join(target_dir, filename)
+        dest_path = refresh_path or os.path.join(target_dir, filename)
+        
+        # Gli archivi ZIP vengono estratti mentre arrivano, senza rileggerli dal disco
+        extract_dir = os.path.splitext(dest_path)[0]
+        if extract_zip and stream_extract and dest_path.lower().endswith('.zip'):
+            from .zipstream import StreamingZipExtractor
+            extractor = StreamingZipExtractor(extract_dir, logger=logger)
         
         # Scarica il file
         if show_progress:
@@ -561,15 +1293,26 @@ def download_with_auto_sorting(url, base_download_dir, logger=None, show_progres
             dest_path, 
             logger=logger, 
             show_progress=show_progress,
-            check_database=False  # Non controllare di nuovo il database
+            check_database=False,  # Non controllare di nuovo il database
+            on_chunk=extractor.feed if extractor else None,
+            remote_changed=remote_changed,
+            **download_options
         )
         
         if not file_hash or file_hash == "EXISTING_IN_DATABASE":
+            if extractor is not None:
+                # Il nuovo tentativo userà un altro estrattore: niente membri .part orfani
+                extractor.abort()
+            failure = last_download_failure() or {}
             return {
                 'success': False,
-                'error': 'Download fallito'
+                'error': failure.get('error', 'Download fallito'),
+                # Gli errori definitivi (es. 404) non vanno ritentati
+                'retryable': failure.get('retryable', True)
             }
         
+        catalog.add_file(dest_path, file_hash)
+        
         result = {
             'success': True,
             'filename': filename,
@@ -585,11 +1328,13 @@ def download_with_auto_sorting(url, base_download_dir, logger=None, show_progres
                 print(f"Estrazione di {filename}...")
             
             # Estrai nella stessa cartella
-            extract_dir = os.path.splitext(dest_path)[0]
             try:
+                from .zipstream import extract_downloaded_zip
                 os.makedirs(extract_dir, exist_ok=True)
-                extracted = extract_zip_files(dest_path, extract_dir, logger)
+                extracted = extract_downloaded_zip(dest_path, extract_dir, logger, extractor, **(extract_options or {}))
                 result['extracted_files'] = extracted
+                for extracted_path in extracted:
+                    catalog.add_file(extracted_path)
                 
                 if show_progress:
                     print(f"Estratti {len(extracted)} file da {filename}")
@@ -605,6 +1350,8 @@ def download_with_auto_sorting(url, base_download_dir, logger=None, show_progres
         return result
         
     except Exception as e:
+        if extractor is not None:
+            extractor.abort()
         if logger:
             logger.error(f"Errore durante il download con smistamento: {e}")
         return {
@@ -0,0 +1,235 @@
+import os
+import time
+import zipfile
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from .utils import format_size
+
+# Sotto questa dimensione complessiva (non compressa) l'estrazione resta sequenziale:
+# distribuire il lavoro sul pool costerebbe più della decompressione stessa
+PARALLEL_MIN_SIZE = 16 * 1048576
+
+
+def get_extract_options(config):
+    """
+    Legge dalla configurazione i parametri dell'estrazione.
+
+    Returns:
+        dict: kwargs da passare a extract_members / extract_zip_files
+    """
+    config = config or {}
+    return {
+        'workers': max(1, int(config.get('extract_workers', os.cpu_count() or 1))),
+        'use_processes': bool(config.get('extract_use_processes', True)),
+    }
+
+
+def filter_zip_members(zip_ref, member_filter=None):
+    """
+    Membri da estrarre (ZipInfo), escluse le cartelle.
+
+    Args:
+        zip_ref: Archivio aperto
+        member_filter: Predicato sul nome del membro, None per tutti
+    """
+    return [info for info in zip_ref.infolist()
+            if not info.is_dir() and (member_filter is None or member_filter(info.filename))]
+
+
+def member_target_path(extract_dir, name):
+    """Percorso in cui ZipFile.extract scrive il membro `name` (niente percorsi assoluti o '..')."""
+    arcname = name.replace('/', os.path.sep)
+    if os.path.altsep:
+        arcname = arcname.replace(os.path.altsep, os.path.sep)
+    arcname = os.path.splitdrive(arcname)[1]
+    invalid_parts = ('', os.path.curdir, os.path.pardir)
+    arcname = os.path.sep.join(part for part in arcname.split(os.path.sep) if part not in invalid_parts)
+    return os.path.normpath(os.path.join(extract_dir, arcname))
+
+
+def _extract_from(zip_ref, names, extract_dir):
+    """Estrae i membri indicati da un archivio aperto, misurando tempo e dimensione di ciascuno."""
+    stats = []
+    for name in names:
+        start = time.perf_counter()
+        stat = {'name': name, 'path': None, 'size': 0, 'elapsed': 0.0, 'error': None}
+        try:
+            info = zip_ref.getinfo(name)
+            stat['size'] = info.file_size
+            stat['path'] = zip_ref.extract(info, extract_dir)
+        except Exception as e:
+            stat['error'] = str(e)
+        stat['elapsed'] = time.perf_counter() - start
+        stats.append(stat)
+    return stats
+
+
+def _extract_batch(zip_path, names, extract_dir):
+    """Lavoro di un worker: apre un proprio handle sull'archivio ed estrae i membri del lotto."""
+    with zipfile.ZipFile(zip_path) as zip_ref:
+        return _extract_from(zip_ref, names, extract_dir)
+
+
+def _make_batches(infos, count):
+    """
+    Divide i membri in `count` lotti di dimensione simile (prima i più grandi, ciascuno
+    nel lotto più leggero): un solo handle aperto per lotto invece che per membro.
+    """
+    batches = [[0, []] for _ in range(count)]
+    for info in sorted(infos, key=lambda i: i.file_size, reverse=True):
+        lightest = min(batches, key=lambda b: b[0])
+        lightest[0] += info.file_size
+        lightest[1].append(info.filename)
+    return [names for _, names in batches if names]
+
+
+# Pool riutilizzati tra un archivio e l'altro: avviare i processi ha un costo fisso
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _process_context():
+    """
+    Contesto multiprocessing per il pool di estrazione.
+
+    L'estrazione parte dai thread di download: con fork il figlio erediterebbe una copia
+    dei lock tenuti in quel momento da altri thread (logging, sessioni, SQLite) e potrebbe
+    bloccarsi. forkserver (o spawn dove non è disponibile) avvia i worker da un processo pulito.
+    """
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+
+def _get_pool(workers, use_processes):
+    key = (os.getpid(), workers, use_processes)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            if use_processes:
+                pool = ProcessPoolExecutor(max_workers=workers, mp_context=_process_context())
+            else:
+                pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='extract')
+            _pools[key] = pool
+        return pool
+
+
+def _discard_pool(workers, use_processes):
+    with _pools_lock:
+        pool = _pools.pop((os.getpid(), workers, use_processes), None)
+    if pool is not None:
+        pool.shutdown(wait=False)
+
+
+def extract_members(zip_path, extract_dir, members=None, member_filter=None, workers=None,
+                    use_processes=True, logger=None, catalog=None):
+    """
+    Estrae i membri di un archivio ZIP decomprimendoli in parallelo.
+
+    I membri sono divisi in lotti bilanciati per dimensione; ogni worker (processo o
+    thread) apre un proprio handle sull'archivio. Archivi piccoli o con un solo membro
+    vengono estratti in sequenza nel processo corrente.
+
+    Args:
+        members: Nomi dei membri da estrarre (default: tutti quelli accettati da member_filter)
+        member_filter: Predicato sul nome del membro, usato se members è None
+        workers: Numero massimo di worker (default: numero di CPU)
+        use_processes: Se usare processi invece di thread
+        catalog: FileCatalog in cui registrare i membri estratti; i membri già estratti
+                 con lo stesso CRC32 e la stessa dimensione, e non modificati su disco,
+                 vengono saltati
+
+    Returns:
+        dict: {'extracted', 'skipped', 'members', 'errors', 'bytes', 'elapsed', 'workers'}
+              members contiene per ogni membro estratto nome, percorso, dimensione, tempo e MB/s;
+              skipped i nomi dei membri invariati
+    """
+    start = time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+    base_name = os.path.basename(zip_path)
+
+    with zipfile.ZipFile(zip_path) as zip_ref:
+        if members is None:
+            infos = filter_zip_members(zip_ref, member_filter)
+        else:
+            infos = [zip_ref.getinfo(name) for name in members]
+            # Le cartelle richieste esplicitamente si creano subito
+            for info in infos:
+                if info.is_dir():
+                    zip_ref.extract(info, extract_dir)
+            infos = [info for info in infos if not info.is_dir()]
+
+        # CRC e dimensione dalla directory centrale: i membri invariati non vengono riscritti
+        skipped = []
+        if catalog is not None:
+            changed = []
+            for info in infos:
+                if catalog.member_unchanged(member_target_path(extract_dir, info.filename), info.CRC, info.file_size):
+                    skipped.append(info.filename)
+                else:
+                    changed.append(info)
+            infos = changed
+            if skipped and logger:
+                logger.info(f"{len(skipped)} membri invariati non estratti da {base_name}")
+
+        total_size = sum(info.file_size for info in infos)
+        workers = max(1, min(workers, len(infos)))
+        if workers == 1 or total_size < PARALLEL_MIN_SIZE:
+            workers = 1
+            stats = _extract_from(zip_ref, [info.filename for info in infos], extract_dir)
+
+    if workers > 1:
+        stats = []
+        batches = _make_batches(infos, workers * 2)
+        try:
+            pool = _get_pool(workers, use_processes)
+            futures = [pool.submit(_extract_batch, zip_path, names, extract_dir) for names in batches]
+            for future in as_completed(futures):
+                stats.extend(future.result())
+        except BrokenProcessPool as e:
+            # Un worker è terminato in modo anomalo: si completa l'estrazione in sequenza
+            _discard_pool(workers, use_processes)
+            if logger:
+                logger.warning(f"Pool di estrazione non disponibile ({e}), estrazione sequenziale di {base_name}")
+            done = {stat['name'] for stat in stats}
+            stats.extend(_extract_batch(zip_path, [i.filename for i in infos if i.filename not in done], extract_dir))
+
+    if catalog is not None:
+        by_name = {info.filename: info for info in infos}
+        catalog.record_extracted_members(
+            (stat['path'], zip_path, stat['name'], by_name[stat['name']].CRC, stat['size'])
+            for stat in stats if not stat['error']
+        )
+
+    extracted = []
+    errors = []
+    for stat in stats:
+        stat['elapsed'] = round(stat['elapsed'], 4)
+        stat['mb_per_sec'] = round(stat['size'] / 1048576 / stat['elapsed'], 1) if stat['elapsed'] > 0 else None
+        if stat['error']:
+            errors.append(stat)
+            if logger:
+                logger.error(f"Errore durante l'estrazione di {stat['name']} da {base_name}: {stat['error']}")
+            continue
+        extracted.append(stat['path'])
+        if logger:
+            rate = f", {stat['mb_per_sec']} MB/s" if stat['mb_per_sec'] is not None else ""
+            logger.info(f"Estratto file {stat['name']} da {base_name} ({format_size(stat['size'])}{rate})")
+
+    elapsed = time.perf_counter() - start
+    extracted_bytes = sum(stat['size'] for stat in stats if not stat['error'])
+    if logger and stats:
+        logger.info(f"Estratti {len(extracted)} file da {base_name} in {elapsed:.2f}s con {workers} worker "
+                    f"({format_size(extracted_bytes / elapsed if elapsed > 0 else 0)}/s)")
+
+    return {
+        'extracted': extracted,
+        'skipped': skipped,
+        'members': sorted(stats, key=lambda s: s['name']),
+        'errors': errors,
+        'bytes': extracted_bytes,
+        'elapsed': round(elapsed, 3),
+        'workers': workers
+    }
@@ -0,0 +1,320 @@
+import time
+import threading
+from collections import deque
+from email.utils import parsedate_to_datetime
+
+from .scheduler import get_host
+
+# Risposte con cui il server chiede di rallentare
+THROTTLE_STATUS = (429, 503)
+
+# Attesa applicata a un 429/503 senza Retry-After (moltiplicata per i rallentamenti consecutivi)
+DEFAULT_THROTTLE_COOLDOWN = 2.0
+# Limite alle attese richieste dal server con Retry-After
+MAX_RETRY_AFTER = 300.0
+# Riduzione minima della velocità dopo rallentamenti ripetuti (1/16 di quella configurata)
+MIN_RATE_FACTOR = 1.0 / 16
+# Secondi senza 429/503 dopo i quali la velocità torna a crescere
+RECOVERY_INTERVAL = 10.0
+# Finestra usata per misurare le richieste al secondo effettive di un host senza limite
+OBSERVED_WINDOW = 10.0
+# Velocità minima da cui parte il rallentamento di un host senza limite configurato:
+# con poco traffico la velocità osservata non è indicativa di quella sostenibile
+MIN_ADAPTIVE_RATE = 2.0
+
+
+def parse_retry_after(value):
+    """
+    Secondi di attesa indicati da un header Retry-After (numero di secondi o data HTTP).
+
+    Returns:
+        float or None: None se l'header manca o non è interpretabile
+    """
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    if retry_at is None:
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class TokenBucket:
+    """
+    Token bucket: `rate` token al secondo, al massimo `capacity` accumulati.
+    Le prenotazioni possono mandare il saldo in negativo: chi prenota attende il tempo
+    necessario a ripianarlo, così anche blocchi più grandi della capacità passano.
+    Non è thread-safe: lo protegge il lock dell'host.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = max(float(capacity), 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def reserve(self, amount, now):
+        """Prenota `amount` token e restituisce i secondi da attendere."""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= amount
+        return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+
+class _HostState:
+    """Limiti, rallentamento adattivo e contatori di un singolo host."""
+
+    def __init__(self, requests_per_sec, bytes_per_sec, burst_seconds):
+        self.lock = threading.Lock()
+        self.requests_per_sec = requests_per_sec
+        self.bytes_per_sec = bytes_per_sec
+        self.burst_seconds = burst_seconds
+        self.factor = 1.0
+        self.request_bucket = self._bucket(requests_per_sec)
+        self.byte_bucket = self._bucket(bytes_per_sec)
+        self.blocked_until = 0.0
+        self.last_throttle = 0.0
+        self.consecutive_throttles = 0
+        # Limite di richieste introdotto da un rallentamento su un host senza limite configurato
+        self.adaptive_limit = False
+        self.recent_requests = deque()
+        self.stats = {'requests': 0, 'bytes': 0, 'throttled': 0, 'waited': 0.0}
+
+    def _bucket(self, rate):
+        if not rate:
+            return None
+        rate = rate * self.factor
+        return TokenBucket(rate, rate * self.burst_seconds)
+
+    def apply_factor(self, now):
+        """Aggiorna la velocità dei bucket dopo un cambio del fattore di rallentamento."""
+        for name, rate in (('request_bucket', self.requests_per_sec), ('byte_bucket', self.bytes_per_sec)):
+            bucket = getattr(self, name)
+            if not rate:
+                continue
+            if bucket is None:
+                setattr(self, name, self._bucket(rate))
+                continue
+            bucket.reserve(0, now)
+            bucket.rate = rate * self.factor
+            bucket.capacity = max(bucket.rate * self.burst_seconds, 1.0)
+
+    def recover(self, now):
+        """Fa risalire la velocità dopo un periodo senza rallentamenti."""
+        self.factor = min(1.0, self.factor * 1.25)
+        self.last_throttle = now
+        self.consecutive_throttles = 0
+        if self.factor >= 1.0 and self.adaptive_limit:
+            # Tornati a pieno regime il limite introdotto dal rallentamento si rimuove
+            self.requests_per_sec = None
+            self.request_bucket = None
+            self.adaptive_limit = False
+        else:
+            self.apply_factor(now)
+
+    def observed_rate(self, now):
+        while self.recent_requests and now - self.recent_requests[0] > OBSERVED_WINDOW:
+            self.recent_requests.popleft()
+        return len(self.recent_requests) / OBSERVED_WINDOW
+
+
+class RateGovernor:
+    """
+    Governa richieste al secondo e byte al secondo verso ciascun host con due token
+    bucket, condivisi da downloader e scraper.
+
+    Con `adaptive` attivo, un 429/503 blocca le richieste verso l'host per il tempo
+    indicato da Retry-After (o per un'attesa crescente se l'header manca) e dimezza la
+    velocità consentita; dopo RECOVERY_INTERVAL secondi senza rallentamenti la velocità
+    risale gradualmente. Per un host senza limite di richieste il punto di partenza è
+    la velocità osservata al momento del rallentamento.
+    """
+
+    def __init__(self, requests_per_sec=None, bytes_per_sec=None, burst_seconds=1.0, host_limits=None,
+                 adaptive=True, logger=None):
+        self.requests_per_sec = requests_per_sec or None
+        self.bytes_per_sec = bytes_per_sec or None
+        self.burst_seconds = max(float(burst_seconds or 1.0), 0.001)
+        self.host_limits = {host.lower(): limits for host, limits in (host_limits or {}).items()}
+        self.adaptive = adaptive
+        self.logger = logger
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def _state(self, url):
+        host = get_host(url)
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is None:
+                limits = self.host_limits.get(host, {})
+                state = _HostState(limits.get('requests_per_sec', self.requests_per_sec) or None,
+                                   limits.get('bytes_per_sec', self.bytes_per_sec) or None,
+                                   self.burst_seconds)
+                self._hosts[host] = state
+            return host, state
+
+    def _sleep(self, state, delay):
+        if delay > 0:
+            time.sleep(delay)
+            with state.lock:
+                state.stats['waited'] += delay
+        return delay
+
+    def acquire_request(self, url):
+        """
+        Attende il permesso di inviare una richiesta verso l'host di `url`.
+
+        Returns:
+            float: Secondi di attesa
+        """
+        _, state = self._state(url)
+        with state.lock:
+            now = time.monotonic()
+            delay = max(0.0, state.blocked_until - now)
+            if state.request_bucket is not None:
+                delay = max(delay, state.request_bucket.reserve(1, now))
+            state.recent_requests.append(now + delay)
+            state.observed_rate(now)
+            state.stats['requests'] += 1
+        return self._sleep(state, delay)
+
+    def consume_bytes(self, url, amount):
+        """
+        Registra `amount` byte ricevuti dall'host di `url` e attende quanto serve a
+        restare entro il limite di banda.
+
+        Returns:
+            float: Secondi di attesa
+        """
+        _, state = self._state(url)
+        with state.lock:
+            state.stats['bytes'] += amount
+            if state.byte_bucket is None:
+                return 0.0
+            delay = state.byte_bucket.reserve(amount, time.monotonic())
+        return self._sleep(state, delay)
+
+    def observe(self, url, status, headers=None):
+        """
+        Registra l'esito di una richiesta. Un 429/503 rallenta l'host, le altre risposte
+        fanno risalire gradualmente la velocità.
+
+        Returns:
+            float or None: Secondi di blocco dell'host se la risposta è un rallentamento
+        """
+        if not self.adaptive:
+            return None
+        host, state = self._state(url)
+        now = time.monotonic()
+        with state.lock:
+            if status not in THROTTLE_STATUS:
+                if state.factor < 1.0 and now - state.last_throttle >= RECOVERY_INTERVAL:
+                    state.recover(now)
+                return None
+
+            headers = headers or {}
+            retry_after = parse_retry_after(headers.get('Retry-After') or headers.get('retry-after'))
+            state.consecutive_throttles += 1
+            if retry_after is None:
+                retry_after = DEFAULT_THROTTLE_COOLDOWN * state.consecutive_throttles
+            retry_after = min(retry_after, MAX_RETRY_AFTER)
+            state.blocked_until = max(state.blocked_until, now + retry_after)
+            state.last_throttle = now
+            state.stats['throttled'] += 1
+
+            if state.requests_per_sec is None:
+                # Host senza limite configurato: si parte dalla velocità che ha provocato il 429
+                state.requests_per_sec = max(state.observed_rate(now), MIN_ADAPTIVE_RATE)
+                state.factor = 1.0
+                state.adaptive_limit = True
+            state.factor = max(MIN_RATE_FACTOR, state.factor / 2)
+            state.apply_factor(now)
+            factor = state.factor
+            rate = state.requests_per_sec * factor
+
+        if self.logger:
+            self.logger.warning(f"{host} ha risposto {status}: richieste sospese per {retry_after:.1f}s, "
+                                f"velocità ridotta a {rate:.2f} richieste/s")
+        return retry_after
+
+    def remaining_block(self, url):
+        """Secondi che mancano alla fine del blocco imposto all'host da un 429/503."""
+        _, state = self._state(url)
+        with state.lock:
+            return max(0.0, state.blocked_until - time.monotonic())
+
+    def get_stats(self):
+        """
+        Returns:
+            dict: Per host {'requests', 'bytes', 'throttled', 'waited', 'rate_factor'}
+        """
+        with self._lock:
+            hosts = list(self._hosts.items())
+        stats = {}
+        for host, state in hosts:
+            with state.lock:
+                stats[host] = dict(state.stats, waited=round(state.stats['waited'], 3),
+                                   rate_factor=round(state.factor, 4))
+        return stats
+
+
+def get_governor_options(config):
+    """
+    Legge dalla configurazione i limiti del governor.
+
+    Returns:
+        dict: kwargs da passare a RateGovernor
+    """
+    config = config or {}
+    return {
+        'requests_per_sec': float(config.get('rate_limit_requests_per_sec', 0)) or None,
+        'bytes_per_sec': float(config.get('rate_limit_bytes_per_sec', 0)) or None,
+        'burst_seconds': float(config.get('rate_limit_burst_seconds', 1.0)),
+        'host_limits': config.get('rate_limit_hosts') or {},
+        'adaptive': bool(config.get('rate_limit_adaptive', True)),
+    }
+
+
+_governor = None
+_governor_lock = threading.Lock()
+
+
+def get_rate_governor(config=None):
+    """
+    Restituisce il governor condiviso, creandolo alla prima chiamata.
+    La configurazione viene usata solo alla creazione; per cambiarla usare configure_rate_governor.
+    """
+    global _governor
+    with _governor_lock:
+        if _governor is None:
+            _governor = RateGovernor(**get_governor_options(config))
+        return _governor
+
+
+def configure_rate_governor(config, logger=None):
+    """Ricrea il governor condiviso con una nuova configurazione."""
+    global _governor
+    with _governor_lock:
+        _governor = RateGovernor(logger=logger, **get_governor_options(config))
+        return _governor
+
+
+def log_governor_stats(logger=None, governor=None):
+    """Stampa (e registra nel log) attese e rallentamenti per host, se ce ne sono stati."""
+    stats = (governor or get_rate_governor()).get_stats()
+    for host, host_stats in sorted(stats.items()):
+        if not host_stats['throttled'] and not host_stats['waited']:
+            continue
+        message = (f"Limiti {host}: {host_stats['requests']} richieste, {host_stats['throttled']} risposte 429/503, "
+                   f"{host_stats['waited']:.1f}s di attesa, velocità al {host_stats['rate_factor'] * 100:.0f}%")
+        print(message)
+        if logger:
+            logger.info(message)
+    return stats
@@ -0,0 +1,105 @@
+import os
+import sqlite3
+import threading
+import hashlib
+from datetime import datetime
+
+from .utils import ensure_dir
+
+DEFAULT_HASH_CACHE_FILE = "cache/hash_cache.db"
+
+
+class HashCache:
+    """
+    Cache persistente degli SHA256 dei file, indicizzata per (device, inode).
+
+    Un hash è valido solo finché dimensione e mtime_ns del file coincidono con quelli
+    registrati: qualsiasi modifica del file lo invalida automaticamente e l'hash
+    viene ricalcolato alla prima richiesta.
+    """
+
+    def __init__(self, db_file=DEFAULT_HASH_CACHE_FILE):
+        self.db_file = db_file
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(db_file)
+        if directory:
+            ensure_dir(directory)
+        self._conn = sqlite3.connect(db_file, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            # WAL: letture e scritture concorrenti da più thread e processi
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS hashes ("
+                " dev INTEGER NOT NULL, ino INTEGER NOT NULL,"
+                " size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL,"
+                " sha256 TEXT NOT NULL, path TEXT, hashed_at TEXT,"
+                " PRIMARY KEY (dev, ino))"
+            )
+
+    def get(self, file_path, stat=None):
+        """Hash registrato per il file, o None se assente o non più valido."""
+        stat = stat or os.stat(file_path)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT sha256 FROM hashes WHERE dev = ? AND ino = ? AND size = ? AND mtime_ns = ?",
+                (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+            ).fetchone()
+        return row[0] if row else None
+
+    def store(self, file_path, sha256, stat=None):
+        """Registra l'hash del file nello stato attuale (dimensione e mtime)."""
+        stat = stat or os.stat(file_path)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO hashes (dev, ino, size, mtime_ns, sha256, path, hashed_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns, sha256,
+                 os.path.abspath(file_path), datetime.now().isoformat(timespec='seconds'))
+            )
+
+    def file_hash(self, file_path, chunk_size=1048576):
+        """
+        SHA256 del file: dalla cache se il file non è cambiato, altrimenti calcolato
+        leggendo il file a blocchi e registrato.
+
+        Returns:
+            tuple: (sha256, from_cache: bool)
+        """
+        stat = os.stat(file_path)
+        cached = self.get(file_path, stat)
+        if cached:
+            return cached, True
+
+        h = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                h.update(chunk)
+        sha256 = h.hexdigest()
+
+        # Se il file è cambiato durante la lettura l'hash non va registrato
+        if os.stat(file_path).st_mtime_ns == stat.st_mtime_ns:
+            self.store(file_path, sha256, stat)
+        return sha256, False
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM hashes").fetchone()[0]
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_hash_cache(db_file=DEFAULT_HASH_CACHE_FILE):
+    """
+    Cache condivisa dal processo corrente. I processi figli (pool di verifica)
+    aprono una propria connessione al database.
+    """
+    key = (os.getpid(), os.path.abspath(db_file))
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = HashCache(db_file)
+            _caches[key] = cache
+        return cache
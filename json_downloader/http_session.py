@@ -0,0 +1,139 @@
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+from .governor import get_rate_governor, configure_rate_governor, log_governor_stats
+
+# Headers condivisi da tutte le richieste (download, HEAD, stime dimensione, scraper)
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/96.0.4664.110 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'it-IT,it;q=0.9,en-US;q=0.8,en;q=0.7'
+}
+
+class GovernedSession(requests.Session):
+    """
+    Sessione che fa passare ogni richiesta dal governor condiviso: attende il permesso
+    dell'host prima di inviarla e gli segnala le risposte 429/503.
+    """
+
+    def request(self, method, url, *args, **kwargs):
+        governor = get_rate_governor()
+        governor.acquire_request(url)
+        response = super().request(method, url, *args, **kwargs)
+        governor.observe(url, response.status_code, response.headers)
+        return response
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_pool_size(config=None):
+    """
+    Connessioni per host del pool: almeno http_pool_size e comunque sufficienti per i
+    download simultanei verso un host moltiplicati per i segmenti di ciascuno, perché
+    con il pool pieno urllib3 scarterebbe le connessioni invece di riutilizzarle.
+    """
+    config = config or {}
+    max_workers = max(1, int(config.get('max_concurrent_downloads', 4)))
+    per_host = min(max_workers, max(1, int(config.get('max_downloads_per_host', max_workers))))
+    segments = max(1, int(config.get('download_segments', 1)))
+    return max(1, int(config.get('http_pool_size', 10)), per_host * segments)
+
+
+def create_session(config=None):
+    """
+    Crea una sessione HTTP con connection pool e keep-alive.
+
+    Opzioni lette da config:
+        http_pool_size: Numero minimo di connessioni mantenute aperte per host (default 10,
+                        aumentato per i download a segmenti, vedi get_pool_size)
+        http_headers: Headers aggiuntivi o sostitutivi rispetto a DEFAULT_HEADERS
+
+    Le richieste rispettano i limiti del governor condiviso (vedi governor.py).
+    """
+    config = config or {}
+    pool_size = get_pool_size(config)
+
+    session = GovernedSession()
+    headers = dict(DEFAULT_HEADERS)
+    headers.update(config.get('http_headers') or {})
+    session.headers.update(headers)
+
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def get_session(config=None):
+    """
+    Restituisce la sessione HTTP condivisa, creandola alla prima chiamata.
+    La configurazione viene usata solo alla creazione; per cambiarla usare configure_session.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            get_rate_governor(config)
+            _session = create_session(config)
+        return _session
+
+
+def configure_session(config, logger=None):
+    """Ricrea la sessione condivisa (e il governor dei limiti per host) con una nuova configurazione."""
+    global _session
+    configure_rate_governor(config, logger=logger)
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = create_session(config)
+        return _session
+
+
+def get_user_agent(config=None):
+    """User-Agent condiviso, da usare anche per i contesti del browser."""
+    return get_session(config).headers.get('User-Agent', DEFAULT_HEADERS['User-Agent'])
+
+
+def get_connection_stats(session=None):
+    """
+    Statistiche sulle connessioni del pool: quante aperte e quante riutilizzate.
+
+    Returns:
+        dict: {'requests': int, 'connections_opened': int, 'connections_reused': int}
+    """
+    session = session or get_session()
+    total_requests = 0
+    total_connections = 0
+
+    for adapter in set(session.adapters.values()):
+        poolmanager = getattr(adapter, 'poolmanager', None)
+        if poolmanager is None:
+            continue
+        pools = poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            total_requests += getattr(pool, 'num_requests', 0)
+            total_connections += getattr(pool, 'num_connections', 0)
+
+    return {
+        'requests': total_requests,
+        'connections_opened': total_connections,
+        'connections_reused': max(0, total_requests - total_connections)
+    }
+
+
+def log_connection_stats(logger=None, session=None):
+    """Stampa (e registra nel log) le statistiche di riuso delle connessioni e dei limiti per host."""
+    stats = get_connection_stats(session)
+    message = (f"Connessioni HTTP: {stats['requests']} richieste, "
+               f"{stats['connections_opened']} connessioni aperte, "
+               f"{stats['connections_reused']} riutilizzate")
+    print(message)
+    if logger:
+        logger.info(message)
+    log_governor_stats(logger)
+    return stats
@@ -0,0 +1,223 @@
+import os
+import json
+import sqlite3
+import threading
+from datetime import datetime
+
+from .utils import ensure_dir
+
+DEFAULT_JOB_QUEUE_FILE = "cache/job_queue.db"
+
+# Stati di un link all'interno di un'esecuzione
+PENDING = 'pending'
+IN_FLIGHT = 'in_flight'
+DONE = 'done'
+FAILED = 'failed'
+JOB_STATES = (PENDING, IN_FLIGHT, DONE, FAILED)
+
+
+def _now():
+    return datetime.now().isoformat(timespec='seconds')
+
+
+class JobQueue:
+    """
+    Coda persistente dei download di un'esecuzione (SQLite in cache/).
+
+    Ogni esecuzione registra la lista dei link con le opzioni scelte; ogni link passa
+    per pending -> in_flight -> done / failed (con motivo e byte scaricati) e ogni
+    cambio di stato è scritto subito su disco. Se il processo muore, l'esecuzione
+    resta "running" e può essere ripresa: i link completati non vengono più toccati,
+    quelli rimasti in_flight tornano pending (il loro .part riprende dai byte già scaricati).
+    """
+
+    def __init__(self, db_file=DEFAULT_JOB_QUEUE_FILE):
+        self.db_file = db_file
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(db_file)
+        if directory:
+            ensure_dir(directory)
+        self._conn = sqlite3.connect(db_file, check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS runs ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " kind TEXT NOT NULL, status TEXT NOT NULL, options TEXT,"
+                " total INTEGER NOT NULL, started_at TEXT, updated_at TEXT, finished_at TEXT)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " run_id INTEGER NOT NULL, position INTEGER NOT NULL, link TEXT NOT NULL,"
+                " state TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0,"
+                " outcome TEXT, bytes INTEGER, dest_path TEXT, sha256 TEXT, error TEXT, updated_at TEXT,"
+                " PRIMARY KEY (run_id, link))"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (run_id, state)")
+
+    def start_run(self, links, kind='download', options=None):
+        """
+        Registra una nuova esecuzione con tutti i link in stato pending.
+
+        Args:
+            kind: Tipo di esecuzione, per distinguere i flussi che usano la coda
+            options: Opzioni (serializzabili in JSON) necessarie a riprenderla
+
+        Returns:
+            int: id dell'esecuzione
+        """
+        links = list(dict.fromkeys(links))
+        now = _now()
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO runs (kind, status, options, total, started_at, updated_at) VALUES (?, 'running', ?, ?, ?, ?)",
+                (kind, json.dumps(options or {}), len(links), now, now)
+            )
+            run_id = cursor.lastrowid
+            self._conn.executemany(
+                "INSERT INTO jobs (run_id, position, link, state, updated_at) VALUES (?, ?, ?, ?, ?)",
+                ((run_id, position, link, PENDING, now) for position, link in enumerate(links))
+            )
+        return run_id
+
+    def unfinished_run(self, kind='download'):
+        """
+        Ultima esecuzione interrotta prima della fine.
+
+        Returns:
+            dict or None: {'id', 'kind', 'options', 'total', 'started_at', 'updated_at', 'counts'}
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM runs WHERE kind = ? AND status = 'running' ORDER BY id DESC LIMIT 1", (kind,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            'id': row['id'],
+            'kind': row['kind'],
+            'options': json.loads(row['options'] or '{}'),
+            'total': row['total'],
+            'started_at': row['started_at'],
+            'updated_at': row['updated_at'],
+            'counts': self.counts(row['id'])
+        }
+
+    def resume_run(self, run_id, retry_failed=False):
+        """
+        Prepara la ripresa di un'esecuzione: i link rimasti in_flight (ed eventualmente
+        quelli falliti) tornano pending.
+
+        Returns:
+            list: Link ancora da elaborare, nell'ordine originale
+        """
+        states = (IN_FLIGHT, FAILED) if retry_failed else (IN_FLIGHT,)
+        placeholders = ', '.join('?' for _ in states)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"UPDATE jobs SET state = ?, updated_at = ? WHERE run_id = ? AND state IN ({placeholders})",
+                (PENDING, _now(), run_id) + states
+            )
+        return self.links(run_id, PENDING)
+
+    def links(self, run_id, state=None):
+        """Link dell'esecuzione (in un certo stato), nell'ordine originale."""
+        query = "SELECT link FROM jobs WHERE run_id = ?"
+        params = (run_id,)
+        if state is not None:
+            query += " AND state = ?"
+            params += (state,)
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY position", params).fetchall()
+        return [row['link'] for row in rows]
+
+    def _update(self, run_id, link, state, **fields):
+        now = _now()
+        columns = ', '.join(f"{name} = ?" for name in fields)
+        assignments = f"state = ?, updated_at = ?{', ' + columns if columns else ''}"
+        with self._lock, self._conn:
+            self._conn.execute(f"UPDATE jobs SET {assignments} WHERE run_id = ? AND link = ?",
+                               (state, now) + tuple(fields.values()) + (run_id, link))
+            self._conn.execute("UPDATE runs SET updated_at = ? WHERE id = ?", (now, run_id))
+
+    def mark_in_flight(self, run_id, link):
+        """Il download del link sta per iniziare (conta un tentativo)."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET state = ?, attempts = attempts + 1, updated_at = ? WHERE run_id = ? AND link = ?",
+                (IN_FLIGHT, _now(), run_id, link)
+            )
+
+    def mark_done(self, run_id, link, outcome='downloaded', dest_path=None, size=None, sha256=None):
+        """
+        Link completato.
+
+        Args:
+            outcome: 'downloaded', 'skipped' (già presente) o 'not_modified' (refresh)
+        """
+        self._update(run_id, link, DONE, outcome=outcome, dest_path=dest_path, bytes=size, sha256=sha256, error=None)
+
+    def mark_retry(self, run_id, link, error):
+        """Tentativo fallito, il link tornerà in coda."""
+        self._update(run_id, link, PENDING, error=error)
+
+    def mark_failed(self, run_id, link, error):
+        """Link abbandonato dopo l'ultimo tentativo o per un errore definitivo."""
+        self._update(run_id, link, FAILED, error=error)
+
+    def finish_run(self, run_id):
+        now = _now()
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE runs SET status = 'finished', finished_at = ?, updated_at = ? WHERE id = ?",
+                               (now, now, run_id))
+
+    def abandon_run(self, run_id):
+        """Segna come chiusa un'esecuzione interrotta che non si vuole riprendere."""
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE runs SET status = 'abandoned', updated_at = ? WHERE id = ?", (_now(), run_id))
+
+    def counts(self, run_id):
+        """
+        Returns:
+            dict: Numero di link per stato, più 'bytes' scaricati
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT state, COUNT(*), COALESCE(SUM(bytes), 0) FROM jobs WHERE run_id = ? GROUP BY state", (run_id,)
+            ).fetchall()
+        counts = {state: 0 for state in JOB_STATES}
+        counts['bytes'] = 0
+        for state, count, size in rows:
+            counts[state] = count
+            counts['bytes'] += size
+        return counts
+
+    def failures(self, run_id):
+        """Link falliti con il relativo motivo."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT link, error, attempts FROM jobs WHERE run_id = ? AND state = ? ORDER BY position",
+                (run_id, FAILED)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_queues = {}
+_queues_lock = threading.Lock()
+
+
+def get_job_queue(db_file=DEFAULT_JOB_QUEUE_FILE):
+    """Coda condivisa dal processo corrente."""
+    key = (os.getpid(), os.path.abspath(db_file))
+    with _queues_lock:
+        queue = _queues.get(key)
+        if queue is None:
+            queue = JobQueue(db_file)
+            _queues[key] = queue
+        return queue
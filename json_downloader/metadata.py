@@ -0,0 +1,187 @@
+import os
+import json
+import threading
+from datetime import datetime
+
+from .utils import ensure_dir
+
+DEFAULT_METADATA_FILE = "cache/download_metadata.json"
+
+
+class MetadataStore:
+    """
+    Archivio dei metadati dei download, uno per URL:
+    ETag, Last-Modified, content-length, sha256, percorso e orario dell'ultimo download.
+
+    I metadati permettono di chiedere al server se un archivio è cambiato
+    (If-None-Match / If-Modified-Since) senza riscaricarlo.
+    Il file viene riscritto in modo atomico ad ogni aggiornamento ed è condiviso tra i thread.
+    """
+
+    def __init__(self, path=DEFAULT_METADATA_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._records = self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except Exception as e:
+            print(f"Errore nella lettura dei metadati {self.path}: {e}")
+            return {}
+
+    def _save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            ensure_dir(directory)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._records, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def get(self, url):
+        """Restituisce una copia dei metadati dell'URL, o None se mai scaricato."""
+        with self._lock:
+            record = self._records.get(url)
+            return dict(record) if record else None
+
+    def record_download(self, url, dest_path, sha256, headers=None, content_length=None, status='downloaded'):
+        """
+        Registra un download completato con gli header di validazione ricevuti dal server.
+        Con status='existing' registra una copia locale già presente prima dei metadati,
+        così le esecuzioni successive possono fare una richiesta condizionale.
+        """
+        headers = headers or {}
+        now = datetime.now().isoformat(timespec='seconds')
+        record = {
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'content_length': content_length,
+            'sha256': sha256,
+            'path': dest_path,
+            'fetched_at': now,
+            'checked_at': now,
+            'status': status
+        }
+        with self._lock:
+            self._records[url] = record
+            self._save()
+
+    def mark_not_modified(self, url):
+        """Registra che il server ha confermato che l'archivio non è cambiato."""
+        with self._lock:
+            record = self._records.get(url)
+            if record is None:
+                return
+            record['checked_at'] = datetime.now().isoformat(timespec='seconds')
+            record['status'] = 'not_modified'
+            self._save()
+
+    def mark_unverified(self, url):
+        """Registra che la verifica sul server non è stata possibile (es. HEAD fallita)."""
+        with self._lock:
+            record = self._records.get(url)
+            if record is None:
+                return
+            record['status'] = 'unverified'
+            self._save()
+
+    def was_not_modified(self, url):
+        """True se l'ultima verifica dell'URL si è conclusa senza trasferire dati."""
+        record = self.get(url)
+        return bool(record) and record.get('status') == 'not_modified'
+
+    def __len__(self):
+        with self._lock:
+            return len(self._records)
+
+
+def get_conditional_headers(record):
+    """Headers If-None-Match / If-Modified-Since costruiti dai metadati salvati."""
+    headers = {}
+    if not record:
+        return headers
+    if record.get('etag'):
+        headers['If-None-Match'] = record['etag']
+    if record.get('last_modified'):
+        headers['If-Modified-Since'] = record['last_modified']
+    return headers
+
+
+def has_validators(record):
+    """True se il record permette una richiesta condizionale (validatori e sha256 della copia locale)."""
+    return bool(get_conditional_headers(record)) and bool(record.get('sha256'))
+
+
+def fetch_validators(url, session, timeout=10, logger=None):
+    """
+    HEAD incondizionata per leggere ETag, Last-Modified e content-length dell'archivio remoto.
+
+    Returns:
+        headers della risposta, o None in caso di errore
+    """
+    try:
+        response = session.head(url, timeout=timeout, allow_redirects=True)
+    except Exception as e:
+        print(f"DEBUG_DOWN: Errore nella lettura dei validatori di {url}: {e}")
+        if logger:
+            logger.debug(f"Lettura dei validatori fallita per {url}: {e}")
+        return None
+    return response.headers if response.ok else None
+
+
+def is_remote_unchanged(url, record, session, timeout=10, logger=None):
+    """
+    Verifica con una richiesta HEAD condizionale se l'archivio remoto è cambiato.
+
+    Returns:
+        bool or None: True se invariato, False se cambiato, None se non determinabile
+                      (nessun metadato utile o errore di rete)
+    """
+    if not has_validators(record):
+        return None
+    headers = get_conditional_headers(record)
+
+    try:
+        response = session.head(url, headers=headers, timeout=timeout, allow_redirects=True)
+    except Exception as e:
+        print(f"DEBUG_DOWN: Errore nella verifica condizionale di {url}: {e}")
+        if logger:
+            logger.debug(f"Verifica condizionale fallita per {url}: {e}")
+        return None
+
+    if response.status_code == 304:
+        return True
+    if not response.ok:
+        return None
+
+    # Server che ignorano gli header condizionali: confronto diretto dei validatori
+    etag = response.headers.get('ETag')
+    if etag and record.get('etag'):
+        return etag == record['etag']
+    last_modified = response.headers.get('Last-Modified')
+    if last_modified and record.get('last_modified'):
+        content_length = response.headers.get('content-length')
+        same_length = (content_length is None or record.get('content_length') is None
+                       or int(content_length) == record['content_length'])
+        return last_modified == record['last_modified'] and same_length
+    return None
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_metadata_store(path=DEFAULT_METADATA_FILE):
+    """Restituisce l'archivio dei metadati condiviso per il file indicato."""
+    key = os.path.abspath(path)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = MetadataStore(path)
+            _stores[key] = store
+        return store
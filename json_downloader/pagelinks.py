@@ -0,0 +1,207 @@
+import re
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlparse
+
+from .utils import get_url_classifier
+
+# Testi dei link che suggeriscono un download
+DOWNLOAD_TEXTS = ('vai alla risorsa', 'download', 'scarica', 'json', 'zip', 'apri', 'dati', 'open data',
+                  'dataset', 'risorsa', 'file', 'export', 'esporta')
+
+# Contenitori di risorse dei portali CKAN: i link al loro interno sono candidati
+RESOURCE_CONTAINER_CLASSES = frozenset(('resources', 'resource-item', 'dataset-resources', 'resource-actions'))
+RESOURCE_CONTAINER_MODULES = frozenset(('resource-view',))
+
+# Percorsi che indicano una risorsa scaricabile anche senza estensione .json/.zip
+RESOURCE_PATH_HINTS = ('/download/', '/filesystem/', '/resource/', 'format=json', 'api/action/datastore_search')
+
+NEXT_PAGE_TEXT = re.compile(r'succes|next|avanti|prossim', re.I)
+PAGE_PARAM = re.compile(r'[?&]page=(\d+)(?=&|$)')
+
+# Elementi senza tag di chiusura: non entrano nella pila degli elementi aperti
+VOID_ELEMENTS = frozenset(('area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta',
+                           'param', 'source', 'track', 'wbr'))
+
+
+def absolute_url(href, base_url):
+    """URL assoluto di un href relativo alla pagina (o al dominio, se inizia con '/')."""
+    if href.startswith(('http://', 'https://')):
+        return href
+    if href.startswith('/'):
+        parsed = urlparse(base_url)
+        return urljoin(f"{parsed.scheme}://{parsed.netloc}", href)
+    return urljoin(base_url, href)
+
+
+class PageLinks:
+    """
+    Link di una pagina del portale letti in un solo passaggio:
+
+        dataset_links   link alle pagine dei dataset, nell'ordine della pagina
+        resource_links  {url: {'text', 'filename', 'context'}} dei file JSON/ZIP (o risorse probabili)
+        total_links     numero di <a href> nella pagina
+        candidates      link analizzati come possibili risorse
+        has_body        False se l'HTML non ha <body> (pagina caricata male)
+    """
+
+    def __init__(self):
+        self.dataset_links = []
+        self.resource_links = {}
+        self.total_links = 0
+        self.candidates = 0
+        self.has_body = False
+        self.next_link = None
+        self.page_numbers = set()
+
+    def has_next_page(self, current_page):
+        """True se c'è un link rel="next", un testo "Successivo"/"Avanti" o un link a ?page=current_page+1."""
+        return self.next_page_link(current_page) is not None
+
+    def next_page_link(self, current_page):
+        if self.next_link is not None:
+            return self.next_link
+        if current_page > 0 and str(current_page + 1) in self.page_numbers:
+            return f"?page={current_page + 1}"
+        return None
+
+
+class _LinkParser(HTMLParser):
+    """Un solo attraversamento dell'HTML: ogni <a> viene classificato alla chiusura, con il suo testo."""
+
+    def __init__(self, base_url, include_formats, exclude_formats):
+        super().__init__(convert_charrefs=True)
+        self.base_url = base_url
+        self.include_formats = list(include_formats)
+        self.classifier = get_url_classifier(exclude_formats)
+        self.result = PageLinks()
+        # Pila degli elementi aperti: (tag, è un contenitore di risorse)
+        self._stack = []
+        self._containers = 0
+        # Link aperti (i link annidati ricevono anche il testo dei figli): [tag, attrs, testo, nel contenitore]
+        self._open_links = []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'body':
+            self.result.has_body = True
+        elif tag in ('a', 'button'):
+            self._open_links.append([tag, attrs, [], self._containers > 0])
+            # I link ai dataset non dipendono dal testo: ordine dei tag di apertura, anche per i link annidati
+            href = attrs.get('href')
+            if tag == 'a' and href and '/dataset/' in href and not href.endswith(('.json', '.csv', '.xml')):
+                self.result.dataset_links.append(absolute_url(href, self.base_url))
+        if tag in VOID_ELEMENTS:
+            return
+        classes = (attrs.get('class') or '').split()
+        container = (any(cls in RESOURCE_CONTAINER_CLASSES for cls in classes)
+                     or attrs.get('data-module') in RESOURCE_CONTAINER_MODULES)
+        self._stack.append((tag, container))
+        if container:
+            self._containers += 1
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_ELEMENTS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag in ('a', 'button'):
+            for index in range(len(self._open_links) - 1, -1, -1):
+                if self._open_links[index][0] == tag:
+                    self._classify(*self._open_links.pop(index))
+                    break
+        # Come html.parser di BeautifulSoup: chiude fino all'ultimo elemento con lo stesso tag
+        for index in range(len(self._stack) - 1, -1, -1):
+            if self._stack[index][0] == tag:
+                for _, container in self._stack[index:]:
+                    if container:
+                        self._containers -= 1
+                del self._stack[index:]
+                break
+
+    def handle_data(self, data):
+        for link in self._open_links:
+            link[2].append(data)
+
+    def close(self):
+        super().close()
+        while self._open_links:
+            self._classify(*self._open_links.pop())
+        return self.result
+
+    def _classify(self, tag, attrs, text_parts, in_container):
+        if 'href' not in attrs:
+            return
+        href = attrs['href'] or ''
+        href_lower = href.lower()
+        classes = attrs.get('class') or ''
+        text = ''.join(text_parts)
+        result = self.result
+
+        if tag == 'button':
+            candidate = 'download' in classes or 'resource' in classes
+        else:
+            result.total_links += 1
+            if result.next_link is None and ('next' in (attrs.get('rel') or '').split() or NEXT_PAGE_TEXT.search(text)):
+                result.next_link = href
+            if 'page=' in href:
+                result.page_numbers.update(PAGE_PARAM.findall(href))
+
+            data_format = attrs.get('data-format')
+            text_lower = text.lower()
+            candidate = (
+                in_container
+                or 'resource-url' in classes or 'download' in classes
+                or bool(data_format and data_format.lower() in self.include_formats)
+                or 'data-resource-id' in attrs
+                or 'download' in href_lower or 'resource' in href_lower or 'dataset' in href_lower
+                or any(download_text in text_lower for download_text in DOWNLOAD_TEXTS)
+            )
+        if not candidate or not href:
+            return
+        result.candidates += 1
+        self._add_resource(href, href_lower, text.lower().strip(), attrs.get('data-format'))
+
+    def _add_resource(self, href, href_lower, element_text, data_format):
+        classifier = self.classifier
+        verdict = classifier.classify(href)
+        # Ignora link a file di formati da escludere
+        if verdict == classifier.EXCLUDED:
+            return
+        explicit_format = any(fmt in href_lower for fmt in self.include_formats)
+        is_valid_link = (
+            explicit_format
+            or any(hint in href_lower for hint in RESOURCE_PATH_HINTS)
+            or verdict in (classifier.JSON, classifier.JSON_ZIP)
+            # URL ambigui: decide il testo o l'attributo data-format (comune in CKAN)
+            or 'json' in element_text or 'zip' in element_text or 'download' in element_text
+            or bool(data_format and data_format.lower() in self.include_formats)
+        )
+        if not is_valid_link:
+            return
+        full_url = absolute_url(href, self.base_url)
+        if full_url not in self.result.resource_links:
+            self.result.resource_links[full_url] = {
+                'text': element_text if element_text else 'N/A',
+                'filename': href.split('/')[-1] if '/' in href else href,
+                'context': 'formato esplicito' if explicit_format else 'potenziale risorsa'
+            }
+
+
+def parse_page_links(page_content, base_url, config=None):
+    """
+    Analizza una pagina del portale (elenco o dettaglio di un dataset) con un solo
+    passaggio del parser HTML della libreria standard, senza costruire l'albero del
+    documento: link ai dataset, link alle risorse JSON/ZIP e paginazione insieme.
+
+    Returns:
+        PageLinks
+    """
+    config = config or {}
+    parser = _LinkParser(
+        base_url,
+        config.get('include_formats', ['json', 'zip']),
+        config.get('exclude_formats', ['ttl', 'csv', 'xml'])
+    )
+    parser.feed(page_content or '')
+    return parser.close()
@@ -0,0 +1,271 @@
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from .utils import is_json_download_link, load_links_from_cache, save_links_to_cache
+from .scheduler import LinkFeed, run_download_jobs, get_download_concurrency, FEED_POLL_INTERVAL
+from .retry import get_retry_policy, RetryStats, log_retry_summary
+from .catalog import DEFAULT_DATABASE_PATH, get_file_catalog
+
+LINKS_CACHE_FILE = "cache/json_links.txt"
+
+# Sorgenti dei link per la pipeline
+SOURCES = ('scrape', 'cache', 'file')
+
+# Codici di uscita della modalità batch
+EXIT_OK = 0            # Tutti i link scaricati (o già presenti) ed estratti
+EXIT_PARTIAL = 1       # Completata con errori su alcuni link, archivi o sulla ricerca dei link
+EXIT_FAILED = 2        # Nessun lavoro svolto: database non disponibile, nessun link, errore fatale
+EXIT_INTERRUPTED = 130  # Interrotta (Ctrl+C / SIGTERM)
+
+
+def _read_links_file(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+
+def run_pipeline(config, source='scrape', links_file=None, extract_zip=True, json_only=True, max_files=0,
+                 database_path=DEFAULT_DATABASE_PATH, logger=None, stop_event=None):
+    """
+    Esegue ricerca dei link, download con smistamento in /database/JSON ed estrazione
+    degli ZIP senza interazione, con le tre fasi sovrapposte: i link trovati dallo
+    scraping entrano subito nella coda dei download e ogni archivio scaricato passa
+    all'estrazione mentre gli altri download proseguono.
+
+    Args:
+        config: Configurazione (config.json)
+        source: 'scrape' (scraping del portale), 'cache' (link in cache/json_links.txt)
+                o 'file' (un link per riga in links_file)
+        extract_zip: Se estrarre i JSON dagli archivi scaricati
+        json_only: Se scaricare solo file JSON e ZIP contenenti JSON (is_json_download_link)
+        max_files: Numero massimo di link da scaricare (0 = tutti)
+        database_path: Cartella in cui i file vengono smistati
+        stop_event: threading.Event opzionale per fermare l'avvio di nuovi download
+
+    Returns:
+        dict: Riepilogo dell'esecuzione (serializzabile in JSON) con 'status' ed 'exit_code'
+    """
+    from .downloader import download_with_auto_sorting, get_download_options
+    from .zipstream import stream_extraction_enabled, extract_downloaded_zip
+    from .extraction import get_extract_options
+    from .http_session import get_connection_stats, log_connection_stats
+
+    started = time.time()
+    summary = {
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'options': {
+            'source': source,
+            'links_file': links_file,
+            'extract_zip': extract_zip,
+            'json_only': json_only,
+            'max_files': max_files,
+            'database_path': database_path,
+            'refresh_mode': bool(config.get('refresh_mode', False))
+        },
+        'discovery': {'links': 0, 'filtered_out': 0, 'seconds': 0.0, 'error': None},
+        'downloads': {'downloaded': 0, 'skipped': 0, 'failed': 0, 'not_started': 0, 'bytes': 0, 'seconds': 0.0,
+                      'by_folder': {}, 'failures': []},
+        'extraction': {'archives': 0, 'files': 0, 'seconds': 0.0, 'errors': []},
+        'error': None
+    }
+
+    def finish(status, exit_code):
+        summary['status'] = status
+        summary['exit_code'] = exit_code
+        summary['finished_at'] = datetime.now().isoformat(timespec='seconds')
+        summary['duration_seconds'] = round(time.time() - started, 1)
+        return summary
+
+    def fail(message):
+        summary['error'] = message
+        print(f"✗ {message}")
+        if logger:
+            logger.error(message)
+        return finish('failed', EXIT_FAILED)
+
+    if source not in SOURCES:
+        return fail(f"Sorgente dei link non valida: {source}")
+    if source == 'file' and not (links_file and os.path.isfile(links_file)):
+        return fail(f"File dei link non trovato: {links_file}")
+    if not os.path.isdir(database_path):
+        return fail(f"Il path {database_path} non esiste: verificare il mount point /database")
+
+    # Catalogo dei file esistenti (riscansiona solo le cartelle modificate)
+    catalog = get_file_catalog(database_path)
+    catalog.sync()
+    print(f"Catalogo del database: {len(catalog)} file in {len(catalog.folders())} cartelle")
+
+    feed = LinkFeed(limit=max_files)
+    discovered = []
+    discovery_lock = threading.Lock()
+
+    def accept(links):
+        links = list(links)
+        wanted = [link for link in links if is_json_download_link(link)] if json_only else links
+        with discovery_lock:
+            discovered.extend(links)
+            summary['discovery']['filtered_out'] += len(links) - len(wanted)
+        accepted = feed.put(wanted)
+        if accepted:
+            print(f"[ricerca] {accepted} nuovi link in coda ({feed.accepted} in totale)")
+
+    def discover():
+        discovery_start = time.time()
+        try:
+            if source == 'scrape':
+                from .scraper import scrape_all_json_links
+                scrape_all_json_links(config, logger, on_links=accept)
+            elif source == 'cache':
+                accept(sorted(load_links_from_cache(LINKS_CACHE_FILE)))
+            else:
+                accept(_read_links_file(links_file))
+        except Exception as e:
+            summary['discovery']['error'] = str(e)
+            print(f"✗ Errore durante la ricerca dei link: {e}")
+            if logger:
+                logger.error(f"Errore durante la ricerca dei link: {e}")
+        finally:
+            summary['discovery']['seconds'] = round(time.time() - discovery_start, 1)
+            feed.close()
+
+    max_workers, per_host_limit = get_download_concurrency(config)
+    # I download falliti tornano in coda con backoff e jitter (vedi run_download_jobs)
+    download_options = get_download_options(config)
+    download_options['max_retries'] = 1
+    retry_stats = RetryStats()
+    extract_options = get_extract_options(config)
+    # Con l'estrazione in streaming i JSON escono durante il download; altrimenti gli
+    # archivi completati passano al thread di estrazione e i worker proseguono
+    stream_extract = extract_zip and stream_extraction_enabled(config)
+    extraction_futures = []
+    extraction_time = [0.0]
+
+    def watch_stop():
+        # All'interruzione la coda si chiude subito, senza attendere la fine della ricerca
+        while not feed.exhausted:
+            if stop_event.wait(FEED_POLL_INTERVAL):
+                feed.close()
+                return
+
+    def download(index, link):
+        if stop_event is not None and stop_event.is_set():
+            return {'success': False, 'error': 'Esecuzione interrotta', 'retryable': False, 'not_started': True}
+        return download_with_auto_sorting(
+            link,
+            config['download_dir'],
+            logger=logger,
+            show_progress=False,
+            extract_zip=stream_extract,
+            download_options=download_options,
+            stream_extract=stream_extract,
+            extract_options=extract_options,
+            database_path=database_path
+        )
+
+    def extract(result):
+        extraction_start = time.time()
+        dest_path = result['dest_path']
+        try:
+            extract_dir = os.path.splitext(dest_path)[0]
+            os.makedirs(extract_dir, exist_ok=True)
+            extracted = extract_downloaded_zip(dest_path, extract_dir, logger, None, **extract_options)
+            for extracted_path in extracted:
+                catalog.add_file(extracted_path)
+            print(f"[estrazione] {len(extracted)} file da {result['filename']}")
+            return {'files': len(extracted)}
+        except Exception as e:
+            if logger:
+                logger.error(f"Errore durante l'estrazione di {dest_path}: {e}")
+            return {'error': f"{result['filename']}: {e}"}
+        finally:
+            extraction_time[0] += time.time() - extraction_start
+
+    downloads = summary['downloads']
+    extraction = summary['extraction']
+
+    def on_result(index, link, result):
+        if result.get('not_started'):
+            downloads['not_started'] += 1
+            return
+        if not result.get('success'):
+            downloads['failed'] += 1
+            downloads['failures'].append({'link': link, 'error': result.get('error', 'Errore sconosciuto'),
+                                          'attempts': result.get('attempts', 1)})
+            print(f"✗ {os.path.basename(link.split('?')[0])}: {result.get('error', 'Errore sconosciuto')}")
+            return
+        if result.get('skipped'):
+            downloads['skipped'] += 1
+            return
+
+        downloads['downloaded'] += 1
+        folder = result['target_folder']
+        downloads['by_folder'][folder] = downloads['by_folder'].get(folder, 0) + 1
+        try:
+            downloads['bytes'] += os.path.getsize(result['dest_path'])
+        except OSError:
+            pass
+        print(f"✓ {result['filename']} → {folder}")
+
+        if not result['dest_path'].lower().endswith('.zip') or not extract_zip:
+            return
+        if stream_extract:
+            extraction['archives'] += 1
+            extraction['files'] += len(result.get('extracted_files') or [])
+            if result.get('extraction_error'):
+                extraction['errors'].append(f"{result['filename']}: {result['extraction_error']}")
+        else:
+            extraction_futures.append(extractor.submit(extract, result))
+
+    discovery_thread = threading.Thread(target=discover, name='discovery', daemon=True)
+    print(f"Pipeline avviata: ricerca link ({source}) → download ({max_workers} paralleli, "
+          f"max {per_host_limit} per host) → {'estrazione' if extract_zip else 'nessuna estrazione'}")
+    if logger:
+        logger.info(f"Pipeline batch avviata con opzioni {summary['options']}")
+
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix='extract') as extractor:
+        discovery_thread.start()
+        if stop_event is not None:
+            threading.Thread(target=watch_stop, name='stop-watch', daemon=True).start()
+        downloads_start = time.time()
+        run_download_jobs(
+            feed,
+            download,
+            max_workers=max_workers,
+            per_host_limit=per_host_limit,
+            logger=logger,
+            on_result=on_result,
+            retry_policy=get_retry_policy(config),
+            retry_stats=retry_stats
+        )
+        downloads['seconds'] = round(time.time() - downloads_start, 1)
+        if stop_event is None or not stop_event.is_set():
+            discovery_thread.join()
+
+        for future in extraction_futures:
+            outcome = future.result()
+            extraction['archives'] += 1
+            if 'error' in outcome:
+                extraction['errors'].append(outcome['error'])
+            else:
+                extraction['files'] += outcome['files']
+    if not stream_extract:
+        extraction['seconds'] = round(extraction_time[0], 1)
+
+    summary['discovery']['links'] = feed.accepted
+    summary['retries'] = log_retry_summary(retry_stats, logger)
+    summary['connections'] = get_connection_stats()
+    log_connection_stats(logger)
+
+    # I link trovati restano disponibili per il menu interattivo
+    if source == 'scrape' and discovered:
+        save_links_to_cache(load_links_from_cache(LINKS_CACHE_FILE) | set(discovered), LINKS_CACHE_FILE)
+
+    if stop_event is not None and stop_event.is_set():
+        return finish('interrupted', EXIT_INTERRUPTED)
+    if not feed.accepted:
+        return fail(summary['discovery']['error'] or "Nessun link da scaricare")
+    if downloads['failed'] or extraction['errors'] or summary['discovery']['error']:
+        return finish('partial', EXIT_PARTIAL)
+    return finish('ok', EXIT_OK)
@@ -0,0 +1,211 @@
+import time
+import heapq
+import random
+import itertools
+import threading
+
+# Attesa massima tra due tentativi: senza limite backoff ** attempt arriva a minuti
+DEFAULT_MAX_RETRY_DELAY = 60.0
+
+
+class RetryPolicy:
+    """
+    Backoff esponenziale con limite e jitter "full": il tentativo n attende un tempo
+    casuale tra 0 e min(max_delay, base_delay * backoff ** n). Il jitter evita che i
+    download falliti insieme (es. per un 503 del server) riprovino tutti nello stesso istante.
+    """
+
+    def __init__(self, max_retries=5, backoff=2, base_delay=1.0, max_delay=DEFAULT_MAX_RETRY_DELAY, jitter=True):
+        self.max_retries = max(1, int(max_retries))
+        self.backoff = backoff
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+
+    def delay(self, attempt):
+        """Secondi di attesa dopo il fallimento del tentativo `attempt` (da 1)."""
+        cap = min(self.max_delay, self.base_delay * self.backoff ** attempt)
+        return random.uniform(0, cap) if self.jitter else cap
+
+    def can_retry(self, attempt):
+        """Se dopo `attempt` tentativi falliti ne resta almeno un altro."""
+        return attempt < self.max_retries
+
+
+def get_retry_policy(config, max_retries=None):
+    """
+    Legge dalla configurazione la politica dei nuovi tentativi.
+
+    Args:
+        max_retries: Numero di tentativi al posto di config['max_retries']
+                     (es. max_page_retries per lo scraper)
+
+    Returns:
+        RetryPolicy
+    """
+    config = config or {}
+    return RetryPolicy(
+        max_retries=max_retries or config.get('max_retries', 5),
+        backoff=config.get('retry_backoff', 2),
+        base_delay=float(config.get('retry_base_delay', 1.0)),
+        max_delay=float(config.get('retry_max_delay', DEFAULT_MAX_RETRY_DELAY)),
+        jitter=bool(config.get('retry_jitter', True))
+    )
+
+
+class RetryStats:
+    """Contatori dei nuovi tentativi: quanti, per quanti elementi e quanto tempo di attesa."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.retries = 0
+        self.waited = 0.0
+        self.gave_up = 0
+        self.recovered = 0
+        self.per_item = {}
+
+    def record_retry(self, key, delay):
+        with self._lock:
+            self.retries += 1
+            self.waited += delay
+            self.per_item[key] = self.per_item.get(key, 0) + 1
+
+    def record_outcome(self, key, success):
+        """Esito finale di un elemento: conta i recuperati e gli abbandonati tra quelli ritentati."""
+        with self._lock:
+            if key not in self.per_item:
+                return
+            if success:
+                self.recovered += 1
+            else:
+                self.gave_up += 1
+
+    def summary(self):
+        """
+        Returns:
+            dict: {'retries', 'items_retried', 'recovered', 'gave_up', 'waited', 'max_retries_per_item'}
+        """
+        with self._lock:
+            return {
+                'retries': self.retries,
+                'items_retried': len(self.per_item),
+                'recovered': self.recovered,
+                'gave_up': self.gave_up,
+                'waited': round(self.waited, 1),
+                'max_retries_per_item': max(self.per_item.values(), default=0)
+            }
+
+
+def log_retry_summary(stats, logger=None):
+    """Stampa (e registra nel log) il riepilogo dei nuovi tentativi."""
+    summary = stats.summary()
+    if not summary['retries']:
+        return summary
+    message = (f"Nuovi tentativi: {summary['retries']} per {summary['items_retried']} elementi "
+               f"({summary['recovered']} recuperati, {summary['gave_up']} abbandonati), "
+               f"{summary['waited']:.1f}s di attesa pianificata")
+    print(message)
+    if logger:
+        logger.info(message)
+    return summary
+
+
+class DelayQueue:
+    """
+    Coda di elementi che diventano disponibili dopo un ritardo. Thread-safe.
+    Non blocca nessuno: chi la usa chiede quanto manca al prossimo elemento pronto.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._heap)
+
+    def put(self, item, delay):
+        with self._lock:
+            heapq.heappush(self._heap, (time.monotonic() + delay, next(self._counter), item))
+
+    def pop_ready(self):
+        """Estrae tutti gli elementi il cui ritardo è scaduto, in ordine di scadenza."""
+        now = time.monotonic()
+        ready = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                ready.append(heapq.heappop(self._heap)[2])
+        return ready
+
+    def next_ready_in(self):
+        """Secondi al prossimo elemento pronto (0 se già pronto), None se la coda è vuota."""
+        with self._lock:
+            if not self._heap:
+                return None
+            return max(0.0, self._heap[0][0] - time.monotonic())
+
+
+class RetryScheduler:
+    """
+    Per i cicli sequenziali: restituisce gli elementi da elaborare come coppie
+    (elemento, tentativo). Un elemento fallito torna in coda con il ritardo della
+    politica e nel frattempo si prosegue con gli altri; si attende solo quando
+    restano esclusivamente elementi in attesa.
+
+    Esempio:
+        scheduler = RetryScheduler(links, policy)
+        for link, attempt in scheduler:
+            if not download(link):
+                scheduler.failed(link, attempt)
+    """
+
+    def __init__(self, items, policy, stats=None, logger=None):
+        self._pending = list(items)
+        self._pending.reverse()
+        self._attempts = {}
+        self._delayed = DelayQueue()
+        self.policy = policy
+        self.stats = stats if stats is not None else RetryStats()
+        self.logger = logger
+
+    def __iter__(self):
+        while self._pending or len(self._delayed):
+            ready = self._delayed.pop_ready()
+            if ready:
+                # I nuovi tentativi pronti precedono gli elementi non ancora elaborati
+                self._pending.extend(reversed(ready))
+            elif not self._pending:
+                time.sleep(self._delayed.next_ready_in() or 0)
+                continue
+            item = self._pending.pop()
+            attempt = self._attempts.get(item, 0) + 1
+            self._attempts[item] = attempt
+            yield item, attempt
+
+    def failed(self, item, attempt, error=None, retryable=True):
+        """
+        Segnala il fallimento di un tentativo.
+
+        Args:
+            retryable: False per gli errori definitivi, che non vengono ritentati
+
+        Returns:
+            float or None: Ritardo del nuovo tentativo, None se l'elemento è abbandonato
+        """
+        if not retryable or not self.policy.can_retry(attempt):
+            self.stats.record_outcome(item, False)
+            if self.logger:
+                self.logger.error(f"{item}: abbandonato dopo {attempt} tentativi" + (f" ({error})" if error else ""))
+            return None
+        delay = self.policy.delay(attempt)
+        self.stats.record_retry(item, delay)
+        self._delayed.put(item, delay)
+        if self.logger:
+            self.logger.warning(f"{item}: tentativo {attempt}/{self.policy.max_retries} fallito"
+                                + (f" ({error})" if error else "") + f", nuovo tentativo tra {delay:.1f}s")
+        return delay
+
+    def succeeded(self, item):
+        """Segnala il successo di un elemento (per il conteggio dei recuperati)."""
+        self.stats.record_outcome(item, True)
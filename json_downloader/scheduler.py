@@ -0,0 +1,258 @@
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from urllib.parse import urlparse
+
+from .retry import DelayQueue, RetryStats
+
+# Ogni quanto il ciclo dei download controlla l'arrivo di nuovi link da un LinkFeed
+FEED_POLL_INTERVAL = 0.2
+
+
+def get_host(url):
+    """Restituisce l'host (netloc in minuscolo) di un URL."""
+    try:
+        return urlparse(url).netloc.lower()
+    except Exception:
+        return ''
+
+
+class HostLimiter:
+    """
+    Limita il numero di download simultanei verso lo stesso host.
+    Ogni host ha un proprio semaforo creato alla prima richiesta.
+    """
+
+    def __init__(self, per_host_limit):
+        self.per_host_limit = max(1, int(per_host_limit or 1))
+        self._semaphores = {}
+        self._lock = threading.Lock()
+
+    def _semaphore_for(self, host):
+        with self._lock:
+            semaphore = self._semaphores.get(host)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(self.per_host_limit)
+                self._semaphores[host] = semaphore
+            return semaphore
+
+    def acquire(self, host):
+        self._semaphore_for(host).acquire()
+
+    def release(self, host):
+        self._semaphore_for(host).release()
+
+
+class LinkFeed:
+    """
+    Sorgente di link alimentata da un altro thread (es. lo scraping) mentre i download
+    sono già in corso: passata a run_download_jobs al posto della lista, i link vengono
+    avviati appena arrivano. I duplicati vengono ignorati.
+    """
+
+    def __init__(self, limit=0):
+        """
+        Args:
+            limit: Numero massimo di link accettati (0 = nessun limite)
+        """
+        self.limit = max(0, int(limit or 0))
+        self._links = deque()
+        self._seen = set()
+        self._closed = False
+        self._condition = threading.Condition()
+
+    def put(self, links):
+        """
+        Aggiunge dei link alla coda.
+
+        Returns:
+            int: Numero di link effettivamente accettati
+        """
+        accepted = 0
+        with self._condition:
+            for link in links:
+                if self._closed or (self.limit and len(self._seen) >= self.limit):
+                    break
+                if link in self._seen:
+                    continue
+                self._seen.add(link)
+                self._links.append(link)
+                accepted += 1
+            if accepted:
+                self._condition.notify_all()
+        return accepted
+
+    def close(self):
+        """Segnala che non arriveranno altri link."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def take(self):
+        """Estrae tutti i link disponibili senza attendere."""
+        with self._condition:
+            links = list(self._links)
+            self._links.clear()
+            return links
+
+    def wait(self, timeout=None):
+        """Attende l'arrivo di nuovi link o la chiusura della coda."""
+        with self._condition:
+            if not self._links and not self._closed:
+                self._condition.wait(timeout)
+
+    @property
+    def accepted(self):
+        with self._condition:
+            return len(self._seen)
+
+    @property
+    def exhausted(self):
+        """True se la coda è chiusa e tutti i link sono stati estratti."""
+        with self._condition:
+            return self._closed and not self._links
+
+
+def get_download_concurrency(config):
+    """
+    Legge dalla configurazione il numero di worker e il limite per host.
+
+    Returns:
+        tuple: (max_workers, per_host_limit)
+    """
+    config = config or {}
+    max_workers = max(1, int(config.get('max_concurrent_downloads', 4)))
+    per_host_limit = max(1, int(config.get('max_downloads_per_host', max_workers)))
+    return max_workers, per_host_limit
+
+
+def run_download_jobs(links, worker, max_workers=4, per_host_limit=None, logger=None, on_result=None,
+                      retry_policy=None, retry_stats=None):
+    """
+    Esegue i download di una lista di link su un pool di thread limitato.
+
+    Args:
+        links: Lista dei link da scaricare, oppure un LinkFeed: i link vengono avviati
+               man mano che arrivano, fino alla chiusura della coda
+        worker: Funzione worker(index, link) che esegue il download e restituisce
+                un dict con almeno la chiave 'success'
+        max_workers: Numero massimo di download in parallelo
+        per_host_limit: Numero massimo di download simultanei verso lo stesso host
+        logger: Logger per i messaggi
+        on_result: Callback opzionale on_result(index, link, result) chiamata nel
+                   thread principale appena un download termina (dopo l'ultimo tentativo)
+        retry_policy: RetryPolicy per i download falliti: il link torna in una coda di
+                      attesa e nel frattempo i worker proseguono con gli altri. Un worker
+                      può escludere un errore definitivo restituendo 'retryable': False.
+                      None = nessun nuovo tentativo
+        retry_stats: RetryStats in cui registrare i nuovi tentativi
+
+    Returns:
+        list: I dict risultato di ciascun link, nello stesso ordine di `links`
+              (di arrivo per un LinkFeed), con il numero di tentativi in 'attempts'
+    """
+    feed = links if isinstance(links, LinkFeed) else None
+    if feed is None:
+        links = list(links)
+        if not links:
+            return []
+        max_workers = max(1, min(int(max_workers or 1), len(links)))
+    else:
+        links = []
+        max_workers = max(1, int(max_workers or 1))
+
+    limiter = HostLimiter(per_host_limit or max_workers)
+    results = [None] * len(links)
+    attempts = [0] * len(links)
+    delayed = DelayQueue()
+    if retry_policy is not None and retry_stats is None:
+        retry_stats = RetryStats()
+
+    def run_one(index, link):
+        host = get_host(link)
+        limiter.acquire(host)
+        try:
+            result = worker(index, link)
+        except Exception as e:
+            if logger:
+                logger.error(f"Errore durante il download di {link}: {e}")
+            result = {'success': False, 'error': str(e)}
+        finally:
+            limiter.release(host)
+
+        if not isinstance(result, dict):
+            result = {'success': bool(result), 'result': result}
+        result.setdefault('link', link)
+        return result
+
+    def should_retry(index, result):
+        return (retry_policy is not None and not result.get('success')
+                and result.get('retryable', True) and retry_policy.can_retry(attempts[index]))
+
+    def feed_open():
+        return feed is not None and not feed.exhausted
+
+    if logger:
+        what = f"{len(links)} download" if feed is None else "download in streaming"
+        logger.info(f"Avvio di {what} con {max_workers} worker (max {limiter.per_host_limit} per host)")
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='download') as executor:
+        futures = {}
+
+        def submit(index):
+            attempts[index] += 1
+            futures[executor.submit(run_one, index, links[index])] = index
+
+        for index in range(len(links)):
+            submit(index)
+
+        while futures or len(delayed) or feed_open():
+            if feed is not None:
+                for link in feed.take():
+                    links.append(link)
+                    results.append(None)
+                    attempts.append(0)
+                    submit(len(links) - 1)
+            for index in delayed.pop_ready():
+                submit(index)
+
+            timeout = delayed.next_ready_in()
+            if feed_open():
+                # Si torna a controllare il feed anche se nessun download termina
+                timeout = FEED_POLL_INTERVAL if timeout is None else min(timeout, FEED_POLL_INTERVAL)
+            if not futures:
+                if feed_open():
+                    feed.wait(timeout)
+                else:
+                    time.sleep(timeout or 0)
+                continue
+
+            done, _ = wait(list(futures), timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = futures.pop(future)
+                link = links[index]
+                result = future.result()
+                result['attempts'] = attempts[index]
+
+                if should_retry(index, result):
+                    # Il link torna in coda con backoff e jitter: nessun worker resta fermo ad aspettare
+                    delay = retry_policy.delay(attempts[index])
+                    retry_stats.record_retry(link, delay)
+                    delayed.put(index, delay)
+                    if logger:
+                        logger.warning(f"Download di {link} fallito ({result.get('error', 'errore sconosciuto')}), "
+                                       f"tentativo {attempts[index]}/{retry_policy.max_retries}, nuovo tentativo tra {delay:.1f}s")
+                    continue
+
+                if retry_stats is not None:
+                    retry_stats.record_outcome(link, bool(result.get('success')))
+                results[index] = result
+                if on_result:
+                    try:
+                        on_result(index, link, result)
+                    except Exception as e:
+                        if logger:
+                            logger.warning(f"Errore nella callback di completamento per {link}: {e}")
+
+    return results
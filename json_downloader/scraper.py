@@ -1,4 +1,5 @@
-from urllib.parse import urljoin, urlparse
+import asyncio
+import itertools
 import json
 import os
 from pathlib import Path
@@ -6,18 +7,28 @@ import time
 import re
 import os
 # Import from utils module
-from .utils import is_json_or_zip_link, load_datasets_from_cache, save_datasets_to_cache, load_direct_links_from_cache, save_direct_links_to_cache
+from .utils import load_datasets_from_cache, save_datasets_to_cache, load_direct_links_from_cache, save_direct_links_to_cache
+from .http_session import get_user_agent
+from .governor import get_rate_governor, THROTTLE_STATUS
+from .retry import RetryStats, get_retry_policy, log_retry_summary
+from .browser import (RequestFilter, PageTimings, PageTimer, get_request_filter_options, get_readiness_options,
+                      wait_until_ready_async, log_browser_stats)
+from .pagelinks import parse_page_links
+from .ckan import get_discovery_backend, discover_ckan_resources, save_ckan_resources, get_dataset_url, CkanError
 
 # Check if Playwright should be disabled
 NO_PLAYWRIGHT = os.environ.get('NO_PLAYWRIGHT', '0') == '1'
 
 if not NO_PLAYWRIGHT:
     try:
-        from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeout
+        from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeout
     except ImportError:
         NO_PLAYWRIGHT = True
         print("Avviso: Playwright non disponibile, utilizzo modalità senza scraping.")
 
+# Pagine del browser che visitano i dataset in parallelo (scraper_concurrency)
+DEFAULT_SCRAPER_CONCURRENCY = 4
+
 
 def load_config(config_path='config.json'):
     # Controlla se il percorso è assoluto o relativo
@@ -34,36 +45,15 @@ def load_config(config_path='config.json'):
 
 def extract_dataset_links(page_content, base_url, logger=None):
     """Estrae tutti i link ai dataset dalla pagina principale."""
-    from bs4 import BeautifulSoup
-    soup = BeautifulSoup(page_content, 'html.parser')
-    links = []
-    
-    # Cerca link ai dataset (tipicamente titoli di dataset o link "Dettagli")
-    for a in soup.find_all('a', href=True):
-        href = a['href']
-        # Cerca gli URL che sembrano essere link a dataset
-        if '/dataset/' in href and not href.endswith(('.json', '.csv', '.xml')):
-            # Normalizza URL
-            full_url = href
-            if not href.startswith(('http://', 'https://')):
-                if href.startswith('/'):
-                    base_domain = urlparse(base_url).scheme + "://" + urlparse(base_url).netloc
-                    full_url = urljoin(base_domain, href)
-                else:
-                    full_url = urljoin(base_url, href)
-            
-            links.append(full_url)
-            if logger:
-                logger.debug(f"Trovato link a dataset: {full_url}")
-    
+    links = parse_page_links(page_content, base_url).dataset_links
+    if logger:
+        for full_url in links:
+            logger.debug(f"Trovato link a dataset: {full_url}")
     return links
 
 
 def extract_json_links_from_dataset_page(page_content, base_url, logger=None, config=None):
     """Estrae link a file JSON e ZIP che contengono JSON dalla pagina di dettaglio del dataset."""
-    from bs4 import BeautifulSoup
-    import time
-    
     # Inizio timestamp per misurare il tempo di elaborazione
     start_time = time.time()
     
@@ -71,201 +61,60 @@ def extract_json_links_from_dataset_page(page_content, base_url, logger=None, co
         logger.info("Inizio estrazione link da pagina dataset...")
     print("Analisi della pagina alla ricerca di link di download...")
     
-    # Impostazioni predefinite se config non è specificato
-    if not config:
-        config = {}
-    
-    include_formats = config.get('include_formats', ['json', 'zip'])
-    exclude_formats = config.get('exclude_formats', ['ttl', 'csv', 'xml'])
-    
-    soup = BeautifulSoup(page_content, 'html.parser')
-    links = set()  # Uso un set per evitare link duplicati
-    found_links_info = {}  # Per tenere traccia dei link trovati e del loro contesto
-    
     # Verifica se la pagina contiene contenuti validi
     if len(page_content) < 100:
         if logger:
             logger.warning(f"Contenuto pagina troppo breve: {len(page_content)} caratteri. Possibile errore nel caricamento.")
         print(f"Contenuto pagina sospetto (solo {len(page_content)} caratteri). Possibile errore.")
-        
-    if not soup.find('body'):
+    
+    # Un solo passaggio sull'HTML: ogni link viene classificato una volta (attributi,
+    # classi, contenitori di risorse CKAN e testo) e validato come risorsa JSON/ZIP
+    page_links = parse_page_links(page_content, base_url, config)
+    
+    if not page_links.has_body:
         if logger:
             logger.warning("Nessun elemento <body> trovato nella pagina. HTML non valido.")
         print("Struttura pagina non valida. HTML incompleto.")
     
     # Statistiche per il debug
-    total_links = len(soup.find_all('a', href=True))
     if logger:
-        logger.debug(f"Trovati {total_links} link totali nella pagina")
-    print(f"Trovati {total_links} link totali nella pagina")
-    
-    # 1. RICERCA AVANZATA DI LINK PER ATTRIBUTI E CLASSI SPECIFICHE
-    print("Ricerca link tramite attributi e classi specifiche...")
-    
-    # Cerca tutti i link che potrebbero contenere risorse di dati
-    data_elements = [
-        # I più comuni contenitori di link di risorse
-        soup.find_all('a', class_=lambda c: c and ('resource-url' in c or 'download' in c)),
-        soup.find_all('a', attrs={'data-format': lambda f: f and f.lower() in include_formats}),
-        soup.find_all('a', attrs={'data-resource-id': True}),  # Link che identificano risorse
-        soup.find_all('a', href=lambda h: h and ('download' in h.lower() or 'resource' in h.lower() or 'dataset' in h.lower())),
-        
-        # Pulsanti o link di download
-        soup.find_all('button', class_=lambda c: c and ('download' in c or 'resource' in c)),
-        soup.find_all('a', class_=lambda c: c and ('btn' in c and 'download' in c)),
-        
-        # Contenitori di risorse
-        soup.select('.resources a'),  # Link all'interno di div con classe resources
-        soup.select('.resource-item a'),  # Link all'interno di elementi resource-item
-        soup.select('.dataset-resources a'),  # Link all'interno di elementi dataset-resources
-        
-        # Ricerca più ampia per i portali CKAN standard
-        soup.select('[data-module="resource-view"] a'),
-        soup.select('.resource-actions a')
-    ]
-    
-    # Appiattisci l'elenco di tutti gli elementi e rimuovi duplicati
-    data_elements_flat = set()
-    for element_list in data_elements:
-        for element in element_list:
-            if hasattr(element, 'get') and element.get('href'):
-                data_elements_flat.add(element)
+        logger.debug(f"Trovati {page_links.total_links} link totali nella pagina")
+    print(f"Trovati {page_links.total_links} link totali nella pagina")
+    print(f"Trovati {page_links.candidates} link potenziali tramite ricerca mirata")
     
-    # 2. RICERCA PER CONTENUTO TESTUALE
-    print("Ricerca link tramite contenuto testuale...")
-    
-    # Cerca link con testo specifico che suggerisce un download
-    download_texts = ['vai alla risorsa', 'download', 'scarica', 'json', 'zip', 'apri', 'dati', 'open data', 
-                    'dataset', 'risorsa', 'file', 'export', 'esporta']
-    text_elements = soup.find_all('a', href=True)
-    
-    for a in text_elements:
-        # Controlla sia il testo del link che il testo dentro i tag figli
-        link_text = a.get_text().lower().strip()
-        
-        if any(text in link_text for text in download_texts):
-            data_elements_flat.add(a)
-    
-    print(f"Trovati {len(data_elements_flat)} link potenziali tramite ricerca mirata")
-    if logger:
-        logger.debug(f"Trovati {len(data_elements_flat)} link potenziali da analizzare")
-    
-    # 3. ANALISI DI TUTTI I LINK TROVATI
-    print("Analisi dettagliata dei link trovati...")
-    analyzed_count = 0
-    valid_count = 0
-    
-    for element in data_elements_flat:
-        analyzed_count += 1
-        href = element.get('href')
-        if not href:
-            continue
-            
-        href_lower = href.lower()
-        element_text = element.get_text().lower().strip()
-        
-        # Ignora link che puntano esplicitamente a formati da escludere
-        if any(f'.{ext}' in href_lower for ext in exclude_formats):
-            continue
-            
-        # Verifica se il link punta a file JSON o ZIP, o contiene percorsi specifici
-        is_valid_link = (
-            is_json_or_zip_link(href) or
-            '/download/' in href_lower or
-            '/filesystem/' in href_lower or
-            '/resource/' in href_lower or
-            'format=json' in href_lower or
-            'api/action/datastore_search' in href_lower or  # API CKAN
-            any(fmt in href_lower for fmt in include_formats)
-        )
-        
-        # Seconda verifica per URL ambigui
-        if not is_valid_link:
-            # Ultima chance: controlla il testo o attributi specifici
-            if 'json' in element_text or 'zip' in element_text or 'download' in element_text:
-                is_valid_link = True
-                if logger:
-                    logger.debug(f"Link accettato tramite testo: {href} (testo: {element_text})")
-            
-            # Attributo data-format (comune in CKAN)
-            if element.get('data-format') and element.get('data-format').lower() in include_formats:
-                is_valid_link = True
-        
-        if not is_valid_link:
-            continue
-        
-        valid_count += 1
-        
-        # Normalizza URL
-        full_url = href
-        if not href.startswith(('http://', 'https://')):
-            if href.startswith('/'):
-                base_domain = urlparse(base_url).scheme + "://" + urlparse(base_url).netloc
-                full_url = urljoin(base_domain, href)
-            else:
-                full_url = urljoin(base_url, href)
-        
-        # Rimuovi parametri di tracking o sessione non necessari
-        # Mantieni solo parametri essenziali come 'id', 'resource_id', 'format'
-        parsed_url = urlparse(full_url)
-        path = parsed_url.path
-        
-        # Ripulisci l'URL se necessario
-        clean_url = full_url
-        
-        # Aggiungi il link solo se non è già stato trovato
-        if clean_url not in links:
-            links.add(clean_url)
-            
-            # Memorizza informazioni sul link per il log
-            found_links_info[clean_url] = {
-                'text': element_text if element_text else 'N/A',
-                'filename': href.split('/')[-1] if '/' in href else href,
-                'context': 'formato esplicito' if any(fmt in href_lower for fmt in include_formats) else 'potenziale risorsa'
-            }
-            
-            if logger:
-                file_type = "ZIP" if ".zip" in href_lower else "JSON" if ".json" in href_lower else "Risorsa"
-                logger.info(f"Trovato link {file_type}: {clean_url} (testo: {element_text[:30]}...)")
-            print(f"Trovato: {clean_url}")
+    for clean_url, info in page_links.resource_links.items():
+        if logger:
+            href_lower = clean_url.lower()
+            file_type = "ZIP" if ".zip" in href_lower else "JSON" if ".json" in href_lower else "Risorsa"
+            logger.info(f"Trovato link {file_type}: {clean_url} (testo: {info['text'][:30]}...)")
+        print(f"Trovato: {clean_url}")
     
-    # 4. ELABORAZIONE FINALE E LOGGING
+    links = set(page_links.resource_links)
     elapsed_time = time.time() - start_time
     
     if logger:
         logger.info(f"Estratti {len(links)} link JSON/ZIP dalla pagina dataset in {elapsed_time:.2f} secondi")
-        logger.debug(f"Statistiche: {analyzed_count} link analizzati, {valid_count} considerati validi")
+        logger.debug(f"Statistiche: {page_links.candidates} link analizzati, {len(links)} considerati validi")
         
     print(f"Completata analisi in {elapsed_time:.2f} secondi")
-    print(f"Risultato: {len(links)} link JSON/ZIP identificati su {analyzed_count} analizzati")
+    print(f"Risultato: {len(links)} link JSON/ZIP identificati su {page_links.candidates} analizzati")
     
     return links
 
 
 def find_next_page(page_content, current_page, logger=None):
     """Verifica se esiste una pagina successiva."""
-    from bs4 import BeautifulSoup
-    soup = BeautifulSoup(page_content, 'html.parser')
-    
-    # Cerca link "next" o testo "Successivo" o "prossimo"
-    next_link = soup.find('a', {'rel': 'next'}) or \
-                soup.find('a', text=re.compile(r'succes|next|avanti|prossim', re.I))
-    
-    # Cerca anche link che contengono page=X dove X è current_page + 1
-    if current_page > 0:
-        next_page_num = current_page + 1
-        next_page_links = soup.find_all('a', href=re.compile(f'[?&]page={next_page_num}(?:&|$)'))
-        if next_page_links and not next_link:
-            next_link = next_page_links[0]
-    
-    if next_link:
-        if logger:
-            logger.debug(f"Trovato link alla pagina successiva: {next_link.get('href', 'N/A')}")
-        return True
-    else:
-        if logger:
+    return _log_next_page(parse_page_links(page_content, ''), current_page, logger)
+
+
+def _log_next_page(page_links, current_page, logger=None):
+    next_link = page_links.next_page_link(current_page)
+    if logger:
+        if next_link is not None:
+            logger.debug(f"Trovato link alla pagina successiva: {next_link}")
+        else:
             logger.debug(f"Nessun link alla pagina successiva trovato per pagina {current_page}")
-        return False
+    return next_link is not None
 
 
 def add_known_datasets(all_dataset_links, logger=None):
@@ -343,13 +192,375 @@ def add_known_datasets(all_dataset_links, logger=None):
     return all_dataset_links
 
 
-def scrape_all_json_links(config, logger=None):
+def get_scraper_concurrency(config):
+    """Numero di pagine del browser che visitano i dataset in parallelo."""
+    return max(1, int((config or {}).get('scraper_concurrency', DEFAULT_SCRAPER_CONCURRENCY)))
+
+
+def _browser_options(config):
+    browser_options = {
+        'headless': not config.get('debug_mode', False)
+    }
+    
+    if 'proxy' in config:
+        browser_options['proxy'] = {
+            'server': config['proxy']
+        }
+    return browser_options
+
+
+def _context_options(config):
+    return {
+        'viewport': {'width': 1280, 'height': 800},
+        'user_agent': get_user_agent(config)
+    }
+
+
+async def _new_context(browser, config, request_filter=None):
+    """Nuovo contesto del browser con il filtro delle richieste non necessarie."""
+    context = await browser.new_context(**_context_options(config))
+    if request_filter is not None:
+        await request_filter.install_async(context)
+    return context
+
+
+async def _wait_before_retry(retry_policy, retry_stats, url, attempt):
+    """Attesa con backoff e jitter prima di riprovare una pagina (nessuna dopo l'ultimo tentativo)."""
+    if not retry_policy.can_retry(attempt):
+        return
+    delay = retry_policy.delay(attempt)
+    retry_stats.record_retry(url, delay)
+    await asyncio.sleep(delay)
+
+
+async def _load_page(page, url, config, governor, timings=None):
+    """
+    Apre url nella pagina e ne restituisce il contenuto appena la pagina è pronta
+    (vedi browser.wait_until_ready).
+    I tempi di risposta e di pagina pronta vengono registrati in timings (PageTimings).
+    
+    Returns:
+        tuple: (response, content) - content è None se la risposta è un errore HTTP
+    """
+    # Stessi limiti per host del downloader: un 429/503 rallenta entrambi.
+    # L'attesa del governor è bloccante e va in un thread per non fermare le altre pagine
+    await asyncio.get_running_loop().run_in_executor(None, governor.acquire_request, url)
+    timer = PageTimer(timings, url)
+    response = await page.goto(url, timeout=config['timeout']*1000, wait_until="domcontentloaded")
+    timer.responded()
+    if response:
+        governor.observe(url, response.status, response.headers)
+    
+    if not response or response.status >= 400:
+        return response, None
+    
+    # Attendi caricamento dinamico: elenco presente e link stabili, al massimo page_ready_timeout
+    await wait_until_ready_async(page, **get_readiness_options(config))
+    
+    content = await page.content()
+    timer.ready()
+    return response, content
+
+
+async def _scrape_listing_pages(page, config, base_url, governor, retry_policy, retry_stats, logger=None, timings=None):
+    """
+    FASE 1: Scraping delle pagine principali per trovare link ai dataset.
+    Le pagine vengono visitate in ordine: la fine della paginazione si riconosce
+    dalle pagine vuote consecutive.
+    
+    Returns:
+        list: Link alle pagine dei dataset
+    """
+    max_retries = retry_policy.max_retries
+    dataset_links = []
+    page_num = 1
+    empty_pages_consecutive = 0  # Contatore pagine vuote consecutive
+    max_empty_consecutive = 2  # Numero massimo di pagine vuote consecutive
+    max_pages = config.get('max_pages', 20)  # Numero massimo di pagine da analizzare
+    
+    # Ciclo fino a quando non raggiungiamo il limite di pagine vuote consecutive o il numero massimo di pagine
+    while empty_pages_consecutive < max_empty_consecutive and page_num <= max_pages:
+        url = f"{base_url}?page={page_num}" if page_num > 1 else base_url
+        if logger:
+            logger.info(f"Analisi pagina {page_num}: {url} (Pagine vuote consecutive: {empty_pages_consecutive}/{max_empty_consecutive})")
+        
+        retry_count = 0
+        success = False
+        
+        while retry_count < max_retries and not success:
+            try:
+                if logger:
+                    logger.info(f"Navigazione a {url}")
+                
+                response, content = await _load_page(page, url, config, governor, timings)
+                
+                if content is None:
+                    if logger:
+                        logger.warning(f"Errore risposta HTTP {response.status if response else 'N/A'} per {url}")
+                    retry_count += 1
+                    if response and response.status in THROTTLE_STATUS and governor.adaptive:
+                        # L'attesa (Retry-After) la impone il governor alla prossima richiesta
+                        continue
+                    await _wait_before_retry(retry_policy, retry_stats, url, retry_count)
+                    continue
+                
+                # Link ai dataset e paginazione dallo stesso passaggio sull'HTML
+                page_links = parse_page_links(content, base_url, config)
+                links = page_links.dataset_links
+                
+                # Aggiorna il contatore di pagine vuote consecutive
+                if links:
+                    dataset_links.extend(links)
+                    empty_pages_consecutive = 0  # Resetta il contatore se troviamo dataset
+                    if logger:
+                        logger.info(f"Trovati {len(links)} link a dataset in {url} (Reset contatore pagine vuote)")
+                else:
+                    empty_pages_consecutive += 1  # Incrementa il contatore se non troviamo dataset
+                    if logger:
+                        logger.warning(f"Trovati 0 link a dataset in {url} (Pagine vuote consecutive: {empty_pages_consecutive}/{max_empty_consecutive})")
+                
+                # Verifica pagina successiva
+                has_next_page = _log_next_page(page_links, page_num, logger)
+                
+                if not has_next_page:
+                    if logger:
+                        logger.info(f"Nessuna pagina successiva dopo {url}. Fine della paginazione.")
+                    # Se non c'è una pagina successiva, setta empty_pages_consecutive al massimo
+                    # per forzare l'uscita dal ciclo
+                    empty_pages_consecutive = max_empty_consecutive
+                
+                success = True
+            
+            except PlaywrightTimeout as e:
+                retry_count += 1
+                if logger:
+                    logger.warning(f"Timeout durante lo scraping di {url}: {e}. Tentativo {retry_count}/{max_retries}")
+                await _wait_before_retry(retry_policy, retry_stats, url, retry_count)
+            
+            except Exception as e:
+                retry_count += 1
+                if logger:
+                    logger.error(f"Errore durante lo scraping di {url}: {str(e)}. Tentativo {retry_count}/{max_retries}")
+                await _wait_before_retry(retry_policy, retry_stats, url, retry_count)
+        
+        retry_stats.record_outcome(url, success)
+        
+        # Se abbiamo esaurito i tentativi e non abbiamo avuto successo
+        if not success:
+            if logger:
+                logger.error(f"Abbandono scraping di {url} dopo {max_retries} tentativi falliti")
+            empty_pages_consecutive += 1  # Consideriamo un errore come una pagina vuota
+        
+        # Debug: Stampa stato prima di passare alla pagina successiva
+        if logger:
+            logger.info(f"Stato dopo pagina {page_num}: {len(dataset_links)} dataset trovati, " +
+                       f"{empty_pages_consecutive}/{max_empty_consecutive} pagine vuote consecutive")
+        
+        # Passa alla pagina successiva
+        page_num += 1
+    
+    return dataset_links
+
+
+async def _scrape_dataset_pages(browser, config, dataset_urls, base_url, governor, retry_policy, retry_stats,
+                                publish, logger=None, request_filter=None, timings=None):
+    """
+    FASE 2: Visita le pagine dei dataset per trovare i file JSON con un pool di
+    scraper_concurrency pagine, ognuna nel proprio contesto del browser.
+    Una pagina fallita torna in coda con backoff e jitter mentre le altre proseguono;
+    i nuovi tentativi pronti precedono i dataset non ancora visitati.
+    """
+    if not dataset_urls:
+        return
+    
+    loop = asyncio.get_running_loop()
+    concurrency = min(get_scraper_concurrency(config), len(dataset_urls))
+    # (priorità, ordine, url): 0 = nuovo tentativo, 1 = prima visita, 2 = fine del worker
+    queue = asyncio.PriorityQueue()
+    order = itertools.count()
+    for dataset_url in dataset_urls:
+        queue.put_nowait((1, next(order), dataset_url))
+    attempts = {}
+    remaining = [len(dataset_urls)]
+    all_done = asyncio.Event()
+    
+    def finished(dataset_url, success):
+        retry_stats.record_outcome(dataset_url, success)
+        remaining[0] -= 1
+        if not remaining[0]:
+            all_done.set()
+    
+    async def visit(page, dataset_url):
+        attempt = attempts[dataset_url] = attempts.get(dataset_url, 0) + 1
+        error = None
+        
+        try:
+            if logger:
+                logger.info(f"Navigazione al dataset: {dataset_url}")
+            
+            response, content = await _load_page(page, dataset_url, config, governor, timings)
+            
+            if content is None:
+                error = f"Errore risposta HTTP {response.status if response else 'N/A'}"
+            else:
+                # Estrai link ai file JSON
+                json_links = extract_json_links_from_dataset_page(content, base_url, logger, config)
+                
+                if logger:
+                    logger.info(f"Trovati {len(json_links)} file JSON/ZIP nel dataset {dataset_url}")
+                
+                publish(json_links)
+        
+        except PlaywrightTimeout as e:
+            error = f"Timeout: {e}"
+        
+        except Exception as e:
+            error = str(e)
+        
+        if error is None:
+            finished(dataset_url, True)
+        elif retry_policy.can_retry(attempt):
+            delay = retry_policy.delay(attempt)
+            retry_stats.record_retry(dataset_url, delay)
+            loop.call_later(delay, queue.put_nowait, (0, next(order), dataset_url))
+            if logger:
+                logger.warning(f"Errore durante lo scraping di {dataset_url}: {error}. "
+                               f"Tentativo {attempt}/{retry_policy.max_retries}, nuovo tentativo tra {delay:.1f}s")
+        else:
+            finished(dataset_url, False)
+            if logger:
+                logger.error(f"Abbandono scraping del dataset {dataset_url} dopo {attempt} tentativi falliti: {error}")
+    
+    async def worker():
+        context = await _new_context(browser, config, request_filter)
+        try:
+            page = await context.new_page()
+            while True:
+                _, _, dataset_url = await queue.get()
+                if dataset_url is None:
+                    return
+                await visit(page, dataset_url)
+        finally:
+            await context.close()
+    
+    start_time = time.time()
+    workers = [asyncio.ensure_future(worker()) for _ in range(concurrency)]
+    waiter = asyncio.ensure_future(all_done.wait())
+    running = set(workers)
+    # Si attende la fine di tutti i dataset, o che i worker terminino per un errore
+    while running and not waiter.done():
+        done, _ = await asyncio.wait(running | {waiter}, return_when=asyncio.FIRST_COMPLETED)
+        running -= done
+    for _ in running:
+        queue.put_nowait((2, next(order), None))
+    results = await asyncio.gather(*workers, return_exceptions=True)
+    waiter.cancel()
+    
+    for result in results:
+        if isinstance(result, Exception) and logger:
+            logger.error(f"Errore in una pagina del browser durante lo scraping dei dataset: {result}")
+    if logger:
+        logger.info(f"Visitati {len(dataset_urls) - remaining[0]}/{len(dataset_urls)} dataset in "
+                    f"{time.time() - start_time:.1f}s con {concurrency} pagine in parallelo")
+
+
+async def _scrape_with_playwright(config, base_url, publish, logger=None):
     """
-    Funzione principale per lo scraping. Se Playwright non è disponibile,
+    Scraping con Playwright (API asincrona): pagine dell'elenco in sequenza, poi le
+    pagine dei dataset in parallelo. I link ai file vengono passati a publish.
+    
+    Returns:
+        list: Link alle pagine dei dataset trovati
+    """
+    governor = get_rate_governor(config)
+    # Attese tra i tentativi: backoff esponenziale con limite e jitter
+    retry_policy = get_retry_policy(config, max_retries=config.get('max_page_retries', 3))
+    retry_stats = RetryStats()
+    # Immagini, font, stili e host di terze parti non servono per leggere i link
+    request_filter = RequestFilter(base_url, **get_request_filter_options(config))
+    timings = PageTimings()
+    
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(**_browser_options(config))
+        try:
+            context = await _new_context(browser, config, request_filter)
+            page = await context.new_page()
+            dataset_links = await _scrape_listing_pages(page, config, base_url, governor, retry_policy, retry_stats,
+                                                        logger, timings)
+            await context.close()
+            
+            # Aggiungi dataset noti che potrebbero non essere stati trovati
+            dataset_links = add_known_datasets(dataset_links, logger)
+            
+            if logger:
+                logger.info(f"Trovati complessivamente {len(dataset_links)} link a dataset. Inizio l'estrazione dei file JSON...")
+            
+            await _scrape_dataset_pages(browser, config, list(dict.fromkeys(dataset_links)), base_url, governor,
+                                        retry_policy, retry_stats, publish, logger, request_filter, timings)
+        finally:
+            await browser.close()
+    
+    log_retry_summary(retry_stats, logger)
+    log_browser_stats(timings, request_filter, logger)
+    return dataset_links
+
+
+def _discover_with_ckan(config, publish, logger=None):
+    """
+    Ricerca dei link tramite l'API CKAN (vedi ckan.discover_ckan_resources): i link
+    alle risorse vengono passati a publish dataset per dataset e i metadati
+    (formato, dimensione, last_modified) salvati in cache/ckan_resources.json.
+    
+    Returns:
+        list or None: Link alle pagine dei dataset, None se l'API non è disponibile
+    """
+    def on_package(package, records):
+        publish([record['url'] for record in records])
+    
+    try:
+        packages, records = discover_ckan_resources(config, logger, on_package=on_package)
+    except CkanError as e:
+        if logger:
+            logger.warning(f"API CKAN non disponibile ({e}): ripiego sullo scraping delle pagine")
+        return None
+    if not records:
+        if logger:
+            logger.warning("Nessuna risorsa JSON/ZIP dall'API CKAN: ripiego sullo scraping delle pagine")
+        return None
+    
+    save_ckan_resources(records)
+    return [get_dataset_url(config, package) for package in packages]
+
+
+def scrape_all_json_links(config, logger=None, on_links=None):
+    """
+    Funzione principale per la ricerca dei link. Con discovery_backend "ckan"
+    (predefinito) usa l'API CKAN del portale; se l'API non risponde, o con
+    "playwright", visita le pagine con il browser. Se Playwright non è disponibile,
     restituisce solo link noti salvati in cache o predefiniti.
+    
+    Args:
+        on_links: Callback opzionale on_links(links) chiamata con i nuovi link appena
+                  trovati (dataset per dataset), per avviare i download senza attendere
+                  la fine dello scraping
     """
+    all_json_links = set()
+    base_url = config['base_url']
+    
+    def publish(links):
+        new_links = [link for link in links if link not in all_json_links]
+        all_json_links.update(new_links)
+        if on_links and new_links:
+            on_links(new_links)
+        return new_links
+    
+    # Con l'API CKAN del portale non serve il browser: Playwright resta come ripiego
+    dataset_links = None
+    if get_discovery_backend(config) == 'ckan':
+        dataset_links = _discover_with_ckan(config, publish, logger)
+    
     # Se Playwright non è disponibile o disabilitato, utilizza solo link noti
-    if NO_PLAYWRIGHT:
+    if dataset_links is None and NO_PLAYWRIGHT:
         if logger:
             logger.info("Modalità senza scraping attiva: utilizzo solo link noti.")
         
@@ -405,188 +616,14 @@ def scrape_all_json_links(config, logger=None):
         if logger:
             logger.info(f"Trovati {len(all_links)} link noti da file cache e predefiniti.")
         
+        if on_links and all_links:
+            on_links(list(all_links))
+        
         return all_links
         
     # Altrimenti, procedi con il normale scraping
-    all_json_links = set()
-    base_url = config['base_url']
-    visited_datasets = set()
-    
-    # Opzioni Playwright avanzate
-    with sync_playwright() as p:
-        browser_options = {
-            'headless': not config.get('debug_mode', False)
-        }
-        
-        if 'proxy' in config:
-            browser_options['proxy'] = {
-                'server': config['proxy']
-            }
-        
-        browser = p.chromium.launch(**browser_options)
-        context = browser.new_context(
-            viewport={'width': 1280, 'height': 800},
-            user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/96.0.4664.110 Safari/537.36'
-        )
-        
-        page = context.new_page()
-        max_retries = config.get('max_page_retries', 3)
-        
-        # FASE 1: Scraping delle pagine principali per trovare link ai dataset
-        dataset_links = []
-        page_num = 1
-        empty_pages_consecutive = 0  # Contatore pagine vuote consecutive
-        max_empty_consecutive = 2  # Numero massimo di pagine vuote consecutive
-        max_pages = config.get('max_pages', 20)  # Numero massimo di pagine da analizzare
-        
-        # Ciclo fino a quando non raggiungiamo il limite di pagine vuote consecutive o il numero massimo di pagine
-        while empty_pages_consecutive < max_empty_consecutive and page_num <= max_pages:
-            url = f"{base_url}?page={page_num}" if page_num > 1 else base_url
-            if logger:
-                logger.info(f"Analisi pagina {page_num}: {url} (Pagine vuote consecutive: {empty_pages_consecutive}/{max_empty_consecutive})")
-            
-            retry_count = 0
-            success = False
-            
-            while retry_count < max_retries and not success:
-                try:
-                    if logger:
-                        logger.info(f"Navigazione a {url}")
-                    
-                    response = page.goto(url, timeout=config['timeout']*1000, wait_until="networkidle")
-                    
-                    if not response or response.status >= 400:
-                        if logger:
-                            logger.warning(f"Errore risposta HTTP {response.status if response else 'N/A'} per {url}")
-                        retry_count += 1
-                        time.sleep(2 * retry_count)
-                        continue
-                    
-                    # Attendi caricamento dinamico
-                    page.wait_for_load_state("networkidle")
-                    
-                    # Scorri pagina per attivare lazy loading
-                    page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
-                    page.wait_for_timeout(1000)
-                    
-                    content = page.content()
-                    
-                    # Estrai link ai dataset
-                    links = extract_dataset_links(content, base_url, logger)
-                    
-                    # Aggiorna il contatore di pagine vuote consecutive
-                    if links:
-                        dataset_links.extend(links)
-                        empty_pages_consecutive = 0  # Resetta il contatore se troviamo dataset
-                        if logger:
-                            logger.info(f"Trovati {len(links)} link a dataset in {url} (Reset contatore pagine vuote)")
-                    else:
-                        empty_pages_consecutive += 1  # Incrementa il contatore se non troviamo dataset
-                        if logger:
-                            logger.warning(f"Trovati 0 link a dataset in {url} (Pagine vuote consecutive: {empty_pages_consecutive}/{max_empty_consecutive})")
-                    
-                    # Verifica pagina successiva
-                    has_next_page = find_next_page(content, page_num, logger)
-                    
-                    if not has_next_page:
-                        if logger:
-                            logger.info(f"Nessuna pagina successiva dopo {url}. Fine della paginazione.")
-                        # Se non c'è una pagina successiva, setta empty_pages_consecutive al massimo
-                        # per forzare l'uscita dal ciclo
-                        empty_pages_consecutive = max_empty_consecutive
-                    
-                    success = True
-                
-                except PlaywrightTimeout as e:
-                    retry_count += 1
-                    if logger:
-                        logger.warning(f"Timeout durante lo scraping di {url}: {e}. Tentativo {retry_count}/{max_retries}")
-                    time.sleep(5 * retry_count)  # Backoff esponenziale
-                
-                except Exception as e:
-                    retry_count += 1
-                    if logger:
-                        logger.error(f"Errore durante lo scraping di {url}: {str(e)}. Tentativo {retry_count}/{max_retries}")
-                    time.sleep(5 * retry_count)
-            
-            # Se abbiamo esaurito i tentativi e non abbiamo avuto successo
-            if not success:
-                if logger:
-                    logger.error(f"Abbandono scraping di {url} dopo {max_retries} tentativi falliti")
-                empty_pages_consecutive += 1  # Consideriamo un errore come una pagina vuota
-            
-            # Debug: Stampa stato prima di passare alla pagina successiva
-            if logger:
-                logger.info(f"Stato dopo pagina {page_num}: {len(dataset_links)} dataset trovati, " +
-                           f"{empty_pages_consecutive}/{max_empty_consecutive} pagine vuote consecutive")
-            
-            # Passa alla pagina successiva
-            page_num += 1
-        
-        # Aggiungi dataset noti che potrebbero non essere stati trovati
-        dataset_links = add_known_datasets(dataset_links, logger)
-        
-        if logger:
-            logger.info(f"Trovati complessivamente {len(dataset_links)} link a dataset. Inizio l'estrazione dei file JSON...")
-        
-        # FASE 2: Visita ogni pagina di dataset per trovare file JSON
-        for dataset_url in dataset_links:
-            if dataset_url in visited_datasets:
-                continue
-            
-            visited_datasets.add(dataset_url)
-            retry_count = 0
-            
-            while retry_count < max_retries:
-                try:
-                    if logger:
-                        logger.info(f"Navigazione al dataset: {dataset_url}")
-                    
-                    response = page.goto(dataset_url, timeout=config['timeout']*1000, wait_until="networkidle")
-                    
-                    if not response or response.status >= 400:
-                        if logger:
-                            logger.warning(f"Errore risposta HTTP {response.status if response else 'N/A'} per {dataset_url}")
-                        retry_count += 1
-                        time.sleep(2 * retry_count)
-                        continue
-                    
-                    # Attendi caricamento dinamico
-                    page.wait_for_load_state("networkidle")
-                    
-                    # Scorri pagina per attivare lazy loading
-                    page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
-                    page.wait_for_timeout(1000)
-                    
-                    content = page.content()
-                    
-                    # Estrai link ai file JSON
-                    json_links = extract_json_links_from_dataset_page(content, base_url, logger, config)
-                    
-                    if logger:
-                        logger.info(f"Trovati {len(json_links)} file JSON/ZIP nel dataset {dataset_url}")
-                    
-                    all_json_links.update(json_links)
-                    break
-                
-                except PlaywrightTimeout as e:
-                    retry_count += 1
-                    if logger:
-                        logger.warning(f"Timeout durante lo scraping di {dataset_url}: {e}. Tentativo {retry_count}/{max_retries}")
-                    time.sleep(5 * retry_count)
-                
-                except Exception as e:
-                    retry_count += 1
-                    if logger:
-                        logger.error(f"Errore durante lo scraping di {dataset_url}: {str(e)}. Tentativo {retry_count}/{max_retries}")
-                    time.sleep(5 * retry_count)
-            
-            # Se abbiamo esaurito i tentativi e non abbiamo avuto successo
-            if retry_count >= max_retries:
-                if logger:
-                    logger.error(f"Abbandono scraping del dataset {dataset_url} dopo {max_retries} tentativi falliti")
-        
-        browser.close()
+    if dataset_links is None:
+        dataset_links = asyncio.run(_scrape_with_playwright(config, base_url, publish, logger))
     
     # Salva i dataset trovati per futuri scraping
     # Rimuovi duplicati prima del salvataggio
@@ -614,11 +651,9 @@ def scrape_all_json_links(config, logger=None):
     cached_direct_links = load_direct_links_from_cache()
     known_direct_links = list(set(default_known_direct_links + cached_direct_links))
     
-    for link in known_direct_links:
-        if link not in all_json_links:
-            all_json_links.add(link)
-            if logger:
-                logger.info(f"Aggiunto link diretto noto: {link}")
+    for link in publish(known_direct_links):
+        if logger:
+            logger.info(f"Aggiunto link diretto noto: {link}")
     
     # Verifica se abbiamo trovato nuovi link diretti e li salva
     # Prima salviamo i link diretti già conosciuti
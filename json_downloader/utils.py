@@ -6,6 +6,7 @@ import logging
 import re
 import zipfile
 import random
+import threading
 import time
 from datetime import datetime
 from pathlib import Path
@@ -62,7 +63,8 @@ def ensure_dir(directory):
         return False
     
     # Verifica i permessi di scrittura creando un file di test
-    test_file = os.path.join(directory, '.write_test')
+    # (nome univoco per thread, così i download paralleli non si pestano i piedi)
+    test_file = os.path.join(directory, f'.write_test_{os.getpid()}_{threading.get_ident()}')
     try:
         with open(test_file, 'w') as f:
             f.write('test')
@@ -96,8 +98,12 @@ def sanitize_filename(filename):
     return re.sub(r'[\\/*?:"<>|]', '_', filename)
 
 
-def extract_zip_files(zip_path, extract_dir, logger=None):
-    """Estrae file JSON da un file ZIP e restituisce i percorsi ai file estratti."""
+def extract_zip_files(zip_path, extract_dir, logger=None, workers=None, use_processes=True):
+    """
+    Estrae file JSON da un file ZIP e restituisce i percorsi ai file estratti.
+    I membri sono decompressi in parallelo (vedi extraction.extract_members).
+    """
+    from .extraction import extract_members
     extracted_files = []
     
     try:
@@ -111,14 +117,11 @@ def extract_zip_files(zip_path, extract_dir, logger=None):
             if not json_files and logger:
                 logger.warning(f"Nessun file JSON trovato in {zip_path}, estraggo tutti i file")
                 json_files = file_list
-            
-            # Estrai i file
-            for file_name in json_files:
-                zip_ref.extract(file_name, extract_dir)
-                extracted_path = os.path.join(extract_dir, file_name)
-                extracted_files.append(extracted_path)
-                if logger:
-                    logger.info(f"Estratto file {file_name} da {os.path.basename(zip_path)}")
+        
+        # Estrai i file
+        result = extract_members(zip_path, extract_dir, members=json_files, workers=workers,
+                                 use_processes=use_processes, logger=logger)
+        extracted_files = result['extracted']
     
     except Exception as e:
         if logger:
@@ -127,73 +130,120 @@ def extract_zip_files(zip_path, extract_dir, logger=None):
     return extracted_files
 
 
+class UrlClassifier:
+    """
+    Classificazione dei link per formato, con le espressioni regolari compilate una volta.
+
+    classify(url) restituisce uno dei verdetti:
+        JSON      file JSON (estensione .json o percorso/parametro che indica JSON)
+        JSON_ZIP  archivio ZIP che contiene JSON (json nell'URL o percorso di download ANAC)
+        EXCLUDED  file di un formato escluso (CSV, TTL, XML) secondo il nome del file
+        OTHER     qualsiasi altro link
+    """
+
+    JSON = 'json'
+    JSON_ZIP = 'json-zip'
+    EXCLUDED = 'excluded'
+    OTHER = 'other'
+
+    # Pattern comuni nei link ANAC (espressioni regolari)
+    JSON_PATTERNS = (
+        r'\.json$', r'_json\.', r'\.json\?',  # Estensioni esplicite
+        r'/filesystem/[^/]*_json',            # Pattern tipico di ANAC per file JSON
+        r'/resource/[^/]*_json',              # Variante del pattern per risorse
+        r'/download/[^/]*json',               # Link generici di download con JSON nel nome
+        r'format=json',                       # Parametro di formato esplicito
+        r'/json/',                            # Directory JSON
+        r'_json_',                            # Parte del nome file
+        r'json_download', r'download_json', r'json-data', r'data\.json',
+    )
+
+    # Percorsi specifici ANAC che sappiamo contenere JSON (dopo una '/')
+    ANAC_PATHS = (
+        r'download/dataset/',            # Download da dataset ANAC (/opendata/download/dataset/)
+        r'anac-dataset/',                # Dataset ANAC specifici
+        r'anac-datamart/',
+        r'dati-contratti-pubblici/',
+        r'ocds-appalti-ordinari-\d+/',   # Dataset OCDS per anno
+        r'smartcig-tipo-fattispecie-contrattuale/',  # SmartCIG
+    )
+
+    def __init__(self, exclude_formats=('csv', 'ttl', 'xml')):
+        self.exclude_formats = tuple(fmt.lower() for fmt in exclude_formats)
+        self._json = re.compile('|'.join(self.JSON_PATTERNS))
+        self._anac = re.compile('/(?:%s)' % '|'.join(self.ANAC_PATHS))
+        # Formato escluso nel nome del file: aggiudicazioni_csv.zip, dati.ttl, export-xml.zip
+        self._excluded = re.compile(r'[._-](?:%s)(?:[._-]|$)' % '|'.join(map(re.escape, self.exclude_formats))) \
+            if self.exclude_formats else None
+
+    def classify(self, url):
+        if not url:
+            return self.OTHER
+        url_lower = url.lower()
+        path = url_lower.partition('?')[0] if '?' in url_lower else url_lower
+        filename = path.partition('#')[0].rpartition('/')[2]
+        # Le espressioni regolari si applicano solo quando le sottostringhe necessarie sono presenti
+        has_json = 'json' in url_lower
+        if self._excluded is not None and 'json' not in filename and self._excluded.search(filename):
+            return self.EXCLUDED
+        if url_lower.endswith('.zip') or '_zip.' in url_lower or '.zip?' in url_lower:
+            if has_json or self._anac.search(url_lower):
+                return self.JSON_ZIP
+            return self.OTHER
+        if (has_json and self._json.search(url_lower)) or self._anac.search(url_lower):
+            return self.JSON
+        return self.OTHER
+
+    def is_json_or_zip(self, url):
+        return self.classify(url) in (self.JSON, self.JSON_ZIP)
+
+
+_url_classifier = UrlClassifier()
+_url_classifiers = {_url_classifier.exclude_formats: _url_classifier}
+_url_classifiers_lock = threading.Lock()
+
+
+def get_url_classifier(exclude_formats=None):
+    """
+    Classificatore dei link condiviso, compilato una volta per insieme di formati
+    esclusi (exclude_formats della configurazione; None = CSV, TTL, XML).
+    """
+    if exclude_formats is None:
+        return _url_classifier
+    key = tuple(fmt.lower() for fmt in exclude_formats)
+    with _url_classifiers_lock:
+        classifier = _url_classifiers.get(key)
+        if classifier is None:
+            classifier = _url_classifiers[key] = UrlClassifier(key)
+        return classifier
+
+
 def is_json_or_zip_link(url):
     """
     Determina se un URL è un link a un file JSON o a un file ZIP che potrebbe contenere JSON.
-    Ora include una più ampia gamma di pattern di rilevamento per catturare tutti i possibili formati.
+    I link a file CSV, TTL o XML sono esclusi anche se compressi (vedi UrlClassifier).
     """
-    if not url:
-        return False
-    
-    url_lower = url.lower()
-    
-    # Estensioni esplicite
-    is_json = url_lower.endswith('.json') or '_json.' in url_lower or '.json?' in url_lower
-    is_zip = url_lower.endswith('.zip') or '_zip.' in url_lower or '.zip?' in url_lower
-    
-    # Pattern comuni nei link ANAC
-    common_patterns = [
-        '/filesystem/[^/]*_json',  # Pattern tipico di ANAC per file JSON
-        '/resource/[^/]*_json',    # Variante del pattern per risorse
-        '/download/[^/]*json',     # Link generici di download con JSON nel nome
-        'format=json',             # Parametro di formato esplicito
-        '/json/',                  # Directory JSON
-        '_json_',                  # Parte del nome file
-        'json_download',           # Indicazione di download JSON
-        'download_json',
-        'json-data',
-        'data.json'
-    ]
-    
-    # Pattern per ZIP che probabilmente contengono JSON
-    zip_patterns = [
-        r'/filesystem/[^/]*_json\.zip',  # Pattern tipico ANAC per ZIP contenenti JSON
-        r'/resource/[^/]*_json\.zip',    # Variante per risorse
-        r'json.*\.zip',                  # Qualsiasi menzione di JSON seguito da .zip
-        r'_json_.*\.zip',
-        r'json[^/]*\.zip'
-    ]
-    
-    # Percorsi specifici ANAC che sappiamo contenere JSON
-    anac_specific_paths = [
-        '/opendata/download/dataset/',  # Download da dataset ANAC
-        '/download/dataset/',           # Versione abbreviata
-        '/anac-dataset/',               # Dataset ANAC specifici
-        '/anac-datamart/',
-        '/dati-contratti-pubblici/',
-        '/ocds-appalti-ordinari-',      # Dataset OCDS per anno
-        '/smartcig-tipo-fattispecie-contrattuale/' # SmartCIG
-    ]
-    
-    # Controlla estensioni esplicite
-    if is_json:
-        return True
-    
-    # Controlla se è un ZIP che probabilmente contiene JSON
-    if is_zip:
-        # Cerca pattern che suggeriscono che il file ZIP contiene JSON
-        if any(pattern in url_lower for pattern in zip_patterns + anac_specific_paths):
-            return True
-        # Se contiene esplicitamente "json" nel nome del file ZIP, è probabilmente un JSON compresso
-        filename = url.split('/')[-1] if '/' in url else url
-        if 'json' in filename.lower():
-            return True
-    
-    # Controlla altri pattern comuni per JSON o percorsi ANAC specifici
-    if any(pattern in url_lower for pattern in common_patterns + anac_specific_paths):
+    return _url_classifier.is_json_or_zip(url)
+
+
+def is_json_download_link(url):
+    """
+    Filtro "solo JSON" usato prima del download: mantiene i link a file JSON e gli ZIP
+    che non indicano un altro formato (CSV, TTL, XML).
+    """
+    link_lower = url.lower()
+    # Mantieni i link che terminano con .json o _json o .json.zip o contengono /json/ nel percorso
+    if (link_lower.endswith('.json') or
+        link_lower.endswith('_json.zip') or
+        '/json/' in link_lower or
+        'format=json' in link_lower):
         return True
-    
-    return False
+    # Esclude esplicitamente link che sembrano CSV o TTL o XML
+    if any(ext in link_lower for ext in ['_csv.', '.csv.', '_ttl.', '.ttl.', '_xml.', '.xml.']):
+        return False
+    # Per ZIP generici, li include solo se non contengono indicazioni CSV/TTL/XML
+    return link_lower.endswith('.zip') and not any(ext in link_lower for ext in ['_csv', '.csv', '_ttl', '.ttl', '_xml', '.xml'])
+
 
 def save_links_to_cache(links, cache_file="cache/json_links.txt"):
     """Salva i link trovati in un file cache."""
@@ -366,16 +416,74 @@ def load_direct_links_from_cache(cache_file="cache/known_direct_links.txt"):
                     links.append(link)
     return links
 
+class ExistingFilesIndex(dict):
+    """
+    Mapping {filename: folder_path} dei file esistenti, con un indice aggiuntivo
+    per nome senza estensione: lookup() risponde in tempo costante anche per i file
+    estratti da uno ZIP con lo stesso nome dell'archivio.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__()
+        self._stems = {}
+        self.update(*args, **kwargs)
+
+    def __setitem__(self, filename, folder_path):
+        if filename not in self:
+            # Per ogni stem conta il primo file inserito, come nella ricerca lineare
+            self._stems.setdefault(os.path.splitext(filename)[0], []).append(filename)
+        super().__setitem__(filename, folder_path)
+
+    def __delitem__(self, filename):
+        super().__delitem__(filename)
+        stem = os.path.splitext(filename)[0]
+        names = self._stems.get(stem, [])
+        if filename in names:
+            names.remove(filename)
+        if not names:
+            self._stems.pop(stem, None)
+
+    def update(self, *args, **kwargs):
+        for filename, folder_path in dict(*args, **kwargs).items():
+            self[filename] = folder_path
+
+    def setdefault(self, filename, folder_path=None):
+        if filename not in self:
+            self[filename] = folder_path
+        return self[filename]
+
+    def pop(self, filename, *default):
+        if filename in self:
+            folder_path = self[filename]
+            del self[filename]
+            return folder_path
+        if default:
+            return default[0]
+        raise KeyError(filename)
+
+    def clear(self):
+        super().clear()
+        self._stems.clear()
+
+    def lookup(self, filename):
+        """Cartella del file (o del primo file con lo stesso nome senza estensione), o None."""
+        if filename in self:
+            return self[filename]
+        names = self._stems.get(os.path.splitext(filename)[0])
+        return self[names[0]] if names else None
+
+
 def scan_existing_files(database_path="/database/JSON"):
     """
     Scansiona le cartelle esistenti in /database/JSON e crea un mapping
     dei file già presenti per evitare riscaricamenti.
     
     Returns:
-        dict: Mapping {filename: folder_path} per i file esistenti
+        ExistingFilesIndex: Mapping {filename: folder_path} per i file esistenti,
+                            indicizzato anche per nome senza estensione
         list: Lista delle cartelle disponibili per lo smistamento
     """
-    existing_files = {}
+    existing_files = ExistingFilesIndex()
     available_folders = []
     
     if not os.path.exists(database_path):
@@ -413,6 +521,112 @@ def scan_existing_files(database_path="/database/JSON"):
     
     return existing_files, available_folders
 
+# Mapping esplicito per pattern comuni: parola chiave nel nome file -> cartella.
+# L'ordine conta: vince la prima parola chiave trovata nel nome del file.
+FOLDER_MAPPINGS = {
+    'aggiudicatari': 'aggiudicatari_json',
+    'aggiudicazioni': 'aggiudicazioni_json', 
+    'avvio-contratto': 'avvio-contratto_json',
+    'bandi-cig': 'bandi-cig-modalita-realizzazio_json',  # o simile
+    'bando_cig': 'bando_cig_json',
+    'categorie-dpcm': 'categorie-dpcm-aggregazione_json',
+    'categorie-opera': 'categorie-opera_json',
+    'centri-di-costo': 'centri-di-costo_json',
+    'collaudo': 'collaudo_json',
+    'cup': 'cup_json',
+    'fine-contratto': 'fine-contratto_json',
+    'fonti-finanziamento': 'fonti-finanziamento_json',
+    'indicatori-pnrrpnc': 'indicatori-pnrrpnc_json',
+    'lavorazioni': 'lavorazioni_json',
+    'misurepremiali-pnrrpnc': 'misurepremiali-pnrrpnc_json',
+    'partecipanti': 'partecipanti_json',
+    'pubblicazioni': 'pubblicazioni_json',
+    'quadro-economico': 'quadro-economico_json',
+    'smartcig': 'smartcig_json',
+    'sospensioni': 'sospensioni_json',
+    'stati-avanzamento': 'stati-avanzamento_json',
+    'stazioni-appaltanti': 'stazioni-appaltanti_json',
+    'subappalti': 'subappalti_json',
+    'varianti': 'varianti_json'
+}
+
+
+class FolderRouter:
+    """
+    Smistamento dei file nelle cartelle, compilato una volta per insieme di cartelle.
+
+    Produce le stesse decisioni di determine_target_folder con le tre regole in ordine:
+    1. parole chiave di FOLDER_MAPPINGS (la prima dell'elenco presente nel nome file)
+    2. parti del nome cartella (separate da '-') contenute nel nome file
+    3. parti del nome file (separate da '_', più di 3 caratteri) contenute nel nome cartella
+
+    Le tabelle delle regole sono precalcolate: le regole 1 e 2 sono un'unica lista di
+    sottostringhe in ordine di priorità (senza duplicati), la regola 3 un dizionario
+    sottostringa -> cartella.
+    """
+
+    def __init__(self, available_folders, mappings=None):
+        self.folders = list(available_folders)
+        mappings = FOLDER_MAPPINGS if mappings is None else mappings
+        folder_set = set(self.folders)
+
+        # Regole 1 e 2: (sottostringa del nome file, cartella) in ordine di priorità
+        self._substring_rules = [(keyword, folder) for keyword, folder in mappings.items() if folder in folder_set]
+        self._always_matching = None
+        folder_bases = [folder.lower().replace('_json', '') for folder in self.folders]
+        seen_parts = set()
+        for folder, base in zip(self.folders, folder_bases):
+            for part in base.split('-'):
+                if not part:
+                    # Una parte vuota è contenuta in qualsiasi nome file: le cartelle successive
+                    # non possono più essere scelte dalla regola 2
+                    self._always_matching = folder
+                    break
+                if part not in seen_parts:
+                    seen_parts.add(part)
+                    self._substring_rules.append((part, folder))
+            if self._always_matching is not None:
+                break
+
+        # Regola 3: ogni sottostringa (> 3 caratteri) dei nomi cartella punta alla prima cartella
+        self._substring_owner = {}
+        for index, base in enumerate(folder_bases):
+            for start in range(len(base)):
+                for end in range(start + 4, len(base) + 1):
+                    self._substring_owner.setdefault(base[start:end], index)
+
+    def route(self, filename):
+        """Nome della cartella di destinazione per il file, o None se non trovata."""
+        return self._route(filename.lower())
+
+    def _route(self, filename_lower):
+        for substring, folder in self._substring_rules:
+            if substring in filename_lower:
+                return folder
+        if self._always_matching is not None:
+            return self._always_matching
+
+        file_parts = filename_lower.replace('.json', '').replace('.zip', '').split('_')
+        owners = [self._substring_owner[part] for part in file_parts
+                  if len(part) > 3 and part in self._substring_owner]
+        if owners:
+            return self.folders[min(owners)]
+        return None
+
+
+_router_lock = threading.Lock()
+_router = None
+
+
+def get_folder_router(available_folders):
+    """Router condiviso, ricompilato solo quando cambia l'elenco delle cartelle."""
+    global _router
+    with _router_lock:
+        if _router is None or _router.folders != list(available_folders):
+            _router = FolderRouter(available_folders)
+        return _router
+
+
 def determine_target_folder(filename, available_folders):
     """
     Determina la cartella di destinazione per un file basandosi sul nome del file
@@ -425,62 +639,7 @@ def determine_target_folder(filename, available_folders):
     Returns:
         str: Nome della cartella di destinazione, o None se non trovata
     """
-    filename_lower = filename.lower()
-    
-    # Mapping esplicito per pattern comuni
-    folder_mappings = {
-        'aggiudicatari': 'aggiudicatari_json',
-        'aggiudicazioni': 'aggiudicazioni_json', 
-        'avvio-contratto': 'avvio-contratto_json',
-        'bandi-cig': 'bandi-cig-modalita-realizzazio_json',  # o simile
-        'bando_cig': 'bando_cig_json',
-        'categorie-dpcm': 'categorie-dpcm-aggregazione_json',
-        'categorie-opera': 'categorie-opera_json',
-        'centri-di-costo': 'centri-di-costo_json',
-        'collaudo': 'collaudo_json',
-        'cup': 'cup_json',
-        'fine-contratto': 'fine-contratto_json',
-        'fonti-finanziamento': 'fonti-finanziamento_json',
-        'indicatori-pnrrpnc': 'indicatori-pnrrpnc_json',
-        'lavorazioni': 'lavorazioni_json',
-        'misurepremiali-pnrrpnc': 'misurepremiali-pnrrpnc_json',
-        'partecipanti': 'partecipanti_json',
-        'pubblicazioni': 'pubblicazioni_json',
-        'quadro-economico': 'quadro-economico_json',
-        'smartcig': 'smartcig_json',
-        'sospensioni': 'sospensioni_json',
-        'stati-avanzamento': 'stati-avanzamento_json',
-        'stazioni-appaltanti': 'stazioni-appaltanti_json',
-        'subappalti': 'subappalti_json',
-        'varianti': 'varianti_json'
-    }
-    
-    # Cerca corrispondenze esatte
-    for keyword, folder_name in folder_mappings.items():
-        if keyword in filename_lower and folder_name in available_folders:
-            return folder_name
-    
-    # Cerca corrispondenze parziali nelle cartelle disponibili
-    for folder in available_folders:
-        folder_lower = folder.lower()
-        # Rimuovi il suffisso _json per il confronto
-        folder_base = folder_lower.replace('_json', '')
-        
-        # Controlla se il nome del file contiene parti del nome della cartella
-        if any(part in filename_lower for part in folder_base.split('-')):
-            return folder
-    
-    # Se non trova corrispondenze, cerca cartelle che contengono parti del nome del file
-    for folder in available_folders:
-        folder_lower = folder.lower().replace('_json', '')
-        # Estrai parti significative dal nome del file
-        file_parts = filename_lower.replace('.json', '').replace('.zip', '').split('_')
-        
-        for part in file_parts:
-            if len(part) > 3 and part in folder_lower:
-                return folder
-    
-    return None
+    return get_folder_router(available_folders).route(filename)
 
 def should_skip_download(filename, existing_files):
     """
@@ -488,11 +647,18 @@ def should_skip_download(filename, existing_files):
     
     Args:
         filename: Nome del file da verificare
-        existing_files: Dict dei file esistenti {filename: folder_path}
+        existing_files: Dict dei file esistenti {filename: folder_path}, un
+                        ExistingFilesIndex o un FileCatalog (ricerca indicizzata)
         
     Returns:
         tuple: (should_skip: bool, existing_path: str or None)
     """
+    # Indice in memoria o catalogo persistente: ricerca per nome e per nome
+    # senza estensione in tempo costante
+    if hasattr(existing_files, 'lookup'):
+        existing_path = existing_files.lookup(filename)
+        return existing_path is not None, existing_path
+    
     # Controllo diretto
     if filename in existing_files:
         return True, existing_files[filename]
@@ -0,0 +1,320 @@
+import json
+import codecs
+import zipfile
+
+# Dimensione oltre la quale un oggetto JSON di primo livello non viene decodificato
+# per intero ma visitato membro per membro (es. {"releases": [...]} da diversi GB).
+# Tenuta bassa: un tentativo fallito costa una decodifica parziale di questa dimensione.
+DEFAULT_MAX_BUFFERED_VALUE = 1048576
+
+_WHITESPACE = ' \t\n\r'
+_NUMBER_START = '-0123456789'
+_NUMBER_CHARS = frozenset('+-.eE0123456789')
+
+
+class JsonSyntaxError(Exception):
+    """
+    Errore di sintassi JSON, con la posizione (carattere nel buffer) in cui è stato trovato
+    oppure, per gli errori di codifica, direttamente l'offset in byte nel file.
+    """
+
+    def __init__(self, message, pos, byte_offset=None):
+        super().__init__(message)
+        self.pos = pos
+        self.byte_offset = byte_offset
+
+
+def _reject_constant(name):
+    raise ValueError(f"Valore non ammesso in JSON: {name}")
+
+
+class _JsonStreamValidator:
+    """
+    Validatore JSON a memoria costante.
+
+    Il file viene letto a blocchi e decodificato un record alla volta con il decoder
+    C di json (raw_decode); solo la struttura esterna (array principale o oggetto
+    principale molto grande) è analizzata carattere per carattere. La memoria usata
+    dipende dalla dimensione del record più grande, non da quella del file.
+
+    Record:
+    - gli elementi di un array di primo livello
+    - gli elementi degli array contenuti in un oggetto di primo livello troppo grande
+      per essere decodificato per intero (o l'oggetto stesso, se non contiene array)
+    - ogni valore di primo livello negli altri casi (un oggetto singolo, o NDJSON)
+    """
+
+    def __init__(self, stream, chunk_size=1048576, max_buffered_value=DEFAULT_MAX_BUFFERED_VALUE):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.max_buffered_value = max_buffered_value
+        self.decoder = json.JSONDecoder(parse_constant=_reject_constant)
+        self.utf8 = codecs.getincrementaldecoder('utf-8')()
+        self.buf = ''
+        self.pos = 0
+        self.consumed_bytes = 0  # byte del file che precedono buf[0]
+        self.bytes_read = 0
+        self.eof = False
+        self.started = False
+        self.records = 0
+
+    # --- lettura e buffer ---
+
+    def _fill(self):
+        """Aggiunge un blocco al buffer. Restituisce False a fine file."""
+        if self.eof:
+            return False
+        data = self.stream.read(self.chunk_size)
+        try:
+            text = self.utf8.decode(data, final=not data)
+        except UnicodeDecodeError as e:
+            raise JsonSyntaxError(f"Codifica UTF-8 non valida: {e.reason}", None, self.bytes_read + e.start) from e
+        finally:
+            self.bytes_read += len(data)
+        if not data:
+            self.eof = True
+        # BOM UTF-8 iniziale, anche se diviso tra più blocchi (il decoder lo restituisce intero)
+        if text and not self.started:
+            self.started = True
+            if text[0] == '\ufeff':
+                text = text[1:]
+                self.consumed_bytes += len(codecs.BOM_UTF8)
+        self.buf += text
+        return bool(data)
+
+    def _compact(self):
+        """Scarta la parte di buffer già validata."""
+        if self.pos > self.chunk_size:
+            self.consumed_bytes += len(self.buf[:self.pos].encode('utf-8'))
+            self.buf = self.buf[self.pos:]
+            self.pos = 0
+
+    def byte_offset(self, pos):
+        """Offset in byte nel file del carattere buf[pos]."""
+        return self.consumed_bytes + len(self.buf[:pos].encode('utf-8'))
+
+    def _peek(self):
+        """Primo carattere non di spaziatura, o '' a fine file."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ''
+
+    def _expect(self, allowed, context):
+        char = self._peek()
+        if char == '' or char not in allowed:
+            found = repr(char) if char else 'fine del file'
+            expected = ' o '.join(repr(c) for c in allowed)
+            raise JsonSyntaxError(f"Atteso {expected} {context}, trovato {found}", self.pos)
+        self.pos += 1
+        return char
+
+    # --- decodifica dei valori ---
+
+    def _decode_value(self, limit=None):
+        """
+        Decodifica il valore che inizia in buf[pos] e avanza oltre.
+
+        Returns:
+            bool: True se decodificato, False se supera `limit` caratteri (nulla consumato)
+        """
+        if self._peek() == '':
+            raise JsonSyntaxError("Valore atteso, trovato fine del file", self.pos)
+        while True:
+            try:
+                _, end = self.decoder.raw_decode(self.buf, self.pos)
+                # Un numero seguito solo da caratteri di numero fino a fine buffer (es. "4." o "1e")
+                # potrebbe continuare nel blocco successivo
+                if self.buf[self.pos] in _NUMBER_START and not self.eof and self._number_may_continue(end):
+                    raise json.JSONDecodeError("Numero incompleto", self.buf, len(self.buf))
+                self.pos = end
+                return True
+            except json.JSONDecodeError as e:
+                incomplete = e.pos >= len(self.buf) - 16 or e.msg.startswith('Unterminated string')
+                if self.eof or not incomplete:
+                    raise JsonSyntaxError(e.msg, e.pos)
+            except ValueError as e:
+                raise JsonSyntaxError(str(e), self.pos)
+
+            if limit is not None and len(self.buf) - self.pos > limit:
+                return False
+            # Raddoppia il testo disponibile prima di riprovare: costo lineare anche per record grandi
+            target = 2 * (len(self.buf) - self.pos) + self.chunk_size
+            if limit is not None:
+                target = min(target, limit + 1)
+            while len(self.buf) - self.pos < target and self._fill():
+                pass
+
+    def _number_may_continue(self, end):
+        """True se dopo buf[end] ci sono solo caratteri che possono far parte di un numero."""
+        buf = self.buf
+        while end < len(buf):
+            if buf[end] not in _NUMBER_CHARS:
+                return False
+            end += 1
+        return True
+
+    def _validate_array_records(self):
+        """Valida un array (dopo '[') contando i suoi elementi come record."""
+        if self._peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            self._decode_value()
+            self.records += 1
+            self._compact()
+            if self._expect(',]', "dopo un elemento dell'array") == ']':
+                return
+
+    def _validate_object_members(self):
+        """Valida un oggetto (dopo '{') membro per membro, senza decodificarlo per intero."""
+        if self._peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            if self._peek() != '"':
+                raise JsonSyntaxError("Attesa una chiave tra virgolette", self.pos)
+            self._decode_value()
+            self._expect(':', "dopo la chiave")
+            if self._peek() == '[':
+                self.pos += 1
+                self._validate_array_records()
+            else:
+                self._decode_value()
+            self._compact()
+            if self._expect(',}', "dopo un membro dell'oggetto") == '}':
+                return
+
+    def run(self):
+        """
+        Returns:
+            dict: {'format', 'records'}; solleva JsonSyntaxError al primo errore
+        """
+        top_level_values = 0
+        first = None
+        while True:
+            char = self._peek()
+            if char == '':
+                break
+            top_level_values += 1
+            first = first or char
+            if char == '[':
+                self.pos += 1
+                self._validate_array_records()
+            elif char == '{':
+                if self._decode_value(limit=self.max_buffered_value):
+                    self.records += 1
+                else:
+                    records_before = self.records
+                    self.pos += 1
+                    self._validate_object_members()
+                    if self.records == records_before:
+                        self.records += 1
+            else:
+                self._decode_value()
+                self.records += 1
+            self._compact()
+
+        if top_level_values == 0:
+            raise JsonSyntaxError("File JSON vuoto", self.pos)
+        if top_level_values > 1:
+            return {'format': 'ndjson', 'records': self.records}
+        return {'format': 'array' if first == '[' else 'object', 'records': self.records}
+
+
+def validate_json_stream(stream, chunk_size=1048576, max_buffered_value=DEFAULT_MAX_BUFFERED_VALUE):
+    """
+    Valida in streaming un file JSON (array, oggetto o NDJSON) aperto in modalità binaria.
+
+    Returns:
+        dict: {'valid', 'format', 'records', 'bytes', 'error', 'error_offset'}
+              error_offset è l'offset in byte del primo errore di sintassi
+    """
+    validator = _JsonStreamValidator(stream, chunk_size, max_buffered_value)
+    result = {'valid': False, 'format': None, 'records': 0, 'bytes': 0, 'error': None, 'error_offset': None}
+    try:
+        result.update(validator.run())
+        result['valid'] = True
+    except JsonSyntaxError as e:
+        result['error'] = str(e)
+        result['error_offset'] = e.byte_offset if e.byte_offset is not None else validator.byte_offset(e.pos)
+        result['records'] = validator.records
+    except Exception as e:
+        # Errori di lettura (es. CRC di un membro ZIP): l'offset è la posizione di lettura
+        result['error'] = f"Errore di lettura: {e}"
+        result['error_offset'] = validator.bytes_read
+        result['records'] = validator.records
+    result['bytes'] = validator.bytes_read
+    return result
+
+
+def validate_json_file(file_path, chunk_size=1048576):
+    """Valida un file JSON su disco a memoria costante."""
+    with open(file_path, 'rb') as f:
+        return validate_json_stream(f, chunk_size)
+
+
+def validate_zip_members(zip_path, chunk_size=1048576):
+    """
+    Valida i membri di un archivio ZIP senza estrarli: i membri .json sono analizzati
+    in streaming, gli altri letti per intero (verifica del CRC).
+
+    Returns:
+        dict: {'valid', 'members', 'json_members', 'records', 'invalid_members', 'error'}
+              invalid_members: lista di {'name', 'error', 'error_offset'}
+    """
+    result = {'valid': False, 'members': 0, 'json_members': 0, 'records': 0,
+              'invalid_members': [], 'error': None}
+    try:
+        with zipfile.ZipFile(zip_path) as zip_ref:
+            for info in zip_ref.infolist():
+                if info.is_dir():
+                    continue
+                result['members'] += 1
+                with zip_ref.open(info) as member:
+                    if info.filename.lower().endswith('.json'):
+                        result['json_members'] += 1
+                        member_result = validate_json_stream(member, chunk_size)
+                        result['records'] += member_result['records']
+                        if not member_result['valid']:
+                            result['invalid_members'].append({
+                                'name': info.filename,
+                                'error': member_result['error'],
+                                'error_offset': member_result['error_offset']
+                            })
+                        continue
+                    try:
+                        while member.read(chunk_size):
+                            pass
+                    except Exception as e:
+                        result['invalid_members'].append({'name': info.filename, 'error': str(e), 'error_offset': None})
+    except zipfile.BadZipFile as e:
+        result['error'] = f"ZIP non valido: {e}"
+        return result
+    except Exception as e:
+        result['error'] = str(e)
+        return result
+
+    result['valid'] = not result['invalid_members']
+    if not result['valid']:
+        first = result['invalid_members'][0]
+        result['error'] = f"{len(result['invalid_members'])} membri non validi, es. {first['name']}: {first['error']}"
+    return result
+
+
+def deep_validate(file_path, chunk_size=1048576):
+    """
+    Validazione approfondita di un file in base all'estensione (.json o .zip).
+
+    Returns:
+        dict or None: Risultato della validazione, None per gli altri tipi di file
+    """
+    lower = file_path.lower()
+    if lower.endswith('.json'):
+        return validate_json_file(file_path, chunk_size)
+    if lower.endswith('.zip'):
+        return validate_zip_members(file_path, chunk_size)
+    return None
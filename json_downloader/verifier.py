@@ -0,0 +1,224 @@
+import os
+import json
+import time
+import zipfile
+import threading
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from .utils import ensure_dir
+from .hash_cache import get_hash_cache
+from .validation import deep_validate
+from .downloader import PART_SUFFIX, RESUME_SUFFIX
+
+# File dei download in corso, da non verificare
+_PARTIAL_SUFFIXES = (PART_SUFFIX, RESUME_SUFFIX, RESUME_SUFFIX + '.tmp')
+
+# Semaforo di I/O condiviso dai processi del pool, impostato dall'initializer
+_process_io_semaphore = None
+
+
+def _init_worker(io_semaphore):
+    """Inizializzazione dei processi del pool: condividono il semaforo di I/O."""
+    global _process_io_semaphore
+    _process_io_semaphore = io_semaphore
+
+
+def _verify_in_process(file_path, check_zip, deep):
+    return verify_file(file_path, check_zip, _process_io_semaphore, deep)
+
+
+def get_verify_options(config):
+    """
+    Legge dalla configurazione i parametri della verifica.
+
+    Returns:
+        dict: kwargs da passare a iter_verify / verify_files
+    """
+    config = config or {}
+    return {
+        'workers': max(1, int(config.get('verify_workers', os.cpu_count() or 1))),
+        'io_concurrency': max(1, int(config.get('verify_io_concurrency', 4))),
+        'use_processes': bool(config.get('verify_use_processes', False)),
+        'check_zip': bool(config.get('verify_zip_crc', True)),
+        'deep': bool(config.get('verify_deep', False)),
+    }
+
+
+def collect_files(root, extensions=None, recursive=True, exclude_dirs=('reports',)):
+    """
+    Elenca i file da verificare, esclusi i download non ancora completati
+    (file .part e relativi record di ripresa).
+
+    Args:
+        root: Cartella da cui partire
+        extensions: Estensioni da includere (es. ('.json', '.zip')), None per tutte
+        recursive: Se scendere nelle sottocartelle
+        exclude_dirs: Nomi di cartelle da ignorare
+    """
+    extensions = tuple(ext.lower() for ext in extensions) if extensions else None
+    files = []
+    for current, dirs, names in os.walk(root):
+        dirs[:] = [d for d in dirs if d not in exclude_dirs] if recursive else []
+        for name in names:
+            if name.endswith(_PARTIAL_SUFFIXES):
+                continue
+            if extensions is None or name.lower().endswith(extensions):
+                files.append(os.path.join(current, name))
+    return files
+
+
+def verify_file(file_path, check_zip=True, io_semaphore=None, deep=False):
+    """
+    Verifica un singolo file: esistenza, dimensione non nulla, SHA256 (dalla cache
+    se il file non è cambiato) e, per gli ZIP, CRC di tutti i membri.
+    Se io_semaphore è indicato, la lettura del file avviene solo dopo averlo acquisito.
+    Con deep=True i file JSON (anche dentro gli ZIP) sono validati in streaming.
+
+    Returns:
+        dict: {'path', 'valid', 'size', 'sha256', 'error', 'elapsed'} più, in modalità
+              deep, 'records', 'error_offset' (JSON) o 'invalid_members' (ZIP)
+    """
+    start = time.time()
+    result = {'path': file_path, 'valid': False, 'size': None, 'sha256': None, 'error': None}
+    try:
+        if not os.path.isfile(file_path):
+            result['error'] = 'File non trovato'
+            return result
+
+        result['size'] = os.path.getsize(file_path)
+        if result['size'] == 0:
+            result['error'] = 'File vuoto'
+            return result
+
+        if io_semaphore is not None:
+            io_semaphore.acquire()
+        try:
+            result['sha256'] = get_hash_cache().file_hash(file_path)[0]
+
+            validation = deep_validate(file_path) if deep else None
+            if validation is not None:
+                # La lettura completa dei membri ZIP verifica anche i CRC
+                result['records'] = validation['records']
+                if 'invalid_members' in validation:
+                    result['invalid_members'] = validation['invalid_members']
+                else:
+                    result['error_offset'] = validation['error_offset']
+                if not validation['valid']:
+                    result['error'] = validation['error']
+                    return result
+            elif check_zip and file_path.lower().endswith('.zip'):
+                with zipfile.ZipFile(file_path) as zip_ref:
+                    bad_member = zip_ref.testzip()
+                if bad_member:
+                    result['error'] = f"CRC errato nel membro {bad_member}"
+                    return result
+        finally:
+            if io_semaphore is not None:
+                io_semaphore.release()
+
+        result['valid'] = True
+    except zipfile.BadZipFile as e:
+        result['error'] = f"ZIP non valido: {e}"
+    except Exception as e:
+        result['error'] = str(e)
+    finally:
+        result['elapsed'] = round(time.time() - start, 3)
+    return result
+
+
+def iter_verify(paths, workers=4, io_concurrency=4, use_processes=False, check_zip=True, deep=False):
+    """
+    Verifica i file su un pool di thread o processi e restituisce i risultati
+    man mano che sono pronti (non nell'ordine di `paths`).
+
+    Args:
+        paths: Percorsi dei file da verificare
+        workers: Numero di worker del pool
+        io_concurrency: Numero massimo di file letti contemporaneamente dal disco
+        use_processes: Se usare processi invece di thread (utile se la CPU è il collo di bottiglia)
+        check_zip: Se verificare i CRC dei membri degli archivi ZIP
+        deep: Se validare in streaming il contenuto JSON (file e membri ZIP)
+
+    Yields:
+        dict: Risultato di verify_file per ogni file
+    """
+    paths = list(paths)
+    if not paths:
+        return
+
+    workers = max(1, min(int(workers or 1), len(paths)))
+    if use_processes:
+        semaphore = multiprocessing.BoundedSemaphore(io_concurrency)
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(semaphore,))
+        submit = lambda path: executor.submit(_verify_in_process, path, check_zip, deep)
+    else:
+        semaphore = threading.BoundedSemaphore(io_concurrency)
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='verify')
+        submit = lambda path: executor.submit(verify_file, path, check_zip, semaphore, deep)
+
+    # Sottomette i file a finestre: la memoria resta limitata anche con centinaia di migliaia di file
+    window = workers * 4
+    pending = set()
+    next_index = 0
+    with executor:
+        while next_index < len(paths) or pending:
+            while next_index < len(paths) and len(pending) < window:
+                pending.add(submit(paths[next_index]))
+                next_index += 1
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+
+def verify_files(paths, workers=4, io_concurrency=4, use_processes=False, check_zip=True,
+                 deep=False, on_result=None, logger=None):
+    """
+    Verifica un insieme di file in parallelo.
+
+    Args:
+        on_result: Callback on_result(done, total, result) chiamata nel thread principale
+                   per ogni file verificato
+
+    Returns:
+        dict: Riepilogo con chiavi 'total', 'valid', 'invalid', 'elapsed', 'files'
+    """
+    paths = list(paths)
+    start = time.time()
+    results = []
+
+    if logger:
+        logger.info(f"Verifica di {len(paths)} file con {workers} worker "
+                    f"({'processi' if use_processes else 'thread'}, max {io_concurrency} letture simultanee)")
+
+    for result in iter_verify(paths, workers, io_concurrency, use_processes, check_zip, deep):
+        results.append(result)
+        if logger and not result['valid']:
+            logger.warning(f"File non valido {result['path']}: {result['error']}")
+        if on_result:
+            on_result(len(results), len(paths), result)
+
+    results.sort(key=lambda r: r['path'])
+    valid = sum(1 for r in results if r['valid'])
+    summary = {
+        'total': len(results),
+        'valid': valid,
+        'invalid': len(results) - valid,
+        'elapsed': round(time.time() - start, 3),
+        'files': results
+    }
+    if deep:
+        summary['records'] = sum(r.get('records') or 0 for r in results)
+    return summary
+
+
+def save_verification_report(summary, report_dir, root=None):
+    """Salva il riepilogo della verifica in un report JSON e ne restituisce il percorso."""
+    ensure_dir(report_dir)
+    report_path = os.path.join(report_dir, f"verify_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    report = {'timestamp': datetime.now().isoformat(), 'root': root}
+    report.update(summary)
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    return report_path
@@ -0,0 +1,358 @@
+import os
+import zlib
+import struct
+import zipfile
+
+from .utils import extract_zip_files
+from .extraction import member_target_path
+
+_LOCAL_HEADER = struct.Struct('<IHHHHHIIIHH')
+_LOCAL_HEADER_SIGNATURE = 0x04034b50
+_DATA_DESCRIPTOR_SIGNATURE = 0x08074b50
+# Firme che seguono l'ultimo membro: directory centrale, record zip64 e fine archivio
+_END_SIGNATURES = (0x02014b50, 0x06064b50, 0x06054b50, 0x08064b50)
+
+_FLAG_ENCRYPTED = 0x01
+_FLAG_DATA_DESCRIPTOR = 0x08
+_FLAG_UTF8 = 0x800
+
+# Byte decompressi prodotti per ogni chiamata a zlib: limita la memoria anche con
+# rapporti di compressione molto alti (JSON ripetitivi)
+_MAX_OUTPUT_CHUNK = 4 * 1048576
+
+
+class StreamingZipExtractor:
+    """
+    Estrae i membri di un archivio ZIP mentre l'archivio viene scaricato.
+
+    Riceve i blocchi nello stesso ordine in cui sono scritti su disco (feed), legge le
+    intestazioni locali dei membri e decomprime al volo quelli selezionati dal filtro,
+    verificandone il CRC. In questo modo l'archivio non deve essere riletto dal disco
+    per l'estrazione.
+
+    Se l'archivio usa funzionalità non gestibili in streaming (cifratura, metodi diversi
+    da store/deflate, membri store con data descriptor) o se il flusso non è continuo
+    (download ripreso in un altro processo, download a segmenti), l'estrattore si
+    disattiva e finish() restituisce None: il chiamante ripiega sull'estrazione classica.
+    """
+
+    def __init__(self, extract_dir, member_filter=None, logger=None):
+        self.extract_dir = extract_dir
+        self.member_filter = member_filter or (lambda name: name.endswith('.json'))
+        self.logger = logger
+        self._reset()
+
+    def _reset(self):
+        self._buf = bytearray()
+        self.bytes_fed = 0
+        self.failed = None
+        self.done = False
+        self.extracted = []
+        self.extracted_names = []
+        self.written_bytes = 0
+        self.total_members = None
+        self._member = None
+
+    # --- interfaccia verso download_file ---
+
+    def feed(self, offset, data):
+        """
+        Elabora il blocco che inizia all'offset `offset` dell'archivio.
+        Non solleva eccezioni: un errore disattiva l'estrattore.
+        """
+        if offset != self.bytes_fed:
+            if offset == 0:
+                # Download ricominciato da capo: si riparte anche con l'estrazione
+                self._discard_member()
+                self._reset()
+            elif not self.failed:
+                self._fail(f"flusso non continuo (offset {offset}, attesi {self.bytes_fed})")
+        if self.failed:
+            return
+        self.bytes_fed += len(data)
+        if self.done:
+            return
+        try:
+            self._buf += data
+            self._process()
+        except Exception as e:
+            self._fail(str(e))
+
+    def finish(self, zip_path):
+        """
+        Conclude l'estrazione dopo il download completo di zip_path.
+
+        Returns:
+            list or None: Percorsi dei file estratti, None se l'estrazione in streaming
+                          non è completa e va eseguita quella classica
+        """
+        if not self.failed:
+            try:
+                if self.bytes_fed != os.path.getsize(zip_path):
+                    self._fail(f"ricevuti {self.bytes_fed} byte su {os.path.getsize(zip_path)}")
+                elif not self.done:
+                    self._fail("directory centrale non raggiunta")
+                else:
+                    # La directory centrale è l'elenco autorevole dei membri: la legge
+                    # ZipFile dalla fine del file, senza rileggere i dati compressi
+                    with zipfile.ZipFile(zip_path) as zip_ref:
+                        names = zip_ref.namelist()
+                    self.total_members = len(names)
+                    expected = [name for name in names if self.member_filter(name)]
+                    if sorted(expected) != sorted(self.extracted_names):
+                        self._fail("membri diversi da quelli della directory centrale")
+                    elif not expected:
+                        self._fail("nessun membro da estrarre")
+            except Exception as e:
+                self._fail(str(e))
+
+        if self.failed:
+            return None
+        if self.logger:
+            self.logger.info(f"Estratti in streaming {len(self.extracted)} file da {os.path.basename(zip_path)} "
+                             f"({self.written_bytes} byte scritti)")
+        return list(self.extracted)
+
+    def abort(self, reason="download non riuscito"):
+        """
+        Da chiamare quando il download fallisce: rimuove il file parziale del membro in
+        corso. Il nuovo tentativo riparte dall'offset già scaricato e usa un nuovo
+        estrattore, che ripiega sull'estrazione classica.
+        """
+        if not self.failed:
+            self._fail(reason)
+        else:
+            self._discard_member()
+
+    # --- analisi del flusso ---
+
+    def _fail(self, reason):
+        self.failed = reason
+        self._discard_member()
+        self._buf = bytearray()
+        print(f"DEBUG_DOWN: Estrazione in streaming disattivata: {reason}")
+        if self.logger:
+            self.logger.debug(f"Estrazione in streaming non disponibile per {self.extract_dir}: {reason}")
+
+    def _process(self):
+        while not self.done:
+            if self._member is None:
+                if not self._read_local_header():
+                    return
+            elif not self._read_member_data():
+                return
+
+    def _read_local_header(self):
+        """Legge l'intestazione del membro successivo. False se servono altri dati."""
+        if len(self._buf) < 4:
+            return False
+        signature = struct.unpack_from('<I', self._buf)[0]
+        if signature in _END_SIGNATURES:
+            self.done = True
+            self._buf = bytearray()
+            return False
+        if signature != _LOCAL_HEADER_SIGNATURE:
+            raise ValueError(f"firma ZIP inattesa 0x{signature:08x}")
+        if len(self._buf) < _LOCAL_HEADER.size:
+            return False
+
+        (_, _, flags, method, _, _, crc, compressed_size, file_size,
+         name_length, extra_length) = _LOCAL_HEADER.unpack_from(self._buf)
+        header_size = _LOCAL_HEADER.size + name_length + extra_length
+        if len(self._buf) < header_size:
+            return False
+
+        raw_name = bytes(self._buf[_LOCAL_HEADER.size:_LOCAL_HEADER.size + name_length])
+        extra = bytes(self._buf[_LOCAL_HEADER.size + name_length:header_size])
+        del self._buf[:header_size]
+
+        # Stessa decodifica del nome usata da zipfile
+        name = raw_name.decode('utf-8' if flags & _FLAG_UTF8 else 'cp437')
+        if os.sep != '/':
+            name = name.replace(os.sep, '/')
+
+        if flags & _FLAG_ENCRYPTED:
+            raise ValueError(f"membro cifrato {name}")
+        if method not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+            raise ValueError(f"metodo di compressione {method} non supportato ({name})")
+
+        has_descriptor = bool(flags & _FLAG_DATA_DESCRIPTOR)
+        # Con il campo zip64 anche le dimensioni del data descriptor sono a 8 byte
+        zip64_values = self._zip64_extra(extra)
+        zip64 = zip64_values is not None
+        if zip64 and file_size == 0xFFFFFFFF and zip64_values:
+            file_size = zip64_values.pop(0)
+        if zip64 and compressed_size == 0xFFFFFFFF and zip64_values:
+            compressed_size = zip64_values.pop(0)
+        if has_descriptor and method == zipfile.ZIP_STORED:
+            raise ValueError(f"membro non compresso con data descriptor ({name})")
+
+        self._member = {
+            'name': name,
+            'method': method,
+            'crc': crc,
+            'file_size': file_size,
+            'remaining': None if has_descriptor else compressed_size,
+            'has_descriptor': has_descriptor,
+            'zip64': zip64,
+            'decompressor': zlib.decompressobj(-15) if method == zipfile.ZIP_DEFLATED else None,
+            'running_crc': 0,
+            'written': 0,
+            'consumed': 0,
+            'file': None,
+            'path': None,
+        }
+        self._open_member_output()
+        return True
+
+    @staticmethod
+    def _zip64_extra(extra):
+        """Valori a 64 bit del campo extra zip64 (id 0x0001), None se assente."""
+        pos = 0
+        while pos + 4 <= len(extra):
+            field_id, field_size = struct.unpack_from('<HH', extra, pos)
+            if field_id == 0x0001:
+                data = extra[pos + 4:pos + 4 + field_size]
+                return [struct.unpack_from('<Q', data, i)[0] for i in range(0, len(data) - 7, 8)]
+            pos += 4 + field_size
+        return None
+
+    def _open_member_output(self):
+        member = self._member
+        if not self.member_filter(member['name']):
+            return
+        target = member_target_path(self.extract_dir, member['name'])
+        if member['name'].endswith('/'):
+            os.makedirs(target, exist_ok=True)
+            return
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        member['path'] = target
+        member['file'] = open(target + '.part', 'wb')
+
+    def _read_member_data(self):
+        """Elabora i dati compressi disponibili del membro corrente. False se servono altri dati."""
+        member = self._member
+        if member['remaining'] is not None:
+            take = min(member['remaining'], len(self._buf))
+            if take:
+                data = bytes(self._buf[:take])
+                del self._buf[:take]
+                member['remaining'] -= take
+                member['consumed'] += take
+                self._write_output(data)
+            if member['remaining'] > 0:
+                return False
+            if member['decompressor'] is not None:
+                self._drain(member['decompressor'].flush())
+            self._finish_member()
+            return True
+
+        # Data descriptor: la fine del membro è segnalata dal flusso deflate stesso
+        decompressor = member['decompressor']
+        if not decompressor.eof:
+            if not self._buf:
+                return False
+            data = bytes(self._buf)
+            self._buf = bytearray()
+            member['consumed'] += len(data)
+            self._write_output(data)
+            if not decompressor.eof:
+                return False
+            # I byte oltre la fine del flusso appartengono al data descriptor
+            self._buf = bytearray(decompressor.unused_data)
+            member['consumed'] -= len(decompressor.unused_data)
+        return self._read_data_descriptor()
+
+    def _read_data_descriptor(self):
+        member = self._member
+        size_format = '<QQ' if member['zip64'] else '<II'
+        descriptor_size = 4 + struct.calcsize(size_format)
+        if len(self._buf) < descriptor_size + 4:
+            return False
+        start = 4 if struct.unpack_from('<I', self._buf)[0] == _DATA_DESCRIPTOR_SIGNATURE else 0
+        crc = struct.unpack_from('<I', self._buf, start)[0]
+        compressed_size, file_size = struct.unpack_from(size_format, self._buf, start + 4)
+        del self._buf[:start + descriptor_size]
+        if compressed_size != member['consumed']:
+            raise ValueError(f"data descriptor non coerente per {member['name']}")
+        member['crc'] = crc
+        member['file_size'] = file_size
+        self._finish_member()
+        return True
+
+    def _write_output(self, data):
+        member = self._member
+        decompressor = member['decompressor']
+        if decompressor is None:
+            self._drain(data)
+            return
+        self._drain(decompressor.decompress(data, _MAX_OUTPUT_CHUNK))
+        while decompressor.unconsumed_tail and not decompressor.eof:
+            self._drain(decompressor.decompress(decompressor.unconsumed_tail, _MAX_OUTPUT_CHUNK))
+
+    def _drain(self, output):
+        if not output:
+            return
+        member = self._member
+        member['running_crc'] = zlib.crc32(output, member['running_crc'])
+        member['written'] += len(output)
+        if member['file'] is not None:
+            member['file'].write(output)
+
+    def _finish_member(self):
+        member = self._member
+        self._member = None
+        if member['running_crc'] != member['crc'] or member['written'] != member['file_size']:
+            self._member = member
+            raise ValueError(f"CRC o dimensione errati per {member['name']}")
+        if member['file'] is not None:
+            member['file'].close()
+            os.replace(member['path'] + '.part', member['path'])
+            self.extracted.append(member['path'])
+            self.extracted_names.append(member['name'])
+            self.written_bytes += member['written']
+            if self.logger:
+                self.logger.info(f"Estratto file {member['name']} in streaming")
+        elif self.member_filter(member['name']):
+            # Cartella selezionata dal filtro: conta come membro estratto
+            self.extracted_names.append(member['name'])
+
+    def _discard_member(self):
+        """Chiude e rimuove il file parziale del membro in corso."""
+        member = self._member
+        self._member = None
+        if member and member['file'] is not None:
+            try:
+                member['file'].close()
+                os.remove(member['path'] + '.part')
+            except OSError:
+                pass
+
+
+def stream_extraction_enabled(config):
+    """True se la configurazione consente l'estrazione dei JSON durante il download."""
+    config = config or {}
+    return bool(config.get('stream_extraction', True)) and bool(config.get('extract_json_only', True))
+
+
+def create_stream_extractor(config, zip_path, extract_dir, member_filter=None, logger=None):
+    """
+    Estrattore in streaming per zip_path, o None se la modalità non è attiva
+    o il file non è un archivio ZIP.
+    """
+    if not zip_path.lower().endswith('.zip') or not stream_extraction_enabled(config):
+        return None
+    return StreamingZipExtractor(extract_dir, member_filter, logger)
+
+
+def extract_downloaded_zip(zip_path, extract_dir, logger=None, extractor=None, workers=None, use_processes=True):
+    """
+    Estrae i JSON di un archivio appena scaricato: usa il risultato dell'estrazione in
+    streaming se completa, altrimenti estrae dall'archivio su disco (extract_zip_files,
+    con workers e use_processes come in extraction.get_extract_options).
+    """
+    if extractor is not None:
+        extracted = extractor.finish(zip_path)
+        if extracted is not None:
+            return extracted
+    return extract_zip_files(zip_path, extract_dir, logger, workers, use_processes)
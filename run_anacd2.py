@@ -2,6 +2,10 @@
 """
 ANAC JSON Downloader - Launcher Script
 Avvia l'applicazione di download file JSON ANAC gestendo correttamente i percorsi e gli import
+
+Uso:
+    python3 run_anacd2.py            # menu interattivo
+    python3 run_anacd2.py --resume   # riprende l'ultimo download interrotto ed esce
 """
 
 import os
@@ -29,13 +33,13 @@ def setup_environment():
         print("  Windows: venv\\Scripts\\activate")
         print("  Linux/Mac: source venv/bin/activate")
 
-def run_cli():
+def run_cli(resume=False):
     """Run the CLI interface."""
     try:
         # First try importing as a package
         from json_downloader.cli import ANACDownloaderCLI
         cli = ANACDownloaderCLI()
-        cli.run()
+        cli.run(resume=resume)
     except ImportError as e:
         print(f"Errore di importazione: {e}")
         traceback.print_exc()
@@ -59,7 +63,7 @@ if __name__ == "__main__":
     
     # Run the application
     try:
-        run_cli()
+        run_cli(resume='--resume' in sys.argv[1:])
     except KeyboardInterrupt:
         print("\nOperazione interrotta dall'utente. Uscita.")
     except Exception as e:
@@ -26,6 +26,7 @@ setup(
     entry_points={
         "console_scripts": [
             "anac-downloader=json_downloader.main:main",
+            "anac-batch=json_downloader.batch:main",
         ],
     },
     include_package_data=True,
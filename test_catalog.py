@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Test del catalogo persistente dei file di /database/JSON e dell'indice in memoria
+usati per decidere se un download va saltato.
+"""
+
+import os
+import sys
+
+# Aggiungi la directory corrente al path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from json_downloader.catalog import FileCatalog
+
+
+def _make_tree(root, folders):
+    for folder, names in folders.items():
+        (root / folder).mkdir(parents=True, exist_ok=True)
+        for name in names:
+            (root / folder / name).write_text('{}')
+
+
+def test_catalogs_of_different_paths_do_not_wipe_each_other(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    _make_tree(tmp_path / "primo", {'bandi': ['bando_2023.json']})
+    _make_tree(tmp_path / "secondo", {'cig': ['cig_2024.zip']})
+
+    first = FileCatalog(str(tmp_path / "primo"))
+    first.sync()
+    second = FileCatalog(str(tmp_path / "secondo"))
+    second.sync()
+    assert first.db_file != second.db_file
+    first.close()
+    second.close()
+
+    # Riaperti (come dopo un cambio di percorso), i cataloghi conservano i propri file
+    first = FileCatalog(str(tmp_path / "primo"))
+    second = FileCatalog(str(tmp_path / "secondo"))
+    assert first.lookup('bando_2023.json') == str(tmp_path / "primo" / "bandi")
+    assert second.lookup('cig_2024.zip') == str(tmp_path / "secondo" / "cig")
+    assert 'cig_2024.zip' not in first
+
+
+def _catalog(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    root = tmp_path / "database"
+    _make_tree(root, {'bandi': ['bando_2023.json', 'bando_2024.json'], 'cig': ['cig_2024.zip']})
+    catalog = FileCatalog(str(root))
+    return root, catalog
+
+
+def test_initial_build(tmp_path, monkeypatch):
+    root, catalog = _catalog(tmp_path, monkeypatch)
+    stats = catalog.sync()
+    assert stats == {'folders_scanned': 2, 'folders_unchanged': 0, 'folders_removed': 0, 'files': 3}
+    assert catalog.folders() == ['bandi', 'cig']
+    assert catalog.lookup('bando_2024.json') == str(root / "bandi")
+
+    # Seconda sync senza modifiche: nessuna cartella riscansionata
+    stats = catalog.sync()
+    assert stats['folders_scanned'] == 0
+    assert stats['folders_unchanged'] == 2
+
+
+def test_add_file(tmp_path, monkeypatch):
+    root, catalog = _catalog(tmp_path, monkeypatch)
+    catalog.sync()
+    (root / "nuova").mkdir()
+    new_file = root / "nuova" / "smartcig.json"
+    new_file.write_text('[]')
+
+    assert catalog.add_file(str(new_file), sha256='abc')
+    assert catalog.get('smartcig.json')['sha256'] == 'abc'
+    assert 'nuova' in catalog.folders()
+    # I file fuori dalle cartelle di primo livello non vengono catalogati
+    assert not catalog.add_file(str(tmp_path / "altrove.json"))
+
+
+def test_folder_mtime_change_rescans_only_that_folder(tmp_path, monkeypatch):
+    root, catalog = _catalog(tmp_path, monkeypatch)
+    catalog.sync()
+    (root / "bandi" / "bando_2025.json").write_text('{}')
+    (root / "bandi" / "bando_2023.json").unlink()
+    stat = os.stat(root / "bandi")
+    os.utime(root / "bandi", ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    stats = catalog.sync()
+    assert stats['folders_scanned'] == 1
+    assert stats['folders_unchanged'] == 1
+    assert catalog.lookup('bando_2025.json') == str(root / "bandi")
+    assert catalog.lookup('bando_2023.json') is None
+
+
+def test_deleted_folder_is_removed(tmp_path, monkeypatch):
+    root, catalog = _catalog(tmp_path, monkeypatch)
+    catalog.sync()
+    (root / "cig" / "cig_2024.zip").unlink()
+    (root / "cig").rmdir()
+
+    stats = catalog.sync()
+    assert stats['folders_removed'] == 1
+    assert catalog.folders() == ['bandi']
+    assert 'cig_2024.zip' not in catalog
+
+
+def test_stem_lookup_and_skip_decision(tmp_path, monkeypatch):
+    from json_downloader.utils import should_skip_download
+
+    root, catalog = _catalog(tmp_path, monkeypatch)
+    catalog.sync()
+    # Un archivio già estratto risulta presente tramite il nome senza estensione
+    assert catalog.lookup('bando_2023.zip') == str(root / "bandi")
+    assert catalog.lookup('cig_2024.json') == str(root / "cig")
+    assert should_skip_download('cig_2024.zip', catalog) == (True, str(root / "cig"))
+    assert should_skip_download('ocds_2024.zip', catalog) == (False, None)
+
+
+def test_existing_files_index_lookup():
+    from json_downloader.utils import ExistingFilesIndex, should_skip_download
+
+    index = ExistingFilesIndex({'bando_2023.json': '/db/bandi', 'bando_2023.csv': '/db/altri'})
+    index['cig_2024.zip'] = '/db/cig'
+    assert index.lookup('bando_2023.json') == '/db/bandi'
+    # Per nome senza estensione vale il primo file inserito, come nella ricerca lineare
+    assert index.lookup('bando_2023.zip') == '/db/bandi'
+    assert index.lookup('cig_2024.json') == '/db/cig'
+    assert index.lookup('ocds.json') is None
+
+    del index['bando_2023.json']
+    assert index.lookup('bando_2023.zip') == '/db/altri'
+    index.pop('bando_2023.csv')
+    assert index.lookup('bando_2023.zip') is None
+    assert should_skip_download('cig_2024.json', index) == (True, '/db/cig')
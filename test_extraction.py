@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Test dell'estrazione parallela: il pool di processi non deve usare fork, perché
+l'estrazione viene avviata dai thread di download.
+"""
+
+import os
+import sys
+import zipfile
+import threading
+
+# Aggiungi la directory corrente al path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from json_downloader import extraction
+from json_downloader.extraction import extract_members, _get_pool, _discard_pool
+
+
+def _make_zip(path, count=6):
+    contents = {f"dati/anno_{n}.json": (f'[{{"anno": {n}}}]' * 200).encode('utf-8') for n in range(count)}
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zip_ref:
+        for name, data in contents.items():
+            zip_ref.writestr(name, data)
+    return contents
+
+
+def test_process_pool_does_not_fork():
+    pool = _get_pool(2, True)
+    try:
+        assert pool._mp_context.get_start_method() in ('forkserver', 'spawn')
+    finally:
+        _discard_pool(2, True)
+
+
+def test_process_extraction_from_worker_thread(tmp_path, monkeypatch):
+    monkeypatch.setattr(extraction, 'PARALLEL_MIN_SIZE', 0)
+    zip_path = str(tmp_path / 'archivio.zip')
+    contents = _make_zip(zip_path)
+    extract_dir = str(tmp_path / 'estratti')
+    outcome = {}
+
+    def run():
+        outcome['result'] = extract_members(zip_path, extract_dir, workers=2, use_processes=True)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    thread.join(timeout=60)
+    _discard_pool(2, True)
+
+    assert not thread.is_alive()
+    result = outcome['result']
+    assert result['workers'] == 2
+    assert len(result['extracted']) == len(contents)
+    assert not result['errors']
+    for name, data in contents.items():
+        with open(os.path.join(extract_dir, name), 'rb') as f:
+            assert f.read() == data
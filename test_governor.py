@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Test del governor delle richieste: Retry-After, rallentamento e recupero dopo un
+429, token bucket dei byte. Il tempo è simulato, nessun test attende davvero.
+"""
+
+import os
+import sys
+import time
+from email.utils import formatdate
+
+# Aggiungi la directory corrente al path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from json_downloader import governor as governor_module
+from json_downloader.governor import (RateGovernor, TokenBucket, parse_retry_after,
+                                      RECOVERY_INTERVAL, MAX_RETRY_AFTER)
+
+URL = "https://dati.anticorruzione.it/opendata/download/dataset/cig-2024.zip"
+
+
+class _FakeClock:
+    """Sostituisce il modulo time nel governor: sleep fa avanzare l'orologio."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return time.time()
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+def _governor(monkeypatch, **kwargs):
+    clock = _FakeClock()
+    monkeypatch.setattr(governor_module, 'time', clock)
+    return RateGovernor(**kwargs), clock
+
+
+def test_parse_retry_after_seconds():
+    assert parse_retry_after("120") == 120.0
+    assert parse_retry_after(" 1.5 ") == 1.5
+    assert parse_retry_after("-3") == 0.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("domani") is None
+
+
+def test_parse_retry_after_http_date():
+    value = formatdate(time.time() + 90, usegmt=True)
+    assert 85 <= parse_retry_after(value) <= 90
+    # Una data già passata non impone attese
+    assert parse_retry_after(formatdate(time.time() - 60, usegmt=True)) == 0.0
+
+
+def test_429_blocks_host_and_halves_rate(monkeypatch):
+    governor, clock = _governor(monkeypatch, requests_per_sec=4.0)
+    assert governor.observe(URL, 429, {'Retry-After': '30'}) == 30.0
+    assert governor.remaining_block(URL) == 30.0
+    assert governor.get_stats()['dati.anticorruzione.it']['rate_factor'] == 0.5
+
+    # La richiesta successiva attende la fine del blocco
+    assert governor.acquire_request(URL) == 30.0
+    assert clock.now == 1030.0
+    # Gli altri host non sono bloccati
+    assert governor.remaining_block("https://www.anticorruzione.it/") == 0.0
+
+
+def test_retry_after_is_capped_and_missing_header_grows(monkeypatch):
+    governor, _ = _governor(monkeypatch, requests_per_sec=4.0)
+    assert governor.observe(URL, 503, {'Retry-After': '3600'}) == MAX_RETRY_AFTER
+
+    governor, _ = _governor(monkeypatch, requests_per_sec=4.0)
+    first = governor.observe(URL, 429)
+    second = governor.observe(URL, 429)
+    assert second == 2 * first
+
+
+def test_recovery_after_interval(monkeypatch):
+    governor, clock = _governor(monkeypatch, requests_per_sec=4.0)
+    governor.observe(URL, 429, {'Retry-After': '1'})
+    governor.observe(URL, 429, {'Retry-After': '1'})
+    assert governor.get_stats()['dati.anticorruzione.it']['rate_factor'] == 0.25
+
+    # Prima di RECOVERY_INTERVAL una risposta riuscita non cambia la velocità
+    clock.now += RECOVERY_INTERVAL / 2
+    governor.observe(URL, 200)
+    assert governor.get_stats()['dati.anticorruzione.it']['rate_factor'] == 0.25
+
+    clock.now += RECOVERY_INTERVAL
+    governor.observe(URL, 200)
+    assert governor.get_stats()['dati.anticorruzione.it']['rate_factor'] == 0.3125
+
+
+def test_adaptive_limit_removed_after_full_recovery(monkeypatch):
+    governor, clock = _governor(monkeypatch)
+    governor.observe(URL, 429, {'Retry-After': '0'})
+    state = governor._hosts['dati.anticorruzione.it']
+    assert state.adaptive_limit and state.request_bucket is not None
+
+    for _ in range(4):
+        clock.now += RECOVERY_INTERVAL
+        governor.observe(URL, 200)
+    assert state.factor == 1.0
+    assert not state.adaptive_limit and state.request_bucket is None
+
+
+def test_non_adaptive_governor_ignores_throttling(monkeypatch):
+    governor, _ = _governor(monkeypatch, requests_per_sec=4.0, adaptive=False)
+    assert governor.observe(URL, 429, {'Retry-After': '30'}) is None
+    assert governor.remaining_block(URL) == 0.0
+
+
+def test_byte_bucket_waits_for_chunk_larger_than_capacity(monkeypatch):
+    governor, clock = _governor(monkeypatch, bytes_per_sec=1000, burst_seconds=1.0)
+    # Capacità 1000 byte: un blocco da 3000 passa, con 2 secondi di attesa
+    assert governor.consume_bytes(URL, 3000) == 2.0
+    assert clock.slept == [2.0]
+    # Il saldo è stato ripianato dall'attesa: il blocco successivo attende solo per sé
+    assert governor.consume_bytes(URL, 500) == 0.5
+
+
+def test_token_bucket_refills_up_to_capacity():
+    bucket = TokenBucket(rate=10, capacity=5)
+    assert bucket.reserve(5, bucket.updated) == 0.0
+    assert bucket.reserve(5, bucket.updated) == 0.5
+    # Dopo un'ora il saldo non supera la capacità
+    assert bucket.reserve(6, bucket.updated + 3600) == 0.1
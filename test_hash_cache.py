@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Test della cache degli hash: un hash registrato vale solo finché dimensione,
+mtime_ns e inode del file non cambiano.
+"""
+
+import os
+import sys
+import hashlib
+
+# Aggiungi la directory corrente al path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from json_downloader.hash_cache import HashCache
+
+
+def _cache(tmp_path):
+    return HashCache(str(tmp_path / "hash_cache.db"))
+
+
+def test_unchanged_file_is_served_from_cache(tmp_path):
+    cache = _cache(tmp_path)
+    path = tmp_path / "bandi.json"
+    path.write_bytes(b'{"bandi": []}')
+
+    sha256, from_cache = cache.file_hash(str(path))
+    assert sha256 == hashlib.sha256(b'{"bandi": []}').hexdigest()
+    assert not from_cache
+    assert cache.file_hash(str(path)) == (sha256, True)
+
+
+def test_size_change_invalidates(tmp_path):
+    cache = _cache(tmp_path)
+    path = tmp_path / "bandi.json"
+    path.write_bytes(b'{"bandi": []}')
+    stat = os.stat(path)
+    cache.file_hash(str(path))
+
+    # Contenuto più lungo con lo stesso mtime: conta la dimensione
+    path.write_bytes(b'{"bandi": [1, 2]}')
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    sha256, from_cache = cache.file_hash(str(path))
+    assert not from_cache
+    assert sha256 == hashlib.sha256(b'{"bandi": [1, 2]}').hexdigest()
+
+
+def test_mtime_change_invalidates(tmp_path):
+    cache = _cache(tmp_path)
+    path = tmp_path / "bandi.json"
+    path.write_bytes(b'{"bandi": [1]}')
+    stat = os.stat(path)
+    cache.file_hash(str(path))
+
+    # Riscrittura con la stessa dimensione: cambia solo mtime_ns
+    path.write_bytes(b'{"bandi": [2]}')
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    sha256, from_cache = cache.file_hash(str(path))
+    assert not from_cache
+    assert sha256 == hashlib.sha256(b'{"bandi": [2]}').hexdigest()
+
+
+def test_replaced_file_invalidates(tmp_path):
+    cache = _cache(tmp_path)
+    path = tmp_path / "bandi.json"
+    path.write_bytes(b'{"bandi": [1]}')
+    stat = os.stat(path)
+    cache.file_hash(str(path))
+
+    # Un file nuovo (altro inode) rinominato al suo posto, con stessa dimensione e mtime
+    replacement = tmp_path / "bandi.json.part"
+    replacement.write_bytes(b'{"bandi": [2]}')
+    os.utime(replacement, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    # Il vecchio inode resta occupato, così il nuovo file non può riusarlo
+    keep = tmp_path / "bandi.old"
+    os.link(path, keep)
+    os.replace(replacement, path)
+    assert os.stat(path).st_ino != stat.st_ino
+
+    sha256, from_cache = cache.file_hash(str(path))
+    assert not from_cache
+    assert sha256 == hashlib.sha256(b'{"bandi": [2]}').hexdigest()
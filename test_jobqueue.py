@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Test della coda persistente dei download: un'esecuzione interrotta senza finish_run
+(connessione chiusa come in un crash) deve poter essere ripresa da un nuovo processo.
+"""
+
+import os
+import sys
+
+# Aggiungi la directory corrente al path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from json_downloader.jobqueue import JobQueue, PENDING, IN_FLIGHT, DONE, FAILED
+
+LINKS = [f"https://dati.example.org/dataset/file_{n}.zip" for n in range(5)]
+
+
+def _interrupted_run(db_file):
+    """Esecuzione con un link completato, uno in corso, uno fallito e due mai iniziati."""
+    queue = JobQueue(db_file)
+    run_id = queue.start_run(LINKS + [LINKS[0]], options={'extract_zip': True})
+    queue.mark_in_flight(run_id, LINKS[0])
+    queue.mark_done(run_id, LINKS[0], 'downloaded', '/tmp/file_0.zip', 1024, 'abc')
+    queue.mark_in_flight(run_id, LINKS[1])
+    queue.mark_in_flight(run_id, LINKS[2])
+    queue.mark_failed(run_id, LINKS[2], "HTTP 404")
+    # Il processo muore qui: nessun finish_run
+    queue.close()
+    return run_id
+
+
+def test_interrupted_run_is_resumable(tmp_path):
+    db_file = str(tmp_path / "job_queue.db")
+    run_id = _interrupted_run(db_file)
+
+    queue = JobQueue(db_file)
+    run = queue.unfinished_run()
+    assert run['id'] == run_id
+    assert run['options'] == {'extract_zip': True}
+    # I link duplicati vengono registrati una volta sola
+    assert run['total'] == len(LINKS)
+    assert run['counts'][DONE] == 1
+    assert run['counts'][IN_FLIGHT] == 1
+    assert run['counts'][FAILED] == 1
+    assert run['counts'][PENDING] == 2
+    assert run['counts']['bytes'] == 1024
+
+    # Il link rimasto in_flight torna pending, quello completato non viene più toccato
+    assert queue.resume_run(run_id) == [LINKS[1], LINKS[3], LINKS[4]]
+    assert queue.links(run_id, DONE) == [LINKS[0]]
+    assert queue.links(run_id, FAILED) == [LINKS[2]]
+
+
+def test_resume_with_retry_failed(tmp_path):
+    db_file = str(tmp_path / "job_queue.db")
+    run_id = _interrupted_run(db_file)
+
+    queue = JobQueue(db_file)
+    assert queue.resume_run(run_id, retry_failed=True) == [LINKS[1], LINKS[2], LINKS[3], LINKS[4]]
+
+
+def test_failure_reason_is_kept(tmp_path):
+    db_file = str(tmp_path / "job_queue.db")
+    run_id = _interrupted_run(db_file)
+
+    queue = JobQueue(db_file)
+    assert queue.failures(run_id) == [{'link': LINKS[2], 'error': "HTTP 404", 'attempts': 1}]
+
+
+def test_abandoned_and_finished_runs_are_hidden(tmp_path):
+    db_file = str(tmp_path / "job_queue.db")
+    run_id = _interrupted_run(db_file)
+
+    queue = JobQueue(db_file)
+    queue.abandon_run(run_id)
+    assert queue.unfinished_run() is None
+
+    other_id = queue.start_run(LINKS[:2])
+    assert queue.unfinished_run()['id'] == other_id
+    # Le esecuzioni di un altro tipo non vengono proposte per la ripresa
+    assert queue.unfinished_run(kind='batch') is None
+    queue.finish_run(other_id)
+    assert queue.unfinished_run() is None
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Test dell'analisi delle pagine del portale in un solo passaggio (pagelinks), confrontata
+con l'estrazione precedente basata su BeautifulSoup sulle pagine CKAN generate da benchmark.py.
+"""
+
+import os
+import sys
+
+import pytest
+
+# Aggiungi la directory corrente al path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from json_downloader.pagelinks import parse_page_links
+from benchmark import (ANAC_PORTAL, ANAC_DATASETS, anac_listing_page, anac_dataset_page,
+                       legacy_extract_dataset_links, legacy_extract_json_links, legacy_find_next_page)
+
+BASE_URL = f"{ANAC_PORTAL}/dataset"
+
+
+@pytest.mark.parametrize('page_num', [1, 2, 3])
+def test_listing_page_parity(page_num):
+    html = anac_listing_page(page_num)
+    page_links = parse_page_links(html, BASE_URL)
+
+    assert page_links.has_body
+    assert page_links.dataset_links == legacy_extract_dataset_links(html, BASE_URL)
+    assert len(page_links.dataset_links) == 20 * 4
+    assert page_links.has_next_page(page_num) == legacy_find_next_page(html, page_num)
+    # Le pagine di elenco non hanno risorse da scaricare: i badge JSON/CSV/TTL portano al dataset
+    assert set(page_links.resource_links) == legacy_extract_json_links(html, BASE_URL)
+
+
+def test_listing_next_page_link():
+    # Il link "»" non contiene testo da "Successivo": vale il numero della pagina seguente
+    assert parse_page_links(anac_listing_page(1), BASE_URL).next_page_link(1) == "?page=2"
+    assert parse_page_links(anac_listing_page(2), BASE_URL).next_page_link(2) == "?page=3"
+    assert parse_page_links(anac_listing_page(3), BASE_URL).next_page_link(3) is None
+
+
+@pytest.mark.parametrize('dataset', ANAC_DATASETS[:4])
+def test_dataset_page_parity(dataset):
+    html = anac_dataset_page(dataset)
+    resource_links = parse_page_links(html, BASE_URL).resource_links
+
+    assert set(resource_links) == legacy_extract_json_links(html, BASE_URL)
+    downloads = [url for url in resource_links if '/filesystem/' in url]
+    # Un archivio JSON per anno, nessun CSV o TTL
+    assert len(downloads) == 12
+    assert all(url.endswith('_json.zip') for url in downloads)
+    assert resource_links[downloads[0]]['filename'] == downloads[0].rsplit('/', 1)[1]
+
+
+def test_rel_next_and_text_next():
+    html = '<body><a href="?page=2">Successivo</a><a rel="next" href="/opendata/dataset?page=5">»</a></body>'
+    page_links = parse_page_links(html, BASE_URL)
+    # Il primo link che indica la pagina seguente, nell'ordine della pagina
+    assert page_links.next_page_link(1) == "?page=2"
+    assert page_links.has_next_page(1) == legacy_find_next_page(html, 1)
+
+
+NESTED = (
+    '<body><div class="resources">'
+    '<a href="/opendata/download/dataset/x/filesystem/x_json.zip">Scarica '
+    '<a href="/opendata/dataset/y">Y</a> ora</a></div>'
+    '<button class="btn download" href="/files/export_json.zip">Esporta</button>'
+    '<button class="btn" href="/files/altro.zip">Altro</button>'
+    '<button class="download">Senza href</button></body>'
+)
+
+
+def test_nested_links_and_buttons():
+    page_links = parse_page_links(NESTED, BASE_URL)
+
+    # Ordine dei tag di apertura, come BeautifulSoup
+    assert page_links.dataset_links == legacy_extract_dataset_links(NESTED, BASE_URL)
+    assert page_links.dataset_links[0].endswith('/x_json.zip')
+    assert set(page_links.resource_links) == legacy_extract_json_links(NESTED, BASE_URL)
+    # Il link esterno riceve anche il testo di quello annidato
+    outer = "https://dati.anticorruzione.it/opendata/download/dataset/x/filesystem/x_json.zip"
+    assert page_links.resource_links[outer]['text'] == 'scarica y ora'
+    # Un <button> è candidato solo con una classe download/resource, e non conta tra i link
+    assert "https://dati.anticorruzione.it/files/export_json.zip" in page_links.resource_links
+    assert "https://dati.anticorruzione.it/files/altro.zip" not in page_links.resource_links
+    assert page_links.total_links == 2
+
+
+UNCLOSED = (
+    '<html><body><ul class="resource-item"><li><a href="/opendata/dataset/z/resource/abc">Risorsa JSON'
+    '<li><a href="https://example.org/dati.csv">CSV</a>'
+    '<p>Note<div class="altro"><a href="/opendata/dataset?page=2">2'
+)
+
+
+def test_unclosed_tags():
+    page_links = parse_page_links(UNCLOSED, BASE_URL)
+
+    assert page_links.dataset_links == legacy_extract_dataset_links(UNCLOSED, BASE_URL)
+    assert set(page_links.resource_links) == legacy_extract_json_links(UNCLOSED, BASE_URL)
+    # I link mai chiusi vengono classificati a fine documento
+    assert page_links.total_links == 3
+    assert page_links.next_page_link(1) == "?page=2"
+    assert page_links.has_next_page(1) == legacy_find_next_page(UNCLOSED, 1)
+
+
+def test_page_without_body():
+    page_links = parse_page_links('<html><head><title>Errore</title></head></html>', BASE_URL)
+    assert not page_links.has_body
+    assert page_links.total_links == 0
+    assert parse_page_links(None, BASE_URL).dataset_links == []
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Test della modalità refresh di download_file con una sessione HTTP finta:
+304, archivio cambiato (200), file presente senza metadati e HEAD fallita.
+"""
+
+import os
+import sys
+import hashlib
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# Aggiungi la directory corrente al path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from json_downloader.downloader import download_file, last_download_reused
+from json_downloader.metadata import MetadataStore
+
+URL = "https://dati.example.org/dataset/aggiudicazioni.zip"
+OLD_BODY = b"vecchio archivio" * 64
+NEW_BODY = b"nuovo archivio" * 128
+
+
+class _FakeResponse:
+    def __init__(self, status_code, headers=None, body=b''):
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict(headers or {})
+        self.body = body
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"HTTP {self.status_code}", response=self)
+
+    def iter_content(self, chunk_size=1):
+        for start in range(0, len(self.body), chunk_size):
+            yield self.body[start:start + chunk_size]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+class _FakeSession:
+    """Server con un solo archivio (ETag "v2"); registra le HEAD e conta le GET."""
+
+    def __init__(self, head_error=False):
+        self.head_error = head_error
+        self.heads = []
+        self.gets = 0
+
+    def _validators(self):
+        return {'ETag': '"v2"', 'Content-Length': str(len(NEW_BODY)), 'Accept-Ranges': 'bytes'}
+
+    def head(self, url, headers=None, **kwargs):
+        self.heads.append(dict(headers or {}))
+        if self.head_error:
+            raise requests.exceptions.ConnectionError("HEAD fallita")
+        if (headers or {}).get('If-None-Match') == '"v2"':
+            return _FakeResponse(304)
+        return _FakeResponse(200, self._validators())
+
+    def get(self, url, headers=None, **kwargs):
+        self.gets += 1
+        return _FakeResponse(200, self._validators(), NEW_BODY)
+
+
+def _setup(tmp_path, monkeypatch, body=OLD_BODY):
+    monkeypatch.chdir(tmp_path)
+    dest_path = tmp_path / "aggiudicazioni.zip"
+    dest_path.write_bytes(body)
+    return str(dest_path), MetadataStore(str(tmp_path / "metadata.json"))
+
+
+def _download(dest_path, store, session, **kwargs):
+    return download_file(URL, dest_path, show_progress=False, check_database=False, session=session,
+                         max_retries=1, refresh=True, metadata_store=store, **kwargs)
+
+
+def test_not_modified_skips_transfer(tmp_path, monkeypatch):
+    dest_path, store = _setup(tmp_path, monkeypatch)
+    old_hash = hashlib.sha256(OLD_BODY).hexdigest()
+    store.record_download(URL, dest_path, old_hash, {'ETag': '"v2"'}, len(OLD_BODY))
+    session = _FakeSession()
+
+    assert _download(dest_path, store, session) == old_hash
+    assert last_download_reused()
+    assert store.was_not_modified(URL)
+    assert session.heads == [{'If-None-Match': '"v2"'}]
+    assert session.gets == 0
+
+
+def test_changed_archive_is_downloaded(tmp_path, monkeypatch):
+    dest_path, store = _setup(tmp_path, monkeypatch)
+    store.record_download(URL, dest_path, hashlib.sha256(OLD_BODY).hexdigest(), {'ETag': '"v1"'}, len(OLD_BODY))
+    session = _FakeSession()
+
+    assert _download(dest_path, store, session) == hashlib.sha256(NEW_BODY).hexdigest()
+    assert not last_download_reused()
+    assert session.gets == 1
+    assert open(dest_path, 'rb').read() == NEW_BODY
+    record = store.get(URL)
+    assert record['status'] == 'downloaded'
+    assert record['etag'] == '"v2"'
+
+
+def test_existing_file_without_record_is_adopted(tmp_path, monkeypatch):
+    dest_path, store = _setup(tmp_path, monkeypatch)
+    old_hash = hashlib.sha256(OLD_BODY).hexdigest()
+    session = _FakeSession()
+
+    # Prima esecuzione: una HEAD incondizionata registra i validatori della copia locale
+    assert _download(dest_path, store, session) == old_hash
+    assert last_download_reused()
+    assert session.heads == [{}]
+    record = store.get(URL)
+    assert record['status'] == 'existing'
+    assert record['etag'] == '"v2"'
+    assert record['sha256'] == old_hash
+
+    # Esecuzione successiva: richiesta condizionale, 304, nessun trasferimento
+    assert _download(dest_path, store, session) == old_hash
+    assert last_download_reused()
+    assert session.heads[1] == {'If-None-Match': '"v2"'}
+    assert store.was_not_modified(URL)
+    assert session.gets == 0
+
+
+def test_head_error_keeps_local_copy_and_clears_not_modified(tmp_path, monkeypatch):
+    dest_path, store = _setup(tmp_path, monkeypatch)
+    old_hash = hashlib.sha256(OLD_BODY).hexdigest()
+    store.record_download(URL, dest_path, old_hash, {'ETag': '"v1"'}, len(OLD_BODY))
+    store.mark_not_modified(URL)
+    session = _FakeSession(head_error=True)
+
+    assert _download(dest_path, store, session) == old_hash
+    assert last_download_reused()
+    assert not store.was_not_modified(URL)
+    assert store.get(URL)['status'] == 'unverified'
+    assert session.gets == 0
+
+
+def test_caller_verdict_skips_conditional_head(tmp_path, monkeypatch):
+    dest_path, store = _setup(tmp_path, monkeypatch)
+    store.record_download(URL, dest_path, hashlib.sha256(OLD_BODY).hexdigest(), {'ETag': '"v1"'}, len(OLD_BODY))
+    session = _FakeSession()
+
+    assert _download(dest_path, store, session, remote_changed=True) == hashlib.sha256(NEW_BODY).hexdigest()
+    # Solo la HEAD per dimensione e Range, nessuna richiesta condizionale ripetuta
+    assert all('If-None-Match' not in headers for headers in session.heads)
+    assert session.gets == 1
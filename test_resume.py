@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Test dei download in <dest_path>.part con record di ripresa <dest_path>.resume:
+interruzione a metà, ripresa con Range e server che ignorano il Range.
+"""
+
+import os
+import sys
+import random
+import hashlib
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# Aggiungi la directory corrente al path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from json_downloader import downloader
+from json_downloader.downloader import download_file, PART_SUFFIX, RESUME_SUFFIX
+
+URL = "https://dati.example.org/dataset/ocds_2024.zip"
+BODY = random.Random(7).randbytes(256 * 1024)
+CHUNK_SIZE = 8192
+
+
+class _FakeResponse:
+    def __init__(self, status_code, headers, body, cut_at=None, on_chunk=None):
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict(headers)
+        self.body = body
+        self.cut_at = cut_at
+        self.on_chunk = on_chunk
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"HTTP {self.status_code}", response=self)
+
+    def iter_content(self, chunk_size=1):
+        for start in range(0, len(self.body), chunk_size):
+            if self.cut_at is not None and start >= self.cut_at:
+                raise requests.exceptions.ConnectionError("Connessione interrotta")
+            if self.on_chunk is not None:
+                self.on_chunk()
+            yield self.body[start:start + chunk_size]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+class _RangeSession:
+    """
+    Server con supporto Range. La prima GET si interrompe a `cut_at` byte;
+    con honor_range=False le riprese ricevono un 200 con il file intero.
+    """
+
+    def __init__(self, cut_at=None, honor_range=True, on_chunk=None):
+        self.cut_at = cut_at
+        self.honor_range = honor_range
+        self.on_chunk = on_chunk
+        self.ranges = []
+
+    def head(self, url, headers=None, **kwargs):
+        return _FakeResponse(200, {'Content-Length': str(len(BODY)), 'Accept-Ranges': 'bytes',
+                                   'ETag': '"ocds-2024"'}, b'')
+
+    def get(self, url, headers=None, **kwargs):
+        range_header = (headers or {}).get('Range')
+        self.ranges.append(range_header)
+        cut_at, self.cut_at = self.cut_at, None
+        if range_header and self.honor_range:
+            start = int(range_header.split('=')[1].split('-')[0])
+            headers = {'Content-Length': str(len(BODY) - start), 'ETag': '"ocds-2024"',
+                       'Content-Range': f"bytes {start}-{len(BODY) - 1}/{len(BODY)}"}
+            return _FakeResponse(206, headers, BODY[start:],
+                                 cut_at - start if cut_at else None, self.on_chunk)
+        headers = {'Content-Length': str(len(BODY)), 'ETag': '"ocds-2024"'}
+        return _FakeResponse(200, headers, BODY, cut_at, self.on_chunk)
+
+
+def _download(dest_path, session, max_retries=1):
+    return download_file(URL, str(dest_path), chunk_size=CHUNK_SIZE, max_retries=max_retries,
+                         show_progress=False, check_database=False, session=session, retry_base_delay=0)
+
+
+def test_interrupted_download_resumes_to_same_hash(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    dest_path = tmp_path / "ocds_2024.zip"
+    part_path = str(dest_path) + PART_SUFFIX
+    resume_path = str(dest_path) + RESUME_SUFFIX
+
+    # Il file finale non deve mai esistere mentre i dati arrivano
+    def check_not_committed():
+        assert not dest_path.exists()
+        assert os.path.exists(part_path)
+
+    session = _RangeSession(cut_at=96 * 1024, on_chunk=check_not_committed)
+    assert _download(dest_path, session) is None
+    assert not dest_path.exists()
+    assert os.path.exists(part_path) and os.path.exists(resume_path)
+
+    # Nuovo processo: lo stato dell'hash in memoria è perso, il parziale viene riletto a blocchi
+    downloader._resume_hashers.clear()
+    sha256 = _download(dest_path, session)
+    assert session.ranges == [None, f"bytes={96 * 1024}-"]
+    assert sha256 == hashlib.sha256(BODY).hexdigest()
+    assert dest_path.read_bytes() == BODY
+    assert not os.path.exists(part_path) and not os.path.exists(resume_path)
+
+
+def test_resume_within_the_same_call(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    dest_path = tmp_path / "ocds_2024.zip"
+    session = _RangeSession(cut_at=64 * 1024)
+
+    sha256 = _download(dest_path, session, max_retries=2)
+    assert session.ranges == [None, f"bytes={64 * 1024}-"]
+    assert sha256 == hashlib.sha256(BODY).hexdigest()
+    assert dest_path.read_bytes() == BODY
+
+
+def test_server_ignoring_range_restarts_cleanly(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    dest_path = tmp_path / "ocds_2024.zip"
+    session = _RangeSession(cut_at=96 * 1024, honor_range=False)
+
+    assert _download(dest_path, session) is None
+    sha256 = _download(dest_path, session)
+    # La ripresa ha chiesto il Range, il server ha risposto 200 con il file intero
+    assert session.ranges[1] == f"bytes={96 * 1024}-"
+    assert sha256 == hashlib.sha256(BODY).hexdigest()
+    assert dest_path.read_bytes() == BODY
+    assert not os.path.exists(str(dest_path) + PART_SUFFIX)
+    assert not os.path.exists(str(dest_path) + RESUME_SUFFIX)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Test dei nuovi tentativi: backoff con limite e jitter, coda di attesa e
+ritentativi dei download falliti in run_download_jobs.
+"""
+
+import os
+import sys
+import time
+import random
+
+# Aggiungi la directory corrente al path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from json_downloader.retry import RetryPolicy, RetryStats, DelayQueue
+from json_downloader.scheduler import run_download_jobs
+
+
+def test_delay_stays_within_cap():
+    random.seed(3)
+    policy = RetryPolicy(max_retries=10, backoff=2, base_delay=0.5, max_delay=4.0)
+    for attempt in range(1, 11):
+        cap = min(4.0, 0.5 * 2 ** attempt)
+        for _ in range(200):
+            assert 0 <= policy.delay(attempt) <= cap
+    # Senza jitter l'attesa è esattamente il limite del tentativo
+    fixed = RetryPolicy(backoff=2, base_delay=0.5, max_delay=4.0, jitter=False)
+    assert [fixed.delay(attempt) for attempt in (1, 2, 3, 4)] == [1.0, 2.0, 4.0, 4.0]
+
+
+def test_can_retry():
+    policy = RetryPolicy(max_retries=3)
+    assert policy.can_retry(2)
+    assert not policy.can_retry(3)
+    # Almeno un tentativo anche con una configurazione non valida
+    assert RetryPolicy(max_retries=0).max_retries == 1
+
+
+def test_delay_queue_pops_in_deadline_order():
+    queue = DelayQueue()
+    queue.put('lento', 0.05)
+    queue.put('subito', 0)
+    queue.put('medio', 0.02)
+    assert queue.pop_ready() == ['subito']
+    assert 0 < queue.next_ready_in() <= 0.02
+    time.sleep(0.06)
+    assert queue.pop_ready() == ['medio', 'lento']
+    assert len(queue) == 0
+    assert queue.next_ready_in() is None
+
+
+def _fast_policy(max_retries):
+    return RetryPolicy(max_retries=max_retries, base_delay=0.001, max_delay=0.01)
+
+
+def test_failed_result_is_requeued_until_max_retries():
+    calls = {}
+
+    def worker(index, link):
+        calls[link] = calls.get(link, 0) + 1
+        # Il primo link riesce al terzo tentativo, il secondo non riesce mai
+        if link.endswith('a.zip') and calls[link] == 3:
+            return {'success': True}
+        return {'success': False, 'error': 'HTTP 503'}
+
+    stats = RetryStats()
+    links = ["https://dati.example.org/a.zip", "https://dati.example.org/b.zip"]
+    results = run_download_jobs(links, worker, max_workers=2, retry_policy=_fast_policy(4), retry_stats=stats)
+
+    assert results[0]['success'] and results[0]['attempts'] == 3
+    assert not results[1]['success'] and results[1]['attempts'] == 4
+    assert calls == {links[0]: 3, links[1]: 4}
+    summary = stats.summary()
+    assert summary['retries'] == 2 + 3
+    assert summary['recovered'] == 1
+    assert summary['gave_up'] == 1
+
+
+def test_non_retryable_failure_stops_retries():
+    calls = []
+
+    def worker(index, link):
+        calls.append(link)
+        return {'success': False, 'error': 'HTTP 404', 'retryable': False}
+
+    results = run_download_jobs(["https://dati.example.org/manca.zip"], worker, retry_policy=_fast_policy(5))
+    assert len(calls) == 1
+    assert results[0]['attempts'] == 1
+    assert results[0]['error'] == 'HTTP 404'
+
+
+def test_no_policy_means_single_attempt():
+    calls = []
+
+    def worker(index, link):
+        calls.append(link)
+        return {'success': False}
+
+    run_download_jobs(["https://dati.example.org/a.zip"], worker)
+    assert len(calls) == 1
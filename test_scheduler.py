@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Test del pool di download: ordine dei risultati, limite per host e link che
+arrivano da un LinkFeed mentre i download sono in corso.
+"""
+
+import os
+import sys
+import time
+import threading
+
+# Aggiungi la directory corrente al path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from json_downloader.scheduler import run_download_jobs, LinkFeed, get_host
+
+
+class _ConcurrencyProbe:
+    """Worker che conta i download simultanei per host e ne registra il massimo."""
+
+    def __init__(self, duration=0.02):
+        self.duration = duration
+        self.lock = threading.Lock()
+        self.running = {}
+        self.peak = {}
+
+    def __call__(self, index, link):
+        host = get_host(link)
+        with self.lock:
+            self.running[host] = self.running.get(host, 0) + 1
+            self.peak[host] = max(self.peak.get(host, 0), self.running[host])
+        time.sleep(self.duration)
+        with self.lock:
+            self.running[host] -= 1
+        return {'success': True, 'index': index}
+
+
+def test_results_keep_input_order():
+    links = [f"https://host{n % 3}.example.org/file_{n}.zip" for n in range(12)]
+
+    def worker(index, link):
+        # I primi link terminano per ultimi
+        time.sleep(0.002 * (12 - index))
+        return {'success': True, 'index': index}
+
+    results = run_download_jobs(links, worker, max_workers=6)
+    assert [result['link'] for result in results] == links
+    assert [result['index'] for result in results] == list(range(12))
+    assert all(result['attempts'] == 1 for result in results)
+
+
+def test_per_host_cap_holds():
+    links = ([f"https://dati.anticorruzione.it/file_{n}.zip" for n in range(8)]
+             + [f"https://www.anticorruzione.it/file_{n}.zip" for n in range(8)])
+    probe = _ConcurrencyProbe()
+
+    results = run_download_jobs(links, probe, max_workers=8, per_host_limit=2)
+    assert all(result['success'] for result in results)
+    assert probe.peak == {'dati.anticorruzione.it': 2, 'www.anticorruzione.it': 2}
+
+
+def test_worker_exception_becomes_failed_result():
+    def worker(index, link):
+        raise RuntimeError("disco pieno")
+
+    results = run_download_jobs(["https://dati.example.org/a.zip"], worker)
+    assert results[0]['success'] is False
+    assert results[0]['error'] == "disco pieno"
+
+
+def test_link_feed_closed_mid_run_drains():
+    feed = LinkFeed()
+    completed = []
+    late = []
+    links = [f"https://dati.example.org/file_{n}.zip" for n in range(10)]
+
+    def producer():
+        feed.put(links[:4])
+        time.sleep(0.05)
+        # Duplicati ignorati
+        feed.put(links[2:7])
+        time.sleep(0.05)
+        feed.put(links[7:])
+        feed.close()
+        late.append(feed.put(["https://dati.example.org/tardivo.zip"]))
+
+    def worker(index, link):
+        time.sleep(0.01)
+        return {'success': True}
+
+    thread = threading.Thread(target=producer)
+    thread.start()
+    results = run_download_jobs(feed, worker, max_workers=3,
+                                on_result=lambda index, link, result: completed.append(link))
+    thread.join()
+
+    assert [result['link'] for result in results] == links
+    assert sorted(completed) == sorted(links)
+    # Dopo la chiusura non vengono accettati altri link
+    assert late == [0]
+    assert feed.exhausted
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Corpus di link del portale ANAC con il verdetto atteso di UrlClassifier.
+Le prestazioni della classificazione sono misurate in benchmark.py (url_classifier).
+"""
+
+import os
+import sys
+
+import pytest
+
+# Aggiungi la directory corrente al path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from json_downloader.utils import UrlClassifier, get_url_classifier, is_json_or_zip_link
+
+ANAC_PORTAL = "https://dati.anticorruzione.it/opendata"
+
+# Link reali del portale ANAC con il verdetto atteso di UrlClassifier
+_DOWNLOAD = f"{ANAC_PORTAL}/download/dataset"
+ANAC_URL_CORPUS = [
+    (f"{_DOWNLOAD}/anac-datamart/filesystem/anac-datamart_json.zip", 'json-zip'),
+    (f"{_DOWNLOAD}/anac-dataset/resource/anac-dataset_json.zip", 'json-zip'),
+    (f"{_DOWNLOAD}/dati-contratti-pubblici/filesystem/dati-contratti-pubblici_json.zip", 'json-zip'),
+    (f"{_DOWNLOAD}/ocds-appalti-ordinari-2013/filesystem/ocds-appalti-ordinari-2013_json.zip", 'json-zip'),
+    (f"{_DOWNLOAD}/ocds-appalti-ordnari-2020/filesystem/ocds-appalti-ordnari-2020_json.zip", 'json-zip'),
+    (f"{_DOWNLOAD}/smartcig-tipo-fattispecie-contrattuale/filesystem/smartcig-tipo-fattispecie-contrattuale_json.zip", 'json-zip'),
+    (f"{_DOWNLOAD}/soggetti-attuatori-pnrr/filesystem/soggetti-attuatori-pnrr_json.zip", 'json-zip'),
+    (f"{_DOWNLOAD}/aggiudicazioni/filesystem/20240101-aggiudicazioni_json.zip", 'json-zip'),
+    (f"{_DOWNLOAD}/cig-2024/filesystem/cig_json_2024_01.zip", 'json-zip'),
+    (f"{_DOWNLOAD}/aggiudicazioni/filesystem/aggiudicazioni.zip", 'json-zip'),
+    (f"{_DOWNLOAD}/aggiudicazioni/filesystem/aggiudicazioni_json.json", 'json'),
+    (f"{_DOWNLOAD}/bando_cig/filesystem/bando_cig_json", 'json'),
+    (f"{ANAC_PORTAL}/dataset/stazioni-appaltanti/resource/1f0c-stazioni_json", 'json'),
+    (f"{ANAC_PORTAL}/api/3/action/datastore_search?resource_id=1f0c&format=json", 'json'),
+    (f"{ANAC_PORTAL}/dataset/anac-datamart/datapackage.json", 'json'),
+    ("https://example.org/export/data.json?download=1", 'json'),
+    (f"{_DOWNLOAD}/aggiudicazioni/filesystem/aggiudicazioni_csv.zip", 'excluded'),
+    (f"{_DOWNLOAD}/aggiudicazioni/filesystem/aggiudicazioni_ttl.zip", 'excluded'),
+    (f"{_DOWNLOAD}/ocds-appalti-ordinari-2020/filesystem/ocds-appalti-ordinari-2020_xml.zip", 'excluded'),
+    (f"{_DOWNLOAD}/cup/filesystem/cup.csv", 'excluded'),
+    (f"{ANAC_PORTAL}/dataset/cup/resource/cup.ttl", 'excluded'),
+    (f"{ANAC_PORTAL}/dataset", 'other'),
+    (f"{ANAC_PORTAL}/dataset?q=json", 'other'),
+    (f"{ANAC_PORTAL}/dataset/anac-datamart", 'other'),
+    (f"{ANAC_PORTAL}/dataset/ocds-appalti-ordinari-2021", 'other'),
+    (f"{ANAC_PORTAL}/dataset/informazioni-sulle-singole-procedure-di-affidamento", 'other'),
+    (f"{ANAC_PORTAL}/api/3/action", 'other'),
+    ("https://www.anticorruzione.it/", 'other'),
+    ("https://example.org/archivio/documenti.zip", 'other'),
+    ("", 'other'),
+]
+
+# Verdetti cambiati di proposito rispetto a is_json_or_zip_link precedente a UrlClassifier
+# (tra parentesi il vecchio esito)
+CHANGED_VERDICTS = {
+    # Risorsa senza estensione con _json nel nome (prima: non JSON)
+    f"{ANAC_PORTAL}/dataset/stazioni-appaltanti/resource/1f0c-stazioni_json": 'json',
+    # Archivi di formati esclusi sotto i percorsi di download ANAC (prima: JSON/ZIP)
+    f"{_DOWNLOAD}/aggiudicazioni/filesystem/aggiudicazioni_csv.zip": 'excluded',
+    f"{_DOWNLOAD}/aggiudicazioni/filesystem/aggiudicazioni_ttl.zip": 'excluded',
+    f"{_DOWNLOAD}/ocds-appalti-ordinari-2020/filesystem/ocds-appalti-ordinari-2020_xml.zip": 'excluded',
+    f"{_DOWNLOAD}/cup/filesystem/cup.csv": 'excluded',
+    # Pagina di un dataset OCDS, non un file (prima: JSON per il percorso /ocds-appalti-ordinari-)
+    f"{ANAC_PORTAL}/dataset/ocds-appalti-ordinari-2021": 'other',
+}
+
+
+@pytest.mark.parametrize('url, expected', ANAC_URL_CORPUS)
+def test_corpus_verdicts(url, expected):
+    assert UrlClassifier().classify(url) == expected
+    assert is_json_or_zip_link(url) == (expected in ('json', 'json-zip'))
+
+
+def test_changed_verdicts_are_in_corpus():
+    corpus = dict(ANAC_URL_CORPUS)
+    for url, verdict in CHANGED_VERDICTS.items():
+        assert corpus[url] == verdict
+
+
+def test_exclude_formats_from_config():
+    classifier = get_url_classifier(['ttl'])
+    # Il CSV non è più escluso: un archivio sotto /download/dataset/ è un JSON/ZIP probabile
+    assert classifier.classify(f"{_DOWNLOAD}/aggiudicazioni/filesystem/aggiudicazioni_csv.zip") == 'json-zip'
+    assert classifier.classify(f"{ANAC_PORTAL}/dataset/cup/resource/cup.ttl") == 'excluded'
+    # Il nome del file conta solo se non contiene json
+    assert classifier.classify(f"{_DOWNLOAD}/cup/filesystem/cup_json.ttl.zip") == 'json-zip'
+    assert get_url_classifier(['TTL']) is classifier
+    assert get_url_classifier() is get_url_classifier(None)
+    assert get_url_classifier([]).classify(f"{_DOWNLOAD}/cup/filesystem/cup.csv") == 'json'
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Test del validatore JSON in streaming: ogni errore deve riportare lo stesso offset
+in byte qualunque sia la dimensione dei blocchi letti.
+"""
+
+import io
+import os
+import sys
+import json
+
+import pytest
+
+# Aggiungi la directory corrente al path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from json_downloader.validation import validate_json_stream
+
+# Blocchi minuscoli spezzano chiavi, numeri e caratteri UTF-8 multibyte
+CHUNK_SIZES = (1, 3, 7, 64, 1048576)
+
+
+def _validate(data, chunk_size, max_buffered_value=16):
+    return validate_json_stream(io.BytesIO(data), chunk_size=chunk_size, max_buffered_value=max_buffered_value)
+
+
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+@pytest.mark.parametrize('data, error_offset', [
+    # Array troncato dopo un elemento completo: l'errore è a fine file
+    (b'[{"a": 1}, {"b": 2}', 19),
+    # Array troncato a metà di un elemento
+    (b'[{"a": 1}, {"b": ', 17),
+    # Oggetto di primo livello troncato dentro un membro
+    (b'{"releases": [{"id": 1}, {"id": 2}], "meta": {"x": 1', 52),
+    # Oggetto troncato dentro un array annidato
+    (b'{"a": 1, "b": [1, 2', 19),
+])
+def test_truncated_documents(data, error_offset, chunk_size):
+    result = _validate(data, chunk_size)
+    assert not result['valid']
+    assert result['error_offset'] == error_offset
+    assert result['bytes'] == len(data)
+
+
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+def test_invalid_utf8(chunk_size):
+    prefix = '[{"nome": "caffè"}, "'.encode('utf-8')
+    data = prefix + b'\xff\xfe"]'
+    result = _validate(data, chunk_size)
+    assert not result['valid']
+    assert 'UTF-8' in result['error']
+    assert result['error_offset'] == len(prefix)
+
+
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+@pytest.mark.parametrize('data, error_offset', [
+    (b'[1, 2, 01]', 8),
+    (b'[1, 2, -]', 7),
+    (b'[1, 2.e5]', 5),
+    (b'{"importo": 12.5.3}', 16),
+    (b'[1, NaN]', 4),
+])
+def test_bad_numbers(data, error_offset, chunk_size):
+    result = _validate(data, chunk_size)
+    assert not result['valid']
+    assert result['error_offset'] == error_offset
+
+
+def _releases(count):
+    return [{'ocid': f"ocds-{n}", 'importo': n * 1.5, 'tag': ['tender', 'award'],
+             'fornitore': {'nome': 'Società à responsabilità', 'cf': None, 'attivo': n % 2 == 0}}
+            for n in range(count)]
+
+
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+def test_valid_nested_documents_across_chunks(chunk_size):
+    array = json.dumps(_releases(20), ensure_ascii=False).encode('utf-8')
+    result = _validate(array, chunk_size)
+    assert (result['valid'], result['format'], result['records'], result['error_offset']) == (True, 'array', 20, None)
+
+    # Oggetto più grande di max_buffered_value: validato membro per membro
+    package = json.dumps({'uri': 'https://dati.anticorruzione.it', 'releases': _releases(15),
+                          'extensions': [], 'publisher': {'name': 'ANAC'}}, ensure_ascii=False, indent=1)
+    result = _validate(package.encode('utf-8'), chunk_size)
+    assert (result['valid'], result['format']) == (True, 'object')
+
+    # NDJSON: un record per riga; con oggetti oltre max_buffered_value i numeri decimali
+    # spezzati tra due blocchi ("4." + "5") non devono sembrare errori
+    ndjson = '\n'.join(json.dumps(release, ensure_ascii=False) for release in _releases(5)) + '\n'
+    result = _validate(ndjson.encode('utf-8'), chunk_size, max_buffered_value=1048576)
+    assert (result['valid'], result['format'], result['records']) == (True, 'ndjson', 5)
+    result = _validate(ndjson.encode('utf-8'), chunk_size)
+    assert (result['valid'], result['format']) == (True, 'ndjson')
+
+
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+@pytest.mark.parametrize('number', ['4.5', '-0.25', '1e5', '2E-3', '12.5e+10'])
+def test_numbers_split_across_chunks(number, chunk_size):
+    data = f'{{"a": {number}, "b": [{number}, {number}]}}'.encode('utf-8')
+    result = _validate(data, chunk_size, max_buffered_value=1)
+    assert result['valid'], result['error']
+
+
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+def test_utf8_bom(chunk_size):
+    # Il BOM può arrivare diviso tra più blocchi; gli offset contano anche i suoi 3 byte
+    result = _validate(b'\xef\xbb\xbf[1, 2]', chunk_size)
+    assert result['valid'] and result['records'] == 2
+    result = _validate(b'\xef\xbb\xbf[1, x]', chunk_size)
+    assert result['error_offset'] == 7
+
+
+def test_empty_file():
+    result = _validate(b'  \n', 2)
+    assert not result['valid']
+    assert result['error_offset'] == 3
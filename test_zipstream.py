@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Test dell'estrazione in streaming con un download interrotto a metà di un membro
+e ripreso al tentativo successivo.
+"""
+
+import os
+import sys
+import random
+import zipfile
+import threading
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+# Aggiungi la directory corrente al path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def _make_archive(path):
+    """Archivio con due JSON poco comprimibili: il secondo membro occupa la seconda metà."""
+    rng = random.Random(12)
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zip_ref:
+        for name in ('m1.json', 'm2.json'):
+            values = ','.join(str(rng.getrandbits(64)) for _ in range(20000))
+            zip_ref.writestr(name, f'{{"valori": [{values}]}}')
+    with zipfile.ZipFile(path) as zip_ref:
+        m2 = zip_ref.getinfo('m2.json')
+        # Interruzione a metà dei dati compressi di m2.json
+        return m2.header_offset + 100 + m2.compress_size // 2
+
+
+class _InterruptingHandler(BaseHTTPRequestHandler):
+    """La prima GET si interrompe a cut_at byte; le successive rispettano Range."""
+
+    data = b''
+    cut_at = 0
+    interrupted = False
+
+    def log_message(self, *args):
+        pass
+
+    def _send_headers(self, status, start, length):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/zip')
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Length', str(length))
+        if status == 206:
+            self.send_header('Content-Range', f"bytes {start}-{len(self.data) - 1}/{len(self.data)}")
+        self.end_headers()
+
+    def do_HEAD(self):
+        self._send_headers(200, 0, len(self.data))
+
+    def do_GET(self):
+        handler = type(self)
+        range_header = self.headers.get('Range')
+        start = int(range_header.split('=')[1].split('-')[0]) if range_header else 0
+        self._send_headers(206 if start else 200, start, len(self.data) - start)
+        if not handler.interrupted:
+            handler.interrupted = True
+            self.wfile.write(self.data[start:self.cut_at])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(self.data[start:])
+
+
+def test_interrupted_download_leaves_no_part_files(tmp_path, monkeypatch):
+    from json_downloader.downloader import download_with_auto_sorting
+
+    monkeypatch.chdir(tmp_path)
+    database_path = tmp_path / "database"
+    (database_path / "aggiudicazioni_json").mkdir(parents=True)
+
+    archive = tmp_path / "source.zip"
+    _InterruptingHandler.cut_at = _make_archive(archive)
+    _InterruptingHandler.data = archive.read_bytes()
+    _InterruptingHandler.interrupted = False
+
+    server = HTTPServer(('127.0.0.1', 0), _InterruptingHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/aggiudicazioni_json.zip"
+    options = {'max_retries': 1, 'chunk_size': 16384, 'segments': 1}
+
+    try:
+        # Primo tentativo interrotto a metà di m2.json, poi la ripresa (come run_download_jobs)
+        first = download_with_auto_sorting(url, str(tmp_path / "downloads"), show_progress=False,
+                                           download_options=options, stream_extract=True,
+                                           database_path=str(database_path))
+        assert not first['success']
+        second = download_with_auto_sorting(url, str(tmp_path / "downloads"), show_progress=False,
+                                            download_options=options, stream_extract=True,
+                                            database_path=str(database_path))
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert second['success'], second
+    extract_dir = database_path / "aggiudicazioni_json" / "aggiudicazioni_json"
+    assert sorted(os.listdir(extract_dir)) == ['m1.json', 'm2.json']
+    leftovers = [os.path.join(root, name) for root, _, names in os.walk(database_path)
+                 for name in names if name.endswith('.part')]
+    assert leftovers == []